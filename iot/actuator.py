@@ -0,0 +1,209 @@
+"""Serialised access to the pump.
+
+Button callbacks run on gpiozero's thread and the daily correction on the
+main one. Instead of driving the pump directly, they submit jobs to a
+single worker which owns the pump, so that it never gets two commands at
+once.
+
+Jobs are signed amounts of token, positive to mint and negative to burn.
+When the worker picks up work, all pending jobs are merged into their net
+amount and the pump runs once: five mint presses and three burn presses
+while the pump is busy give a single run of two mints. Presses of a same
+button closer than the debounce time are dropped, and each button is
+limited to a number of presses per period.
+"""
+import collections
+import concurrent.futures
+import logging
+import threading
+import time
+from typing import Any, Callable, NamedTuple, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class Job(NamedTuple):
+    #: token to mint (positive) or burn (negative)
+    amount: int
+    source: str
+    submitted_at: float
+    future: "concurrent.futures.Future[Any]"
+
+
+class ActuatorStats(NamedTuple):
+    submitted: int
+    debounced: int
+    rate_limited: int
+    #: pump runs, each one for the net amount of a batch of jobs
+    runs: int
+    #: jobs cancelled by jobs of the opposite sign
+    cancelled: int
+    #: seconds spent running batches
+    busy_time: float
+    #: jobs currently waiting
+    depth: int
+    #: seconds between the submission of a job and the start of its run
+    mean_wait: float
+    max_wait: float
+
+
+class ActuatorQueue:
+    """Single worker running the net amount of the pending jobs.
+
+    Parameters
+    ----------
+    execute : callable
+        ``execute(amount)`` runs the pump for a signed amount of token, its
+        return value is the result of the futures of the batch.
+    debounce : float
+        Minimal time between two throttled jobs of a same source in seconds.
+    max_jobs, period : int, float
+        At most `max_jobs` throttled jobs per source over `period` seconds.
+    clock : callable
+        Monotonic clock.
+    """
+
+    def __init__(
+        self,
+        execute: Callable[[int], Any],
+        *,
+        debounce: float = 0.5,
+        max_jobs: int = 5,
+        period: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.execute = execute
+        self.debounce = debounce
+        self.max_jobs = max_jobs
+        self.period = period
+        self.clock = clock
+
+        self._pending: collections.deque[Job] = collections.deque()
+        self._history: dict[str, collections.deque[float]] = {}
+        self._cond = threading.Condition()
+        self._stop = False
+        self._thread: Optional[threading.Thread] = None
+
+        self._submitted = self._debounced = self._rate_limited = 0
+        self._runs = self._cancelled = 0
+        self._busy_time = self._total_wait = self._max_wait = 0.0
+        self._started = 0
+
+    def start(self) -> "ActuatorQueue":
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop = False
+                self._thread = threading.Thread(
+                    target=self._run, name="actuator", daemon=True
+                )
+                self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop the worker once the pending jobs are done."""
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+    def submit(
+        self, amount: int, source: str, *, throttle: bool = True
+    ) -> "Optional[concurrent.futures.Future[Any]]":
+        """Queue a mint (positive) or burn (negative) of `amount` token.
+
+        Parameters
+        ----------
+        amount : int
+            Token to mint (positive) or burn (negative).
+        source : str
+            Origin of the job, e.g. ``"mint_button"``.
+        throttle : bool
+            Apply the debounce and the rate limit of the source.
+
+        Returns
+        -------
+        future : Future or None
+            Result of the run of the batch, None if the job was dropped.
+        """
+        now = self.clock()
+        with self._cond:
+            self._submitted += 1
+            if throttle and not self._accept(source, now):
+                return None
+            future: concurrent.futures.Future[Any] = concurrent.futures.Future()
+            self._pending.append(Job(amount, source, now, future))
+            self._cond.notify_all()
+        return future
+
+    @property
+    def depth(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def stats(self) -> ActuatorStats:
+        with self._cond:
+            return ActuatorStats(
+                submitted=self._submitted,
+                debounced=self._debounced,
+                rate_limited=self._rate_limited,
+                runs=self._runs,
+                cancelled=self._cancelled,
+                busy_time=self._busy_time,
+                depth=len(self._pending),
+                mean_wait=self._total_wait / self._started if self._started else 0.0,
+                max_wait=self._max_wait,
+            )
+
+    def _accept(self, source: str, now: float) -> bool:
+        history = self._history.setdefault(source, collections.deque())
+        if history and now - history[-1] < self.debounce:
+            self._debounced += 1
+            return False
+        while history and now - history[0] >= self.period:
+            history.popleft()
+        if len(history) >= self.max_jobs:
+            self._rate_limited += 1
+            logger.warning("Rate limit of %s reached, dropping the job", source)
+            return False
+        history.append(now)
+        return True
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._stop)
+                if not self._pending:
+                    return
+                batch = list(self._pending)
+                self._pending.clear()
+
+            start = self.clock()
+            net = sum(job.amount for job in batch)
+            with self._cond:
+                for job in batch:
+                    wait = start - job.submitted_at
+                    self._total_wait += wait
+                    self._max_wait = max(self._max_wait, wait)
+                self._started += len(batch)
+                self._cancelled += sum(job.amount * net <= 0 for job in batch)
+
+            if net == 0:
+                for job in batch:
+                    job.future.set_result(None)
+                continue
+
+            try:
+                result = self.execute(net)
+            except Exception as ex:
+                logger.error("Actuator job of %d token failed: %r", net, ex)
+                for job in batch:
+                    job.future.set_exception(ex)
+            else:
+                for job in batch:
+                    job.future.set_result(result)
+            finally:
+                with self._cond:
+                    self._runs += 1
+                    self._busy_time += self.clock() - start
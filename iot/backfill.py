@@ -0,0 +1,175 @@
+"""What would the SEAL supply have been since 1979?
+
+Apply the rules of the daily supply correction (see `seal_coin_supply`) to
+the whole daily record at once:
+
+- the amount is the delta to the median extent times 100,
+- amounts within the dead band do not change the supply,
+- a correction which would bring the supply out of
+  ``TOKEN_GENESIS ± TOKEN_VOLATILE`` is rejected and the supply is kept.
+
+The rejection makes each day depend on the supply of the previous day. A
+cumulative sum gives the supply assuming every correction is accepted. A
+rejected correction only shifts the supply of all following days by a
+constant, so the record is scanned for the next rejection by blocks of
+growing size and nothing is recomputed.
+
+Use the command line to save the arrays::
+
+    python backfill.py --output backfill.npz
+"""
+import argparse
+import os
+import sys
+from typing import TYPE_CHECKING, NamedTuple, Optional
+
+import climatology
+import seal_coin_supply
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+class Backfill(NamedTuple):
+    """Supply trajectory and ledger, one value per day of the record."""
+
+    dates: "np.ndarray"
+    #: correction of the day, before the dead band and the supply check
+    amount: "np.ndarray"
+    #: token minted (positive) or burned (negative) on the day
+    ledger: "np.ndarray"
+    #: supply at the end of the day
+    supply: "np.ndarray"
+
+
+def backfill(
+    dates,
+    extent,
+    median_extent: "climatology.Climatology",
+    *,
+    supply: int = seal_coin_supply.TOKEN_GENESIS,
+    block_size: int = 16,
+) -> Backfill:
+    """Vectorised supply correction over a daily record.
+
+    Parameters
+    ----------
+    dates : ndarray of datetime64[D]
+        Days of the record.
+    extent : ndarray of float
+        Sea ice extent in 10^6 km^2.
+    median_extent : Climatology
+        Baseline median extent per day of the year.
+    supply : int
+        Supply before the first day.
+    block_size : int
+        Number of days checked after a rejection, doubled while there is
+        no rejection.
+
+    Returns
+    -------
+    backfill : Backfill
+    """
+    import numpy as np
+
+    lower = seal_coin_supply.TOKEN_GENESIS - seal_coin_supply.TOKEN_VOLATILE
+    upper = seal_coin_supply.TOKEN_GENESIS + seal_coin_supply.TOKEN_VOLATILE
+
+    median = np.asarray(median_extent.tolist(), dtype=np.int64)
+    doy = climatology.day_of_year(dates)
+    # same conversions as the daily correction: 13.976 -> 13976, * 100
+    amount = ((extent * 1000).astype(np.int64) - median[doy - 1]) * 100
+    applied = np.where(np.abs(amount) > seal_coin_supply.DEAD_BAND, amount, 0)
+
+    # supply at the start of each day if no correction is ever rejected
+    before = supply + np.concatenate(([0], np.cumsum(applied)[:-1]))
+    after = before + amount
+
+    # each rejection shifts the supply of the following days by -applied
+    offset = 0
+    accepted = np.ones(amount.size, dtype=bool)
+    start = 0
+    size = block_size
+    while start < amount.size:
+        stop = min(start + size, amount.size)
+        new_supply = after[start:stop] + offset
+        rejected = (new_supply <= lower) | (new_supply >= upper)
+        first = rejected.argmax()
+        if not rejected[first]:
+            start = stop
+            size *= 2
+        else:
+            rejected_day = start + first
+            accepted[rejected_day] = False
+            offset -= applied[rejected_day]
+            start = rejected_day + 1
+            size = block_size
+
+    ledger = np.where(accepted, applied, 0)
+    return Backfill(dates, amount, ledger, supply + np.cumsum(ledger))
+
+
+def backfill_loop(
+    dates,
+    extent,
+    median_extent: "climatology.Climatology",
+    *,
+    supply: int = seal_coin_supply.TOKEN_GENESIS,
+) -> Backfill:
+    """Reference day by day implementation of `backfill`."""
+    import numpy as np
+
+    doy = climatology.day_of_year(dates)
+    amounts, ledger, supplies = [], [], []
+    for doy_, extent_ in zip(doy.tolist(), extent.tolist()):
+        amount = seal_coin_supply.supply_correction(
+            int(extent_ * 1000), median_extent[doy_]
+        )
+        if (
+            seal_coin_supply.is_supply_valid(supply + amount)
+            and abs(amount) > seal_coin_supply.DEAD_BAND
+        ):
+            correction = amount
+        else:
+            correction = 0
+        supply += correction
+        amounts.append(amount)
+        ledger.append(correction)
+        supplies.append(supply)
+
+    return Backfill(dates, np.array(amounts), np.array(ledger), np.array(supplies))
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Backfill the SEAL supply.")
+    parser.add_argument(
+        "--daily-csv", type=str, default=os.fspath(climatology.DAILY_CSV)
+    )
+    parser.add_argument(
+        "--baseline",
+        type=int,
+        nargs=2,
+        default=seal_coin_supply.BASELINE,
+        metavar=("START", "END"),
+    )
+    parser.add_argument("--output", type=str, help="save the arrays as .npz")
+    args = parser.parse_args(argv)
+
+    import numpy as np
+
+    dates, extent = climatology.read_daily(args.daily_csv)
+    result = backfill(dates, extent, climatology.load(*args.baseline))
+
+    minted = result.ledger[result.ledger > 0].sum()
+    burned = -result.ledger[result.ledger < 0].sum()
+    print(f"{dates[0]} to {dates[-1]}: {dates.size} days")
+    print(f"minted: {minted:,} SEAL, burned: {burned:,} SEAL")
+    print(f"final supply: {result.supply[-1]:,} SEAL")
+
+    if args.output is not None:
+        np.savez(args.output, **result._asdict())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
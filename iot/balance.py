@@ -0,0 +1,352 @@
+"""On-chain balance of an account, streamed from Horizon.
+
+Instead of loading the account on every read, the balance is loaded once
+and then kept up to date from the effects of the account, streamed by
+Horizon as server-sent events. Reading it is a lookup, without a network
+round trip.
+
+The account is loaded along with the paging token of its latest effect.
+The stream starts from that token and effects already included in the
+loaded balance, from ledgers up to the last change of the trustline, are
+skipped: an effect is never missed nor counted twice. After a disconnection
+the stream resumes from the last effect received. If it cannot connect,
+the account is polled instead until streaming works again.
+
+The account can also be loaded again from another thread while the stream
+runs. A load older than the last streamed effect does not replace the
+balance, and the stream never resumes from an older token.
+
+Amounts are exact `decimal.Decimal`, as Horizon gives them with 7 decimals.
+"""
+import decimal
+import http.client
+import json
+import logging
+import socket
+import threading
+import time
+import urllib.parse
+from typing import Callable, NamedTuple, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class BalanceStats(NamedTuple):
+    #: effects applied to the balance
+    events: int
+    #: loads of the account, first one included
+    syncs: int
+    #: connections to the stream after the first one
+    reconnects: int
+    #: whether the stream is down and the account polled
+    polling: bool
+    #: time of the last change of the balance, None before the first load
+    updated_at: Optional[float]
+
+
+class BalanceCache:
+    """Balance of an asset of an account, kept up to date in a thread.
+
+    Parameters
+    ----------
+    horizon_url : str
+        Horizon server, e.g. ``"https://horizon-testnet.stellar.org"``.
+    account_id : str
+        Public key of the account.
+    asset_code : str
+        Code of the asset.
+    asset_issuer : str, optional
+        Issuer of the asset. By default, the first balance with the code.
+    poll_interval : float
+        Seconds between two loads of the account while the stream is down.
+    max_failures : int
+        Consecutive failures to connect before polling.
+    reconnect_delay : float
+        First delay before connecting again in seconds, doubled after each
+        failure.
+    timeout : float
+        Timeout of the requests in seconds.
+    stream_timeout : float
+        Seconds without any event after which the stream is opened again.
+    on_change : callable, optional
+        ``on_change(balance)`` is called from the thread when the balance
+        changes.
+    """
+
+    def __init__(
+        self,
+        horizon_url: str,
+        account_id: str,
+        asset_code: str,
+        *,
+        asset_issuer: Optional[str] = None,
+        poll_interval: float = 60.0,
+        max_failures: int = 3,
+        reconnect_delay: float = 1.0,
+        timeout: float = 30.0,
+        stream_timeout: float = 300.0,
+        on_change: Optional[Callable[[decimal.Decimal], None]] = None,
+    ):
+        self.horizon_url = horizon_url.rstrip("/")
+        self.account_id = account_id
+        self.asset_code = asset_code
+        self.asset_issuer = asset_issuer
+        self.poll_interval = poll_interval
+        self.max_failures = max_failures
+        self.reconnect_delay = reconnect_delay
+        self.timeout = timeout
+        self.stream_timeout = stream_timeout
+        self.on_change = on_change
+
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # socket of the open stream, the response keeps it after a close
+        self._socket: Optional[socket.socket] = None
+
+        self._balance: Optional[decimal.Decimal] = None
+        # ledger of the last change included in the loaded balance, and of
+        # the last effect streamed since
+        self._ledger = 0
+        self._streamed_ledger = 0
+        self._cursor: Optional[str] = None
+        self._failures = 0
+
+        self._events = self._syncs = self._reconnects = 0
+        self._polling = False
+        self._updated_at: Optional[float] = None
+
+    def start(self) -> "BalanceCache":
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name="balance", daemon=True
+                )
+                self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        sock = self._socket
+        if sock is not None:
+            # unblock the thread waiting for the next event
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self._thread is not None:
+            self._thread.join()
+
+    @property
+    def balance(self) -> Optional[decimal.Decimal]:
+        """Current balance, None until the account is loaded."""
+        with self._lock:
+            return self._balance
+
+    def wait(self, timeout: Optional[float] = None) -> decimal.Decimal:
+        """Current balance, waiting for the first load of the account.
+
+        Raises
+        ------
+        TimeoutError
+            If the account is not loaded within `timeout` seconds.
+        """
+        if not self._ready.wait(timeout):
+            raise TimeoutError(f"Balance of {self.account_id} not loaded")
+        return self.balance  # type: ignore[return-value]
+
+    def stats(self) -> BalanceStats:
+        with self._lock:
+            return BalanceStats(
+                events=self._events,
+                syncs=self._syncs,
+                reconnects=self._reconnects,
+                polling=self._polling,
+                updated_at=self._updated_at,
+            )
+
+    def _run(self) -> None:
+        connected = False
+        while not self._stop.is_set():
+            try:
+                if self._cursor is None:
+                    self.sync()
+                if connected:
+                    with self._lock:
+                        self._reconnects += 1
+                connected = True
+                self._stream()
+            except socket.timeout:
+                logger.info("No effect of %s, reconnecting", self.account_id)
+                continue
+            except (OSError, ValueError, KeyError, http.client.HTTPException) as ex:
+                if self._stop.is_set():
+                    return
+                self._failures += 1
+                logger.warning("Balance stream of %s failed: %r", self.account_id, ex)
+            if self._failures < self.max_failures:
+                self._stop.wait(self.reconnect_delay * 2 ** max(self._failures - 1, 0))
+                continue
+
+            if not self._polling:
+                logger.warning("Polling the balance of %s", self.account_id)
+            with self._lock:
+                self._polling = True
+            try:
+                self.sync()
+            except (OSError, ValueError, KeyError, http.client.HTTPException) as ex:
+                logger.warning("Could not load %s: %r", self.account_id, ex)
+            self._stop.wait(self.poll_interval)
+
+    def sync(self) -> decimal.Decimal:
+        """Load the account and the paging token of its latest effect."""
+        # the token is taken first, effects after the load are then in the
+        # stream
+        effects = self._get_json(
+            f"/accounts/{self.account_id}/effects?order=desc&limit=1"
+        )
+        records = effects["_embedded"]["records"]
+        cursor = records[0]["paging_token"] if records else "0"
+        account = self._get_json(f"/accounts/{self.account_id}")
+
+        balance, ledger = decimal.Decimal(0), 0
+        for entry in account["balances"]:
+            if self._is_asset(entry, "asset_code", "asset_issuer"):
+                balance = decimal.Decimal(entry["balance"])
+                ledger = entry["last_modified_ledger"]
+                break
+
+        with self._lock:
+            if ledger < self._streamed_ledger:
+                # the stream applied a later effect meanwhile
+                balance = self._balance  # type: ignore[assignment]
+                ledger = self._ledger
+            if self._cursor is not None:
+                cursor = max(cursor, self._cursor, key=_paging_key)
+            changed = balance != self._balance
+            self._balance = balance
+            self._ledger = ledger
+            self._cursor = cursor
+            self._syncs += 1
+            if changed:
+                self._updated_at = time.time()
+        self._ready.set()
+        if changed:
+            self._notify(balance)
+        return balance
+
+    def _stream(self) -> None:
+        """Apply the streamed effects until the server closes the stream."""
+        response = self._open(
+            f"/accounts/{self.account_id}/effects?cursor={self._cursor}",
+            {"Accept": "text/event-stream"},
+            timeout=self.stream_timeout,
+            stream=True,
+        )
+        # connected, back to streaming
+        self._failures = 0
+        with self._lock:
+            self._polling = False
+
+        data: list[str] = []
+        try:
+            for raw_line in response:
+                line = raw_line.decode().rstrip("\r\n")
+                if not line:
+                    if data:
+                        self._on_event(json.loads("\n".join(data)))
+                    data = []
+                    continue
+                field, _, value = line.partition(":")
+                if field == "data":
+                    data.append(value[1:] if value.startswith(" ") else value)
+        finally:
+            response.close()
+            self._socket = None
+
+    def _on_event(self, effect: object) -> None:
+        # the stream starts with "hello"
+        if not isinstance(effect, dict):
+            return
+        ledger = int(effect["paging_token"].split("-")[0]) >> 32
+        delta = None
+        stale = False
+        with self._lock:
+            self._cursor = effect["paging_token"]
+            if ledger <= self._ledger:
+                return
+            kind = effect["type"]
+            if kind in ("account_credited", "account_debited"):
+                if self._is_asset(effect, "asset_code", "asset_issuer"):
+                    delta = decimal.Decimal(effect["amount"])
+                    if kind == "account_debited":
+                        delta = -delta
+                    self._balance += delta  # type: ignore[operator]
+                    self._streamed_ledger = ledger
+                    self._events += 1
+                    self._updated_at = time.time()
+                    balance = self._balance
+            else:
+                # e.g. a trade, only the account has the resulting balance
+                stale = self._is_asset(
+                    effect, "sold_asset_code", "sold_asset_issuer"
+                ) or self._is_asset(effect, "bought_asset_code", "bought_asset_issuer")
+        if stale:
+            self.sync()
+        elif delta is not None:
+            self._notify(balance)
+
+    def _is_asset(self, record: dict, code_key: str, issuer_key: str) -> bool:
+        return record.get(code_key) == self.asset_code and (
+            self.asset_issuer is None or record.get(issuer_key) == self.asset_issuer
+        )
+
+    def _notify(self, balance: decimal.Decimal) -> None:
+        if self.on_change is None:
+            return
+        try:
+            self.on_change(balance)
+        except Exception:
+            logger.exception("Balance callback failed")
+
+    def _get_json(self, path: str) -> dict:
+        response = self._open(path, {"Accept": "application/json"})
+        try:
+            return json.loads(response.read())
+        finally:
+            response.close()
+
+    def _open(
+        self,
+        path: str,
+        headers: dict,
+        timeout: Optional[float] = None,
+        stream: bool = False,
+    ) -> http.client.HTTPResponse:
+        url = urllib.parse.urlsplit(self.horizon_url)
+        connection_class = (
+            http.client.HTTPSConnection
+            if url.scheme == "https"
+            else http.client.HTTPConnection
+        )
+        connection = connection_class(
+            url.netloc, timeout=self.timeout if timeout is None else timeout
+        )
+        connection.request("GET", url.path + path, headers=headers)
+        if stream:
+            # `sync` may also be called from another thread
+            self._socket = connection.sock
+        response = connection.getresponse()
+        if response.status != 200:
+            response.close()
+            raise ConnectionError(f"HTTP {response.status} for {path}")
+        return response
+
+
+def _paging_key(paging_token: str) -> tuple[int, int]:
+    """Order of the paging tokens of effects, ``"<operation id>-<index>"``."""
+    toid, _, index = paging_token.partition("-")
+    return int(toid), int(index or 0)
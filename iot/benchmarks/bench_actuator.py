@@ -0,0 +1,120 @@
+"""Pump commands under bursty button presses, direct calls versus the queue.
+
+Directly, each press runs the pump from its own callback thread, as
+gpiozero does, and commands overlap. With the queue, a single worker runs
+the net amount of the pending presses. Pump time is scaled down: one second
+of simulated pumping takes `--scale` seconds.
+
+Run from the ``iot`` folder::
+
+    python -m benchmarks.bench_actuator
+"""
+import argparse
+import logging
+import random
+import threading
+import time
+
+import actuator
+import seal_coin_supply
+
+
+class FakePump:
+    """Counts commands, concurrent ones and the time spent pumping."""
+
+    def __init__(self, scale: float):
+        self.scale = scale
+        self.runs = 0
+        self.pump_time = 0.0
+        self.max_concurrent = 0
+        self._running = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, amount: int) -> None:
+        pump_time = abs(amount) * seal_coin_supply.LITER_PER_TOKEN
+        pump_time /= seal_coin_supply.FLOW_RATE
+        with self._lock:
+            self.runs += 1
+            self.pump_time += pump_time
+            self._running += 1
+            self.max_concurrent = max(self.max_concurrent, self._running)
+        time.sleep(pump_time * self.scale)
+        with self._lock:
+            self._running -= 1
+
+
+def presses(n_bursts: int, seed: int = 0) -> list[tuple[float, str]]:
+    """Bursts of presses a few seconds apart, with bounces."""
+    rng = random.Random(seed)
+    events = []
+    now = 0.0
+    for _ in range(n_bursts):
+        for _ in range(rng.randint(2, 6)):
+            button = rng.choice(["mint_button", "burn_button"])
+            events.append((now, button))
+            if rng.random() < 0.3:  # contact bounce
+                events.append((now + 0.02, button))
+            now += rng.uniform(0.3, 1.5)
+        now += rng.uniform(5, 20)
+    return events
+
+
+def replay(events, submit, scale: float) -> float:
+    start = time.monotonic()
+    for at, button in events:
+        time.sleep(max(0.0, start + at * scale - time.monotonic()))
+        amount = seal_coin_supply.MINT_AMOUNT
+        submit(amount if button == "mint_button" else -amount, button)
+    return time.monotonic() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bursts", type=int, default=10)
+    parser.add_argument("--scale", type=float, default=0.002)
+    args = parser.parse_args()
+    # dropped presses are counted in the stats
+    logging.getLogger("actuator").setLevel(logging.ERROR)
+
+    events = presses(args.bursts)
+    print(f"{len(events)} presses in {args.bursts} bursts")
+
+    direct_pump = FakePump(args.scale)
+    threads = []
+
+    def direct(amount, source):
+        thread = threading.Thread(target=direct_pump, args=(amount,))
+        thread.start()
+        threads.append(thread)
+
+    replay(events, direct, args.scale)
+    for thread in threads:
+        thread.join()
+
+    queue_pump = FakePump(args.scale)
+    queue = actuator.ActuatorQueue(
+        queue_pump,
+        debounce=seal_coin_supply.BUTTON_DEBOUNCE * args.scale,
+        max_jobs=seal_coin_supply.BUTTON_MAX_PRESSES,
+        period=seal_coin_supply.BUTTON_PERIOD * args.scale,
+    ).start()
+    replay(events, queue.submit, args.scale)
+    queue.stop()
+    stats = queue.stats()
+
+    print(f"{'mode':<8} {'runs':>5} {'pump time [s]':>14} {'max concurrent':>15}")
+    for mode, fake_pump in (("direct", direct_pump), ("queue", queue_pump)):
+        print(
+            f"{mode:<8} {fake_pump.runs:>5} {fake_pump.pump_time:>14.0f} "
+            f"{fake_pump.max_concurrent:>15}"
+        )
+    print(
+        f"queue: {stats.debounced} debounced, {stats.rate_limited} rate limited, "
+        f"{stats.cancelled} cancelled, "
+        f"wait {stats.mean_wait / args.scale:.1f} s mean, "
+        f"{stats.max_wait / args.scale:.1f} s max"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Compare the vectorised backfill with the day by day rules.
+
+Run from the ``iot`` folder::
+
+    python -m benchmarks.bench_backfill
+"""
+import argparse
+import time
+
+import backfill
+import climatology
+import seal_coin_supply
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    import numpy as np
+
+    dates, extent = climatology.read_daily(climatology.DAILY_CSV)
+    median_extent = climatology.load(*seal_coin_supply.BASELINE)
+    print(f"{climatology.DAILY_CSV.name}: {dates.size} days")
+
+    results = {}
+    print(f"{'engine':<11} {'time [ms]':>10}")
+    for name, func in (
+        ("vectorised", backfill.backfill),
+        ("loop", backfill.backfill_loop),
+    ):
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            results[name] = func(dates, extent, median_extent)
+            timings.append(time.perf_counter() - start)
+        print(f"{name:<11} {min(timings) * 1e3:>10.3f}")
+
+    vectorised, loop = results["vectorised"], results["loop"]
+    for field in ("amount", "ledger", "supply"):
+        if not np.array_equal(getattr(vectorised, field), getattr(loop, field)):
+            raise SystemExit(f"Backfill {field} differs from the daily rules")
+    print(f"identical ledger, final supply: {vectorised.supply[-1]:,} SEAL")
+
+
+if __name__ == "__main__":
+    main()
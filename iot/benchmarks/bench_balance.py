@@ -0,0 +1,109 @@
+"""Read the on-chain balance, loading the account versus the streamed cache.
+
+Payments of fractional amounts are made on a local Horizon stand-in, with a
+dropped stream and an outage of the streaming endpoint in between. At the
+end, the cached balance must be exactly the one of the account.
+
+Run from the ``iot`` folder::
+
+    python -m benchmarks.bench_balance
+"""
+import argparse
+import decimal
+import json
+import logging
+import random
+import statistics
+import time
+import urllib.request
+
+import balance
+from benchmarks.standin import serve_horizon
+
+
+ACCOUNT = "GDISTRIBUTION"
+ISSUER = "GISSUER"
+
+
+def load_account(url: str) -> decimal.Decimal:
+    """Balance from a full load of the account, as `supply_onchain` did."""
+    with urllib.request.urlopen(f"{url}/accounts/{ACCOUNT}") as response:
+        account = json.loads(response.read())
+    for entry in account["balances"]:
+        if entry.get("asset_code") == "SEAL":
+            return decimal.Decimal(entry["balance"])
+    return decimal.Decimal(0)
+
+
+def timed(read, n_reads: int) -> list[float]:
+    times = []
+    for _ in range(n_reads):
+        start = time.perf_counter()
+        read()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--payments", type=int, default=200)
+    parser.add_argument("--reads", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.05, help="s")
+    args = parser.parse_args()
+    rng = random.Random(0)
+    # the outage is counted in the stats
+    logging.getLogger("balance").setLevel(logging.ERROR)
+
+    with serve_horizon(latency=args.latency) as horizon:
+        horizon.pay(ACCOUNT, "SEAL", ISSUER, decimal.Decimal("1000000000"))
+        cache = balance.BalanceCache(
+            horizon.url,
+            ACCOUNT,
+            "SEAL",
+            poll_interval=0.2,
+            max_failures=2,
+            reconnect_delay=0.05,
+        ).start()
+        cache.wait(timeout=5)
+
+        for i in range(args.payments):
+            amount = decimal.Decimal(rng.randint(-10**9, 10**9)).scaleb(-7)
+            horizon.pay(ACCOUNT, "SEAL", ISSUER, amount)
+            if i == args.payments // 4:
+                horizon.drop_streams()
+            elif i == args.payments // 2:
+                horizon.stream_errors = True
+                horizon.drop_streams()
+                time.sleep(1.0)
+            elif i == 3 * args.payments // 4:
+                horizon.stream_errors = False
+            time.sleep(0.002)
+
+        expected = load_account(horizon.url)
+        deadline = time.monotonic() + 5
+        while cache.balance != expected and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        load_times = timed(lambda: load_account(horizon.url), args.reads)
+        cache_times = timed(lambda: cache.balance, args.reads)
+        stats = cache.stats()
+        cache.stop()
+
+    print(f"{'read':<8} {'mean [ms]':>10} {'max [ms]':>10}")
+    for name, times in (("load", load_times), ("cache", cache_times)):
+        print(
+            f"{name:<8} {statistics.mean(times) * 1e3:>10.3f} "
+            f"{max(times) * 1e3:>10.3f}"
+        )
+    print(
+        f"balance {cache.balance} (account {expected}), exact: "
+        f"{cache.balance == expected}"
+    )
+    print(
+        f"{stats.events} events, {stats.syncs} loads, "
+        f"{stats.reconnects} reconnections, {horizon.requests} requests"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""SPI transactions of the e-paper driver, byte by byte versus batched.
+
+The driver runs on a fake panel recording the SPI writes and the writes of
+the DC pin, which selects commands or data. Before the `SpiTransport`,
+each command and each parameter byte was a write of its own, preceded by
+a write of the DC pin; the framebuffer was a single write. The batched
+transport sends consecutive commands in one write and only toggles DC
+between commands and data.
+
+The wire time is the time to clock the bytes at the SPI speed. On a
+Raspberry Pi, each write also costs a system call and each DC write a
+GPIO access: the estimate adds `--write-overhead` and `--gpio-overhead`
+for them.
+
+Run from the ``iot`` folder::
+
+    python -m benchmarks.bench_epd --speed 4 --speed 10
+"""
+import argparse
+import time
+
+from PIL import Image, ImageDraw
+
+from benchmarks.fake_epd import FakeConfig
+from screen import epd2in13_V4
+
+
+class PerByteTransport(epd2in13_V4.SpiTransport):
+    """Send commands and parameters byte by byte, as before the batching."""
+
+    def send(self, sequence):
+        for command, payload in sequence:
+            self._write(0, [command])
+            if not payload:
+                continue
+            if len(payload) > 4:
+                # framebuffers were sent in one write
+                self._write(1, payload)
+            else:
+                for byte in payload:
+                    self._write(1, [byte])
+
+    def _write(self, dc, data):
+        self.epdconfig.digital_write(self.epdconfig.DC_PIN, dc)
+        self.epdconfig.spi_writebyte2(data)
+
+
+def frames(epd: epd2in13_V4.EPD):
+    """Two frames, the second one with a value changed."""
+    image = Image.new("1", (epd.height, epd.width), 255)
+    draw = ImageDraw.Draw(image)
+    draw.text((140, 85), "- On-chain:  1.02e+09", fill=0)
+    first = image.copy()
+    draw.rectangle(((140, 85), (250, 97)), fill=255)
+    draw.text((140, 85), "- On-chain:  1.03e+09", fill=0)
+    return first, image
+
+
+def run(transport: str, speed: int, repeat: int):
+    """Counters of each operation, averaged over `repeat` runs."""
+    config = FakeConfig(max_speed_hz=speed)
+    epd = epd2in13_V4.EPD(config)
+    if transport == "per byte":
+        epd.transport = PerByteTransport(config)
+    first, second = frames(epd)
+    operations = {
+        "init": epd.init,
+        "full": lambda: epd.display_part_base_image(epd.get_buffer(first)),
+        "diff": lambda: epd.display_diff(second),
+        "sleep": lambda: epd.sleep(power_off=False),
+    }
+    results = {}
+    for name, operation in operations.items():
+        host = 0.0
+        for _ in range(repeat):
+            if name == "diff":
+                # back to the first frame, without counting it
+                epd.display_diff(first)
+            config.reset_counters()
+            start = time.perf_counter()
+            operation()
+            host += time.perf_counter() - start
+        results[name] = (
+            config.SPI.writes,
+            config.dc_writes,
+            config.SPI.bytes_sent,
+            config.SPI.wire_time,
+            host / repeat,
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--speed", type=float, action="append", help="SPI clock [MHz], repeatable"
+    )
+    parser.add_argument("--write-overhead", type=float, default=20.0, help="us")
+    parser.add_argument("--gpio-overhead", type=float, default=10.0, help="us")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    speeds = args.speed or [4.0, 10.0]
+
+    print(
+        f"{'MHz':>4} {'operation':<10} {'transport':<9} {'writes':>7} "
+        f"{'DC writes':>10} {'bytes':>6} {'wire [ms]':>10} {'est. [ms]':>10} "
+        f"{'host [ms]':>10}"
+    )
+    for speed in speeds:
+        for transport in ("per byte", "batched"):
+            results = run(transport, int(speed * 1e6), args.repeat)
+            for name, (writes, dc_writes, n_bytes, wire, host) in results.items():
+                estimate = (
+                    wire
+                    + writes * args.write_overhead * 1e-6
+                    + dc_writes * args.gpio_overhead * 1e-6
+                )
+                print(
+                    f"{speed:>4g} {name:<10} {transport:<9} {writes:>7} "
+                    f"{dc_writes:>10} {n_bytes:>6} {wire * 1e3:>10.2f} "
+                    f"{estimate * 1e3:>10.2f} {host * 1e3:>10.3f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
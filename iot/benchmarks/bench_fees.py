@@ -0,0 +1,125 @@
+"""Fee paid against time to inclusion, fixed fee versus percentile policies.
+
+The network is replayed from recorded ``getFeeStats`` responses: at each
+ledger, a transaction is included if its inclusion fee is above a clearing
+fee drawn from the recorded distribution. Time is simulated, one ledger
+every `soroban.LEDGER_CLOSE_TIME` seconds.
+
+Run from the ``iot`` folder::
+
+    python -m benchmarks.bench_fees
+"""
+import argparse
+import asyncio
+import bisect
+import pathlib
+import random
+import statistics
+
+import fees
+from soroban import LEDGER_CLOSE_TIME
+
+
+FIXTURES = pathlib.Path(__file__).parent / "fixtures"
+# ledgers waited at most by a transaction which is never bumped
+MAX_LEDGERS = 1000
+
+
+def load_fee_stats(name: str):
+    from stellar_sdk.soroban_rpc import GetFeeStatsResponse
+
+    path = FIXTURES / f"fee_stats_{name}.json"
+    return GetFeeStatsResponse.model_validate_json(path.read_text())
+
+
+class Network:
+    """Replay recorded fee stats, with a simulated clock."""
+
+    def __init__(self, fee_stats, seed: int = 0):
+        self.fee_stats = fee_stats
+        self.now = 0.0
+        self.rng = random.Random(seed)
+        distribution = fee_stats.soroban_inclusion_fee
+        self.quantiles = [0.0] + [p / 100 for p in fees.PERCENTILES] + [1.0]
+        self.values = (
+            [distribution.min]
+            + [getattr(distribution, f"p{p}") for p in fees.PERCENTILES]
+            + [distribution.max]
+        )
+
+    async def get_fee_stats(self):
+        return self.fee_stats
+
+    def clearing_fee(self) -> float:
+        """Fee to be included in the next ledger, interpolated."""
+        u = self.rng.random()
+        i = min(bisect.bisect_right(self.quantiles, u), len(self.quantiles) - 1)
+        q0, q1 = self.quantiles[i - 1], self.quantiles[i]
+        v0, v1 = self.values[i - 1], self.values[i]
+        return v0 + (v1 - v0) * (u - q0) / (q1 - q0)
+
+
+async def invoke(policy: "fees.FeePolicy", network: Network) -> float:
+    """Seconds from the first send to the inclusion."""
+    fee = await policy.fee(network)  # type: ignore[arg-type]
+    start = network.now
+    while True:
+        sent = network.now
+        if policy.inclusion_timeout is None:
+            n_ledgers = MAX_LEDGERS
+        else:
+            n_ledgers = max(int(policy.inclusion_timeout // LEDGER_CLOSE_TIME), 1)
+        for _ in range(n_ledgers):
+            network.now += LEDGER_CLOSE_TIME
+            if fee >= network.clearing_fee():
+                policy.record(fee, network.now - sent, included=True)
+                return network.now - start
+        # expired, the confirmation deadline is a bit later
+        network.now += 2 * LEDGER_CLOSE_TIME
+        policy.record(fee, network.now - sent, included=False)
+        fee = policy.bump(fee)
+
+
+async def simulate(
+    policy: "fees.FeePolicy", network: Network, n_calls: int
+) -> list[float]:
+    inclusion_times = []
+    for _ in range(n_calls):
+        inclusion_times.append(await invoke(policy, network))
+        network.now += 3600
+    return inclusion_times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=500)
+    args = parser.parse_args()
+
+    print(
+        f"{'network':<8} {'policy':<8} {'mean fee':>10} {'mean incl. [s]':>15} "
+        f"{'max incl. [s]':>14} {'bumps':>6} {'getFeeStats':>12}"
+    )
+    for name in ("quiet", "busy"):
+        fee_stats = load_fee_stats(name)
+        for label in ("fixed", "p50", "p70", "p90"):
+            network = Network(fee_stats)
+            if label == "fixed":
+                policy = fees.FixedFee(200_000)
+            else:
+                policy = fees.PercentileFeePolicy(
+                    int(label[1:]), clock=lambda network=network: network.now
+                )
+            inclusion_times = asyncio.run(simulate(policy, network, args.calls))
+            stats = policy.stats()
+            # expired transactions are not charged
+            paid = [record.fee for record in policy.records if record.included]
+            print(
+                f"{name:<8} {label:<8} {statistics.mean(paid):>10.0f} "
+                f"{statistics.mean(inclusion_times):>15.1f} "
+                f"{max(inclusion_times):>14.1f} {stats.bumps:>6} "
+                f"{stats.fee_stats_calls:>12}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Compare fixed-window and adaptive level sampling on a simulated tank.
+
+The sensor is read at the pace of an HC-SR04 and its noise is quantised at
+its resolution. A still surface only has the sensor noise while a sloshing
+one, right after a pump run, adds a damped oscillation.
+
+Run from the ``iot`` folder::
+
+    python -m benchmarks.bench_level
+"""
+import argparse
+import math
+import random
+import time
+
+import level
+import seal_coin_supply
+
+
+LEVEL = 0.05  # m
+RESOLUTION = seal_coin_supply.LEVEL_RESOLUTION
+READ_TIME = 0.005  # s
+
+
+class SimulatedSensor:
+    def __init__(self, slosh: float = 0.0, damping: float = 1.0):
+        self.slosh = slosh
+        self.damping = damping
+        self.start = time.monotonic()
+
+    @property
+    def distance(self) -> float:
+        time.sleep(READ_TIME)
+        elapsed = time.monotonic() - self.start
+        wave = self.slosh * math.exp(-elapsed / self.damping) * math.cos(15 * elapsed)
+        noise = random.gauss(0, RESOLUTION / 3)
+        return round((LEVEL + wave + noise) / RESOLUTION) * RESOLUTION
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    token_per_meter = seal_coin_supply.TOKEN_PER_METER
+    tolerance = seal_coin_supply.LEVEL_TOLERANCE / token_per_meter
+
+    print(f"{'surface':<8} {'mode':<9} {'time [s]':>9} {'samples':>8} "
+          f"{'error [SEAL]':>13} {'+/- [SEAL]':>11}")
+    for surface, slosh in (("still", 0.0), ("sloshing", 0.01)):
+        for mode, mode_tolerance in (("fixed", None), ("adaptive", tolerance)):
+            timings, samples, errors, uncertainties = [], [], [], []
+            for _ in range(args.repeat):
+                sampler = level.LevelSampler(
+                    SimulatedSensor(slosh=slosh),
+                    window=seal_coin_supply.LEVEL_WINDOW,
+                    interval=seal_coin_supply.LEVEL_INTERVAL,
+                    resolution=seal_coin_supply.LEVEL_RESOLUTION,
+                    decorrelation=seal_coin_supply.LEVEL_DECORRELATION,
+                ).start()
+                start = time.monotonic()
+                reading = sampler.read(
+                    since=start,
+                    tolerance=mode_tolerance,
+                    min_samples=seal_coin_supply.LEVEL_MIN_SAMPLES,
+                )
+                timings.append(time.monotonic() - start)
+                sampler.stop()
+                samples.append(reading.n_samples)
+                errors.append(abs(reading.distance - LEVEL) * token_per_meter)
+                uncertainties.append(reading.uncertainty * token_per_meter)
+
+            n = args.repeat
+            print(
+                f"{surface:<8} {mode:<9} {sum(timings) / n:>9.3f} "
+                f"{sum(samples) / n:>8.1f} {max(errors):>13,.0f} "
+                f"{max(uncertainties):>11,.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Query the SII oracle against local stand-ins with latency and failures.
+
+Run from the ``iot`` folder::
+
+    python -m benchmarks.bench_oracle
+"""
+import argparse
+import contextlib
+import tempfile
+
+import climatology
+import sii
+from benchmarks.standin import serve_file
+
+
+# (latency in s, error rate) of each mirror
+MIRRORS = [(0.05, 0.0), (0.2, 0.0), (0.1, 1.0), (5.0, 0.0)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quorum", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=1.0)
+    args = parser.parse_args()
+
+    with contextlib.ExitStack() as stack, tempfile.TemporaryDirectory() as cache_dir:
+        sources = []
+        for latency, error_rate in MIRRORS:
+            url = stack.enter_context(
+                serve_file(
+                    climatology.DAILY_CSV, latency=latency, error_rate=error_rate
+                )
+            )
+            sources.append(sii.DailyExtentCache(url, cache_dir, timeout=args.timeout))
+        sources.append(sii.LocalSource(climatology.DAILY_CSV))
+
+        oracle = sii.Oracle(sources, quorum=args.quorum, timeout=args.timeout)
+        for attempt in ("cold", "warm"):
+            try:
+                reading = oracle.query()
+            except sii.QuorumError as ex:
+                print(f"{attempt}: {ex}")
+                responses = ex.responses
+            else:
+                print(f"{attempt}: doy={reading.doy} extent={reading.extent}")
+                responses = reading.responses
+            for response in responses:
+                status = response.value if response.error is None else response.error
+                elapsed = response.elapsed * 1e3
+                print(f"    {elapsed:>8.1f} ms  {response.name}: {status!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Compare open and closed-loop pump control on a simulated tank.
+
+The pump of the simulation is slower than the calibrated `FLOW_RATE`, has
+a different flow rate in each direction, takes a moment to reach full flow
+and keeps running briefly after being stopped. The level sensor is noisy
+and quantised. Time is simulated, so the runs take no wall-clock time.
+
+Run from the ``iot`` folder::
+
+    python -m benchmarks.bench_pump
+"""
+import argparse
+import random
+import statistics
+
+import level
+import pump
+import seal_coin_supply
+
+
+# simulated pump, l/s per direction
+TRUE_FLOW_RATE = {"mint": 1 / 380, "burn": 1 / 420}
+SPIN_UP = 0.3  # s to full flow
+SPIN_DOWN = 0.2  # s of flow after a stop
+RESOLUTION = seal_coin_supply.LEVEL_RESOLUTION
+SAMPLE_TIME = 0.015  # s per sensor sample
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += max(seconds, 0.0)
+
+
+class Tank:
+    """Pump and container, the content is in token."""
+
+    def __init__(self, clock: Clock):
+        self.clock = clock
+        self.content = seal_coin_supply.TOKEN_GENESIS / 2
+        self._sign = 0
+        self._rate = 0.0
+        self._started = self._updated = 0.0
+
+    def forward(self, speed: float = 1) -> None:
+        self._start(1, TRUE_FLOW_RATE["mint"])
+
+    def backward(self, speed: float = 1) -> None:
+        self._start(-1, TRUE_FLOW_RATE["burn"])
+
+    def stop(self) -> None:
+        self._update()
+        self.content += self._sign * self._rate * SPIN_DOWN
+        self._sign = 0
+
+    def _start(self, sign: int, flow_rate: float) -> None:
+        self._update()
+        self._sign = sign
+        self._rate = flow_rate / seal_coin_supply.LITER_PER_TOKEN
+        self._started = self._updated = self.clock()
+
+    def _update(self) -> None:
+        now = self.clock()
+        if self._sign:
+            delivered = _delivered(now - self._started)
+            delivered -= _delivered(self._updated - self._started)
+            self.content += self._sign * self._rate * delivered
+        self._updated = now
+
+    @property
+    def distance(self) -> float:
+        self._update()
+        liters = self.content * seal_coin_supply.LITER_PER_TOKEN
+        distance = seal_coin_supply.LENGTH_CONTAINER - (
+            liters / seal_coin_supply.LITER_PER_METER
+        )
+        noise = random.gauss(0, RESOLUTION / 3)
+        return round((distance + noise) / RESOLUTION) * RESOLUTION
+
+
+def _delivered(elapsed: float) -> float:
+    """Seconds of full flow after `elapsed` s, the flow ramps up linearly."""
+    ramp = min(elapsed, SPIN_UP)
+    return ramp**2 / (2 * SPIN_UP) + max(elapsed - SPIN_UP, 0.0)
+
+
+class Sampler:
+    """`LevelSampler` taking samples on the simulated clock."""
+
+    def __init__(self, tank: Tank, clock: Clock):
+        self.tank = tank
+        self.clock = clock
+
+    def read(self, *, since=None, timeout=None, tolerance=None, min_samples=5):
+        n_samples = seal_coin_supply.LEVEL_WINDOW
+        values = []
+        for _ in range(n_samples):
+            self.clock.sleep(SAMPLE_TIME)
+            values.append(self.tank.distance)
+            if tolerance is not None and len(values) >= min_samples:
+                if level.robust_interval(values, resolution=RESOLUTION)[1] <= tolerance:
+                    break
+        distance, uncertainty = level.robust_interval(values, resolution=RESOLUTION)
+        return level.LevelReading(
+            distance, self.clock(), 0.0, 0.0, len(values), uncertainty
+        )
+
+
+def simulate(closed_loop: bool, n_runs: int) -> tuple[list[int], list[float]]:
+    clock = Clock()
+    tank = Tank(clock)
+    controller = pump.PumpController(
+        tank,
+        Sampler(tank, clock),
+        liter_per_meter=seal_coin_supply.LITER_PER_METER,
+        liter_per_token=seal_coin_supply.LITER_PER_TOKEN,
+        flow_rate=seal_coin_supply.FLOW_RATE,
+        tolerance=seal_coin_supply.LEVEL_TOLERANCE / seal_coin_supply.TOKEN_PER_METER,
+        min_samples=seal_coin_supply.LEVEL_MIN_SAMPLES,
+        clock=clock,
+        sleep=clock.sleep,
+    )
+    errors, durations = [], []
+    for i in range(n_runs):
+        operation = "mint" if i % 2 == 0 else "burn"
+        n_token = seal_coin_supply.MINT_AMOUNT
+        before = tank.content
+        run = controller.run(n_token, operation, closed_loop=closed_loop)
+        clock.sleep(controller.settle_time)
+        moved = abs(tank.content - before)
+        errors.append(round(moved - n_token))
+        durations.append(run.duration)
+    return errors, durations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=40)
+    args = parser.parse_args()
+
+    print(f"{'mode':<12} {'run':>4} {'error [SEAL]':>14} {'pump time [s]':>14}")
+    for mode, closed_loop in (("open loop", False), ("closed loop", True)):
+        errors, durations = simulate(closed_loop, args.runs)
+        for i in (0, 1, args.runs - 2, args.runs - 1):
+            print(f"{mode:<12} {i + 1:>4} {errors[i]:>14,} {durations[i]:>14.1f}")
+        late = [abs(error) for error in errors[args.runs // 2 :]]
+        print(f"{mode:<12} {'mean':>4} {statistics.mean(late):>14,.0f}  (last half)")
+
+
+if __name__ == "__main__":
+    main()
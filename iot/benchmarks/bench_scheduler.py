@@ -0,0 +1,93 @@
+"""Simulate a week of oracle polling, hourly loop versus scheduler.
+
+The oracle publishes the value of the day at a random time around the
+expected publication time. The hourly loop polls every hour, the scheduler
+backs off from shortly before the expected time until the value is found.
+On a virtual clock, the simulated week runs in milliseconds.
+
+Run from the ``iot`` folder::
+
+    python -m benchmarks.bench_scheduler
+"""
+import argparse
+import datetime
+import random
+import statistics
+import time
+
+import scheduler
+import seal_coin_supply
+
+
+DAY = 86400
+
+
+def publications(start: float, n_days: int, spread: float, seed: int = 0):
+    """Publication time of each day, `spread` hours around the expected one."""
+    rng = random.Random(seed)
+    expected = seal_coin_supply.ORACLE_PUBLICATION
+    first = datetime.datetime.fromtimestamp(start, tz=expected.tzinfo).date()
+    times = []
+    for day in range(n_days):
+        date = first + datetime.timedelta(days=day)
+        published = datetime.datetime.combine(date, expected).timestamp()
+        times.append(published + rng.uniform(-spread, spread) * 3600)
+    return times
+
+
+def simulate(mode: str, n_days: int, spread: float):
+    clock = scheduler.VirtualClock(
+        start=datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc).timestamp()
+    )
+    start = clock.time()
+    published = publications(start, n_days, spread)
+    backoff = scheduler.DailyBackoff(
+        seal_coin_supply.ORACLE_PUBLICATION,
+        early=seal_coin_supply.ORACLE_EARLY,
+        min_interval=seal_coin_supply.ORACLE_MIN_INTERVAL,
+        max_interval=seal_coin_supply.ORACLE_MAX_INTERVAL,
+    )
+    latencies = []
+    polls = 0
+
+    def poll():
+        nonlocal polls
+        polls += 1
+        now = clock.time()
+        day = int((now - start) // DAY)
+        found = day < n_days and published[day] <= now
+        if found and len(latencies) == day:
+            latencies.append(now - published[day])
+        if mode == "hourly":
+            return None
+        return backoff(now, found=len(latencies) > day)
+
+    tasks = scheduler.Scheduler(clock)
+    tasks.add("oracle", poll, interval=3600)
+    tasks.run(until=start + n_days * DAY)
+    return polls, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--spread", type=float, default=2.0, help="hours")
+    args = parser.parse_args()
+
+    print(
+        f"{'mode':<10} {'polls/day':>10} {'mean latency [min]':>19} "
+        f"{'max latency [min]':>18} {'wall time [ms]':>15}"
+    )
+    for mode in ("hourly", "scheduler"):
+        begin = time.perf_counter()
+        polls, latencies = simulate(mode, args.days, args.spread)
+        elapsed = time.perf_counter() - begin
+        print(
+            f"{mode:<10} {polls / args.days:>10.1f} "
+            f"{statistics.mean(latencies) / 60:>19.1f} "
+            f"{max(latencies) / 60:>18.1f} {elapsed * 1e3:>15.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
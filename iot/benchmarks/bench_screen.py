@@ -0,0 +1,92 @@
+"""SPI traffic of a screen update, whole frame versus changed region.
+
+A `screen.SealScreen` session runs on a fake panel recording the SPI
+writes. Each update changes some of the values, as from one hour to the
+next, and is sent either as the whole frame (``display_partial``) or as
+the region which changed (``display_diff``). The SPI time is the time to
+clock the bytes at 4 MHz, the host time the time spent in Python.
+
+Updates are forced, otherwise the session skips the ones which do not
+change the frame: the last line gives the traffic of such a skipped one.
+A forced update of an unchanged frame sends the whole frame.
+
+Run from the ``iot`` folder::
+
+    python -m benchmarks.bench_screen
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks.fake_epd import FakeConfig
+from screen import epd2in13_V4, screen
+
+
+class WholeFrameEPD(epd2in13_V4.EPD):
+    """Send the whole frame on each update, as before the diff."""
+
+    def display_diff(self, image, force=False):
+        self.display_partial(self.get_buffer(image))
+        return 0, 0, self.width - 1, self.height - 1
+
+
+# values drawn by an update, see `SealScreen.update_screen`
+BASE = dict(seal_onchain=1.02e9, seal_offchain=1.02e9, ice_extent=13976, delta=-0.55)
+UPDATES = {
+    "nothing": {},
+    "on-chain": dict(seal_onchain=1.03e9),
+    "supplies": dict(seal_onchain=1.04e9, seal_offchain=1.04e9),
+    "all": dict(
+        seal_onchain=1.05e9, seal_offchain=1.05e9, ice_extent=13801, delta=-0.72
+    ),
+}
+
+
+def measure(epd_class, change: dict, repeat: int):
+    config = FakeConfig()
+    session = screen.SealScreen(full_refresh_every=10**9, epd=epd_class(config))
+    rows = []
+    for _ in range(repeat):
+        session.update_screen(**BASE)
+        config.reset_counters()
+        start = time.perf_counter()
+        session.update_screen(**{**BASE, **change}, force=True)
+        host_time = time.perf_counter() - start
+        spi = config.SPI
+        rows.append((spi.bytes_sent, spi.writes, spi.wire_time, host_time))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(
+        f"{'change':<10} {'update':<12} {'bytes':>6} {'writes':>7} "
+        f"{'SPI [ms]':>9} {'host [ms]':>10}"
+    )
+    drivers = (("whole frame", WholeFrameEPD), ("diff", epd2in13_V4.EPD))
+    for name, change in UPDATES.items():
+        for label, epd_class in drivers:
+            rows = measure(epd_class, change, args.repeat)
+            n_bytes, writes, wire_time, _ = rows[-1]
+            host_time = statistics.median(row[3] for row in rows)
+            print(
+                f"{name:<10} {label:<12} {n_bytes:>6} {writes:>7} "
+                f"{wire_time * 1e3:>9.2f} {host_time * 1e3:>10.2f}"
+            )
+
+    config = FakeConfig()
+    session = screen.SealScreen(epd=epd2in13_V4.EPD(config))
+    session.update_screen(**BASE)
+    config.reset_counters()
+    refreshed = session.update_screen(**BASE)
+    print(
+        f"unchanged update without force: refreshed {refreshed}, "
+        f"{config.SPI.bytes_sent} bytes, {session.stats().skipped} skipped"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Compare the SII parsers on the bundled daily extent file.
+
+Run from the ``iot`` folder::
+
+    python -m benchmarks.bench_sii
+"""
+import argparse
+import pathlib
+import time
+import tracemalloc
+
+import sii
+
+
+DAILY_CSV = (
+    pathlib.Path(__file__).parents[2]
+    / "exploration"
+    / "N_seaice_extent_daily_v3.0.csv"
+)
+
+
+def bench(engine: str, path: pathlib.Path, repeat: int) -> tuple[float, float]:
+    """Best time in ms and peak traced memory in MiB of `sii.read_last_row`."""
+    # warm-up: imports and OS file cache
+    sii.read_last_row(path, engine=engine)
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        sii.read_last_row(path, engine=engine)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    sii.read_last_row(path, engine=engine)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return min(timings) * 1e3, peak / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--path", type=pathlib.Path, default=DAILY_CSV)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{args.path.name}: {sum(1 for _ in open(args.path))} lines")
+    print(f"{'engine':<8} {'time [ms]':>10} {'peak [MiB]':>11}  result")
+    for engine in ("stream", "pandas"):
+        time_ms, peak = bench(engine, args.path, args.repeat)
+        result = sii.read_last_row(args.path, engine=engine)
+        print(f"{engine:<8} {time_ms:>10.3f} {peak:>11.3f}  {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Throughput and latency of contract invocations against a local Soroban RPC.
+
+`soroban.soroban_invoke` is timed end to end, from the simulation to the
+confirmation, against the stand-in of `benchmarks.standin`:
+
+- ``sequential``: one signer, one invocation after the other,
+- ``concurrent``: one thread per signer, each one invoking in a loop,
+- ``batch``: `soroban.soroban_invoke_batch` over all signers at once, each
+  signer invoking one after the other.
+
+The stand-in queues one transaction per account and per ledger, as
+stellar-core does, so throughput is bounded by the number of signers per
+ledger. Latency, RPC errors and failed transactions can be injected.
+
+Run from the ``iot`` folder::
+
+    python -m benchmarks.bench_soroban --ledger-close-time 5
+"""
+import argparse
+import concurrent.futures
+import logging
+import time
+
+import soroban
+from benchmarks.standin import serve_soroban_rpc
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * p / 100), len(ordered) - 1)]
+
+
+def invoke(keypair, contract_id: str, args) -> float:
+    start = time.perf_counter()
+    soroban.soroban_invoke(keypair.secret, contract_id, "correct_supply", args)
+    return time.perf_counter() - start
+
+
+def run_sequential(keypairs, contract_id, args, n_calls):
+    latencies, failures = [], 0
+    for _ in range(n_calls):
+        try:
+            latencies.append(invoke(keypairs[0], contract_id, args))
+        except Exception:
+            failures += 1
+    return latencies, failures
+
+
+def run_concurrent(keypairs, contract_id, args, n_calls):
+    def worker(keypair, n):
+        latencies, failures = [], 0
+        for _ in range(n):
+            try:
+                latencies.append(invoke(keypair, contract_id, args))
+            except Exception:
+                failures += 1
+        return latencies, failures
+
+    n_signers = len(keypairs)
+    counts = [
+        n_calls // n_signers + (i < n_calls % n_signers) for i in range(n_signers)
+    ]
+    with concurrent.futures.ThreadPoolExecutor(n_signers) as executor:
+        results = list(executor.map(worker, keypairs, counts))
+    return (
+        [latency for latencies, _ in results for latency in latencies],
+        sum(failures for _, failures in results),
+    )
+
+
+def run_batch(keypairs, contract_id, args, n_calls):
+    invocations = [(keypairs[i % len(keypairs)].secret, args) for i in range(n_calls)]
+    results = soroban.soroban_invoke_batch(contract_id, "correct_supply", invocations)
+    latencies = [r.timing.total for r in results if not isinstance(r, Exception)]
+    return latencies, sum(isinstance(r, Exception) for r in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=40)
+    parser.add_argument("--signers", type=int, default=4)
+    parser.add_argument("--ledger-close-time", type=float, default=1.0, help="s")
+    parser.add_argument("--latency", type=float, default=0.02, help="s")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    # failed invocations are counted in the table
+    logging.getLogger("soroban").setLevel(logging.ERROR)
+
+    from stellar_sdk import Keypair, StrKey, scval
+
+    contract_id = StrKey.encode_contract(bytes(32))
+    soroban.LEDGER_CLOSE_TIME = args.ledger_close_time
+
+    print(
+        f"{'mode':<11} {'ok':>4} {'failed':>7} {'calls/s':>8} "
+        f"{'p50 [ms]':>9} {'p99 [ms]':>9} {'ledgers':>8}"
+    )
+    modes = (
+        ("sequential", run_sequential),
+        ("concurrent", run_concurrent),
+        ("batch", run_batch),
+    )
+    for name, run in modes:
+        # new accounts, as each stand-in starts from a sequence number of 0
+        keypairs = [Keypair.random() for _ in range(args.signers)]
+        call_args = [
+            scval.to_address(keypairs[0].public_key),
+            scval.to_address(keypairs[-1].public_key),
+            scval.to_int32(42),
+            scval.to_int32(13_976),
+        ]
+        with serve_soroban_rpc(
+            latency=args.latency,
+            error_rate=args.error_rate,
+            failure_rate=args.failure_rate,
+            ledger_close_time=args.ledger_close_time,
+            seed=0,
+        ) as rpc:
+            soroban.rpc_server_url = rpc.url
+            first_ledger = rpc.ledger
+            start = time.perf_counter()
+            latencies, failures = run(keypairs, contract_id, call_args, args.calls)
+            elapsed = time.perf_counter() - start
+            ledgers = rpc.ledger - first_ledger
+        if latencies:
+            p50 = percentile(latencies, 50) * 1e3
+            p99 = percentile(latencies, 99) * 1e3
+        else:
+            p50 = p99 = float("nan")
+        print(
+            f"{name:<11} {len(latencies):>4} {failures:>7} "
+            f"{len(latencies) / elapsed:>8.2f} {p50:>9.0f} {p99:>9.0f} "
+            f"{ledgers:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
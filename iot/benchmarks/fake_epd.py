@@ -0,0 +1,81 @@
+"""Fake GPIO and SPI of the e-paper panel, to run the driver without hardware.
+
+Delays are not slept but added up, and the panel is never busy: waits for
+the BUSY pin return at once::
+
+    config = FakeConfig()
+    epd = epd2in13_V4.EPD(config)
+    ...
+    config.SPI.writes, config.SPI.bytes_sent, config.dc_writes, config.delay
+"""
+from screen import epd2in13_V4
+
+
+class RecordingSpi:
+    """Count the writes and bytes sent over SPI."""
+
+    def __init__(self, max_speed_hz: int = 4_000_000):
+        self.max_speed_hz = max_speed_hz
+        self.mode = 0
+        self.writes = 0
+        self.bytes_sent = 0
+
+    def open(self, bus, device):
+        pass
+
+    def close(self):
+        pass
+
+    def writebytes(self, data):
+        self.writes += 1
+        self.bytes_sent += len(data)
+
+    writebytes2 = writebytes
+
+    @property
+    def wire_time(self) -> float:
+        """Seconds to clock the bytes sent at `max_speed_hz`."""
+        return self.bytes_sent * 8 / self.max_speed_hz
+
+
+class FakeConfig(epd2in13_V4.RaspberryPi):
+    """`RaspberryPi` recording SPI traffic, writes of the DC pin and delays."""
+
+    def __init__(self, max_speed_hz: int = 4_000_000):
+        self.SPI = RecordingSpi(max_speed_hz)
+        self.max_speed_hz = max_speed_hz
+        self.spi_open = False
+        self._dc = None
+        self.pins: dict[int, int] = {}
+        self.dc_writes = 0
+        # seconds of delay_ms
+        self.delay = 0.0
+
+    def reset_counters(self) -> None:
+        self.SPI.writes = self.SPI.bytes_sent = 0
+        self.dc_writes = 0
+        self.delay = 0.0
+
+    def digital_write(self, pin, value):
+        if pin == self.DC_PIN:
+            self.dc_writes += 1
+            self._dc = value
+        self.pins[pin] = value
+
+    def digital_read(self, pin):
+        if pin == self.BUSY_PIN:
+            return 0
+        return self.pins.get(pin, 0)
+
+    def wait_busy(self, level, timeout):
+        return True
+
+    def delay_ms(self, delaytime):
+        self.delay += delaytime / 1000.0
+
+    def module_init(self):
+        self.spi_open = True
+        return 0
+
+    def module_exit(self, cleanup=False):
+        self.spi_open = False
@@ -0,0 +1,705 @@
+"""Local HTTP stand-ins of the NSIDC, Horizon and Soroban RPC servers.
+
+The file server answers conditional requests (ETag/Last-Modified) and byte
+ranges, and can inject latency and failures::
+
+    with serve_file(DAILY_CSV, latency=0.2, error_rate=0.5) as url:
+        ...
+
+The Horizon stand-in serves the balances of accounts and streams their
+effects as server-sent events::
+
+    with serve_horizon() as horizon:
+        horizon.pay(account_id, "SEAL", issuer, decimal.Decimal("1.5"))
+
+The Soroban RPC stand-in answers the JSON-RPC methods used by
+`soroban.soroban_invoke_async` and closes ledgers on a timer, with latency,
+errors and failed transactions injected::
+
+    with serve_soroban_rpc(ledger_close_time=1.0, error_rate=0.01) as rpc:
+        soroban.rpc_server_url = rpc.url
+"""
+import collections
+import contextlib
+import decimal
+import email.utils
+import hashlib
+import http.server
+import json
+import os
+import pathlib
+import random
+import threading
+import time
+import urllib.parse
+from typing import Iterator, Optional
+
+
+FIXTURES = pathlib.Path(__file__).parent / "fixtures"
+
+
+class FileHandler(http.server.BaseHTTPRequestHandler):
+    """Serve ``server.path`` at any URL, see `serve_file`."""
+
+    def do_GET(self):
+        server = self.server
+        server.requests += 1
+        time.sleep(server.latency)
+        if random.random() < server.error_rate:
+            self.send_error(503)
+            return
+
+        data = server.path.read_bytes()
+        etag = '"' + hashlib.sha1(data).hexdigest()[:16] + '"'
+        last_modified = email.utils.formatdate(
+            server.path.stat().st_mtime, usegmt=True
+        )
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        status, body = 200, data
+        byte_range = self.headers.get("Range", "")
+        if server.ranges and byte_range.startswith("bytes=-"):
+            status, body = 206, data[-int(byte_range[len("bytes=-") :]) :]
+
+        self.send_response(status)
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        self.send_header("Content-Length", str(len(body)))
+        if server.ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        self.wfile.write(body)
+        server.bytes_sent += len(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextlib.contextmanager
+def serve_file(
+    path: "os.PathLike[str] | str",
+    *,
+    latency: float = 0.0,
+    error_rate: float = 0.0,
+    ranges: bool = True,
+) -> Iterator[str]:
+    """Serve a file in a background thread and yield its URL.
+
+    Parameters
+    ----------
+    path : path-like
+        File to serve.
+    latency : float
+        Delay in seconds before answering each request.
+    error_rate : float
+        Probability to answer with an HTTP 503 error.
+    ranges : bool
+        Whether byte ranges are supported.
+    """
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), FileHandler)
+    server.daemon_threads = True
+    server.path = pathlib.Path(path)
+    server.latency = latency
+    server.error_rate = error_rate
+    server.ranges = ranges
+    server.requests = 0
+    server.bytes_sent = 0
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}/{server.path.name}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class Horizon:
+    """Accounts of the Horizon stand-in, see `serve_horizon`.
+
+    Each payment closes a ledger with a single effect.
+
+    Attributes
+    ----------
+    url : str
+        Base URL of the server.
+    stream_errors : bool
+        Answer stream requests with an HTTP 503 error.
+    latency : float
+        Delay in seconds before answering each request.
+    requests : int
+        Number of requests received.
+    sequences : dict
+        Sequence number of the accounts, shared with a `SorobanRpc`.
+    """
+
+    def __init__(self, latency: float = 0.0, ledger: int = 1000):
+        self.url = ""
+        self.latency = latency
+        self.stream_errors = False
+        self.requests = 0
+        self.ledger = ledger
+        # account -> (code, issuer) -> [balance, last modified ledger]
+        self.balances: dict[str, dict[tuple[str, str], list]] = {}
+        self.sequences: dict[str, int] = {}
+        self.effects: list[dict] = []
+        self._cond = threading.Condition()
+        # streams opened before a drop are closed
+        self._generation = 0
+
+    def pay(
+        self,
+        account_id: str,
+        asset_code: str,
+        asset_issuer: str,
+        amount: decimal.Decimal,
+    ) -> None:
+        """Credit (positive) or debit (negative) an account in a new ledger."""
+        with self._cond:
+            self.ledger += 1
+            entry = self.balances.setdefault(account_id, {}).setdefault(
+                (asset_code, asset_issuer), [decimal.Decimal(0), self.ledger]
+            )
+            entry[0] += amount
+            entry[1] = self.ledger
+            self.effects.append(
+                {
+                    "id": f"{self.ledger << 32}-1",
+                    "paging_token": f"{self.ledger << 32}-1",
+                    "account": account_id,
+                    "type": "account_credited" if amount > 0 else "account_debited",
+                    "asset_type": "credit_alphanum4",
+                    "asset_code": asset_code,
+                    "asset_issuer": asset_issuer,
+                    "amount": f"{abs(amount):.7f}",
+                }
+            )
+            self._cond.notify_all()
+
+    def drop_streams(self) -> None:
+        """Close the open streams, e.g. to test reconnections."""
+        with self._cond:
+            self._generation += 1
+            self._cond.notify_all()
+
+    def account(self, account_id: str) -> Optional[dict]:
+        with self._cond:
+            if account_id not in self.balances and account_id not in self.sequences:
+                return None
+            balances = [
+                {
+                    "asset_type": "credit_alphanum4",
+                    "asset_code": code,
+                    "asset_issuer": issuer,
+                    "balance": f"{balance:.7f}",
+                    "last_modified_ledger": ledger,
+                }
+                for (code, issuer), (balance, ledger) in self.balances.get(
+                    account_id, {}
+                ).items()
+            ]
+            sequence = self.sequences.get(account_id, 0)
+        balances.append({"asset_type": "native", "balance": "10000.0000000"})
+        return {
+            "id": account_id,
+            "account_id": account_id,
+            "sequence": str(sequence),
+            "balances": balances,
+        }
+
+    def effects_after(self, account_id: str, cursor: str) -> list[dict]:
+        with self._cond:
+            return [
+                effect
+                for effect in self.effects
+                if effect["account"] == account_id
+                and _paging_key(effect["paging_token"]) > _paging_key(cursor)
+            ]
+
+
+def _paging_key(paging_token: str) -> tuple[int, int]:
+    toid, _, index = paging_token.partition("-")
+    return int(toid), int(index or 0)
+
+
+class HorizonHandler(http.server.BaseHTTPRequestHandler):
+    """Horizon account and effects endpoints, see `serve_horizon`."""
+
+    def do_GET(self):
+        horizon: Horizon = self.server.horizon
+        horizon.requests += 1
+        time.sleep(horizon.latency)
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        parts = url.path.strip("/").split("/")
+        if len(parts) == 2 and parts[0] == "accounts":
+            account = horizon.account(parts[1])
+            if account is None:
+                self._send_json(404, {"status": 404, "title": "Resource Missing"})
+            else:
+                self._send_json(200, account)
+        elif len(parts) == 3 and parts[0] == "accounts" and parts[2] == "effects":
+            if "text/event-stream" in self.headers.get("Accept", ""):
+                self._stream(horizon, parts[1], query.get("cursor", "0"))
+                return
+            effects = horizon.effects_after(parts[1], "0")
+            if query.get("order") == "desc":
+                effects.reverse()
+            limit = int(query.get("limit", 10))
+            self._send_json(200, {"_embedded": {"records": effects[:limit]}})
+        else:
+            self._send_json(404, {"status": 404, "title": "Resource Missing"})
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, horizon: Horizon, account_id: str, cursor: str) -> None:
+        if horizon.stream_errors:
+            self._send_json(503, {"status": 503, "title": "Service Unavailable"})
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        self.wfile.write(b'retry: 1000\nevent: open\ndata: "hello"\n\n')
+        with horizon._cond:
+            generation = horizon._generation
+        try:
+            while True:
+                for effect in horizon.effects_after(account_id, cursor):
+                    message = (
+                        f"id: {effect['paging_token']}\n"
+                        f"data: {json.dumps(effect)}\n\n"
+                    )
+                    self.wfile.write(message.encode())
+                    cursor = effect["paging_token"]
+                self.wfile.flush()
+                with horizon._cond:
+                    horizon._cond.wait_for(
+                        lambda: horizon._generation != generation
+                        or bool(horizon.effects_after(account_id, cursor)),
+                        timeout=1.0,
+                    )
+                    if horizon._generation != generation:
+                        return
+        except OSError:
+            return
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextlib.contextmanager
+def serve_horizon(latency: float = 0.0) -> Iterator[Horizon]:
+    """Serve a Horizon stand-in in a background thread.
+
+    Parameters
+    ----------
+    latency : float
+        Delay in seconds before answering each request.
+    """
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), HorizonHandler)
+    server.daemon_threads = True
+    server.horizon = Horizon(latency=latency)
+    server.horizon.url = f"http://127.0.0.1:{server.server_port}"
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server.horizon
+    finally:
+        server.horizon.drop_streams()
+        server.shutdown()
+        server.server_close()
+
+
+class SorobanRpc:
+    """Ledgers of the Soroban RPC stand-in, see `serve_soroban_rpc`.
+
+    A ledger closes every `ledger_close_time` seconds and includes the
+    pending transactions which did not expire. As stellar-core, it queues
+    at most one transaction per source account and rejects a wrong sequence
+    number with ``txBAD_SEQ``. Signatures and footprints are not checked:
+    simulations give an empty footprint and the invocation authorised by
+    the source account, and invocations return void.
+
+    Accounts are created on first use, with a sequence number of 0.
+
+    Attributes
+    ----------
+    url : str
+        URL of the JSON-RPC endpoint.
+    latency : float
+        Delay in seconds before answering each request.
+    error_rate : float
+        Probability to answer a request with a JSON-RPC error.
+    failure_rate : float
+        Probability for an included transaction to fail.
+    ledger_close_time : float
+        Seconds between two ledgers.
+    min_inclusion_fee : int
+        Transactions bidding a lower inclusion fee stay queued until they
+        expire, e.g. on a busy network.
+    requests : Counter
+        Number of requests received per method.
+    """
+
+    def __init__(
+        self,
+        *,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        failure_rate: float = 0.0,
+        ledger_close_time: float = 5.0,
+        fee_stats: str = "quiet",
+        horizon: Optional[Horizon] = None,
+        ledger: int = 1000,
+        seed: Optional[int] = None,
+    ):
+        self.url = ""
+        self.latency = latency
+        self.error_rate = error_rate
+        self.failure_rate = failure_rate
+        self.ledger_close_time = ledger_close_time
+        self.min_inclusion_fee = 0
+        self.requests: collections.Counter[str] = collections.Counter()
+        self.rng = random.Random(seed)
+        self.sequences = horizon.sequences if horizon is not None else {}
+        self.ledger = ledger
+        self.close_time = int(time.time())
+        self._fee_stats = json.loads(
+            (FIXTURES / f"fee_stats_{fee_stats}.json").read_text()
+        )
+        # hash -> source account, sequence number, max time, envelope,
+        # inclusion fee
+        self._pending: dict[str, tuple[str, int, int, str, int]] = {}
+        # hash -> fields of getTransaction once in a ledger
+        self._transactions: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.methods = {
+            "getLatestLedger": self.get_latest_ledger,
+            "getLedgerEntries": self.get_ledger_entries,
+            "getFeeStats": self.get_fee_stats,
+            "simulateTransaction": self.simulate_transaction,
+            "sendTransaction": self.send_transaction,
+            "getTransaction": self.get_transaction,
+        }
+
+    def close_ledgers(self) -> None:
+        """Close a ledger every `ledger_close_time` until `stop`."""
+        while not self._stop.wait(self.ledger_close_time):
+            self.close_ledger()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def close_ledger(self) -> None:
+        with self._lock:
+            self.ledger += 1
+            self.close_time = int(time.time())
+            order = 0
+            for tx_hash, (source, sequence, max_time, envelope, fee) in list(
+                self._pending.items()
+            ):
+                if max_time and max_time < self.close_time:
+                    # expired, the sequence number was not used
+                    del self._pending[tx_hash]
+                    continue
+                if fee < self.min_inclusion_fee:
+                    continue
+                del self._pending[tx_hash]
+                order += 1
+                # a failed transaction still takes its sequence number
+                self.sequences[source] = sequence
+                failed = self.rng.random() < self.failure_rate
+                self._transactions[tx_hash] = {
+                    "status": "FAILED" if failed else "SUCCESS",
+                    "applicationOrder": order,
+                    "feeBump": False,
+                    "envelopeXdr": envelope,
+                    "resultXdr": _transaction_result_xdr(
+                        "txFAILED" if failed else "txSUCCESS"
+                    ),
+                    "resultMetaXdr": _transaction_meta_xdr(),
+                    "ledger": self.ledger,
+                    "createdAt": str(self.close_time),
+                }
+
+    def _latest(self) -> dict:
+        return {
+            "latestLedger": self.ledger,
+            "latestLedgerCloseTime": str(self.close_time),
+        }
+
+    def get_latest_ledger(self, params: dict) -> dict:
+        with self._lock:
+            return {
+                "id": hashlib.sha256(str(self.ledger).encode()).hexdigest(),
+                "protocolVersion": 22,
+                "sequence": self.ledger,
+                "closeTime": str(self.close_time),
+                "headerXdr": "",
+                "metadataXdr": "",
+            }
+
+    def get_ledger_entries(self, params: dict) -> dict:
+        """Account entries, the ones ``load_account`` asks for."""
+        from stellar_sdk import StrKey, xdr
+
+        entries = []
+        with self._lock:
+            for key_xdr in params["keys"]:
+                key = xdr.LedgerKey.from_xdr(key_xdr)
+                if key.account is None:
+                    continue
+                account_id = StrKey.encode_ed25519_public_key(
+                    key.account.account_id.account_id.ed25519.uint256
+                )
+                sequence = self.sequences.setdefault(account_id, 0)
+                entries.append(
+                    {
+                        "key": key_xdr,
+                        "xdr": _account_entry_xdr(account_id, sequence),
+                        "lastModifiedLedgerSeq": self.ledger,
+                    }
+                )
+            return {"entries": entries, "latestLedger": self.ledger}
+
+    def get_fee_stats(self, params: dict) -> dict:
+        with self._lock:
+            return {**self._fee_stats, "latestLedger": self.ledger}
+
+    def simulate_transaction(self, params: dict) -> dict:
+        from stellar_sdk import Network, TransactionEnvelope, scval, xdr
+
+        envelope = TransactionEnvelope.from_xdr(
+            params["transaction"], Network.TESTNET_NETWORK_PASSPHRASE
+        )
+        host_function = envelope.transaction.operations[0].host_function
+        # as require_auth of the source account
+        function_type = xdr.SorobanAuthorizedFunctionType
+        auth = xdr.SorobanAuthorizationEntry(
+            xdr.SorobanCredentials(
+                xdr.SorobanCredentialsType.SOROBAN_CREDENTIALS_SOURCE_ACCOUNT
+            ),
+            xdr.SorobanAuthorizedInvocation(
+                xdr.SorobanAuthorizedFunction(
+                    function_type.SOROBAN_AUTHORIZED_FUNCTION_TYPE_CONTRACT_FN,
+                    contract_fn=host_function.invoke_contract,
+                ),
+                [],
+            ),
+        )
+
+        transaction_data = xdr.SorobanTransactionData(
+            xdr.SorobanTransactionDataExt(0),
+            xdr.SorobanResources(
+                xdr.LedgerFootprint([], []),
+                xdr.Uint32(1_000_000),
+                xdr.Uint32(1_000),
+                xdr.Uint32(1_000),
+            ),
+            xdr.Int64(50_000),
+        )
+        with self._lock:
+            return {
+                "transactionData": transaction_data.to_xdr(),
+                "minResourceFee": "50000",
+                "results": [
+                    {"auth": [auth.to_xdr()], "xdr": scval.to_void().to_xdr()}
+                ],
+                "latestLedger": self.ledger,
+            }
+
+    def send_transaction(self, params: dict) -> dict:
+        from stellar_sdk import Network, TransactionEnvelope
+
+        envelope = TransactionEnvelope.from_xdr(
+            params["transaction"], Network.TESTNET_NETWORK_PASSPHRASE
+        )
+        tx = envelope.transaction
+        tx_hash = envelope.hash_hex()
+        source = tx.source.account_id
+        max_time = 0
+        if tx.preconditions is not None and tx.preconditions.time_bounds is not None:
+            max_time = tx.preconditions.time_bounds.max_time
+        inclusion_fee = tx.fee
+        if tx.soroban_data is not None:
+            inclusion_fee -= tx.soroban_data.resource_fee.int64
+        with self._lock:
+            response = {"hash": tx_hash, **self._latest()}
+            if tx_hash in self._pending or tx_hash in self._transactions:
+                return {**response, "status": "DUPLICATE"}
+            if any(pending[0] == source for pending in self._pending.values()):
+                return {**response, "status": "TRY_AGAIN_LATER"}
+            if tx.sequence != self.sequences.setdefault(source, 0) + 1:
+                return {
+                    **response,
+                    "status": "ERROR",
+                    "errorResultXdr": _transaction_result_xdr("txBAD_SEQ"),
+                }
+            self._pending[tx_hash] = (
+                source,
+                tx.sequence,
+                max_time,
+                params["transaction"],
+                inclusion_fee,
+            )
+            return {**response, "status": "PENDING"}
+
+    def get_transaction(self, params: dict) -> dict:
+        with self._lock:
+            response = {
+                "txHash": params["hash"],
+                **self._latest(),
+                "oldestLedger": 1,
+                "oldestLedgerCloseTime": "0",
+            }
+            transaction = self._transactions.get(params["hash"])
+            if transaction is None:
+                return {**response, "status": "NOT_FOUND"}
+            return {**response, **transaction}
+
+
+def _account_entry_xdr(account_id: str, sequence: int) -> str:
+    from stellar_sdk import Keypair, xdr
+
+    return xdr.LedgerEntryData(
+        xdr.LedgerEntryType.ACCOUNT,
+        account=xdr.AccountEntry(
+            account_id=Keypair.from_public_key(account_id).xdr_account_id(),
+            balance=xdr.Int64(10_000 * 10_000_000),
+            seq_num=xdr.SequenceNumber(xdr.Int64(sequence)),
+            num_sub_entries=xdr.Uint32(0),
+            inflation_dest=None,
+            flags=xdr.Uint32(0),
+            home_domain=xdr.String32(b""),
+            thresholds=xdr.Thresholds(bytes([1, 0, 0, 0])),
+            signers=[],
+            ext=xdr.AccountEntryExt(0),
+        ),
+    ).to_xdr()
+
+
+def _transaction_result_xdr(code: str) -> str:
+    from stellar_sdk import xdr
+
+    result_code = getattr(xdr.TransactionResultCode, code)
+    return xdr.TransactionResult(
+        xdr.Int64(100),
+        xdr.TransactionResultResult(
+            result_code, results=None if code == "txBAD_SEQ" else []
+        ),
+        xdr.TransactionResultExt(0),
+    ).to_xdr()
+
+
+def _transaction_meta_xdr() -> str:
+    from stellar_sdk import scval, xdr
+
+    return xdr.TransactionMeta(
+        3,
+        v3=xdr.TransactionMetaV3(
+            xdr.ExtensionPoint(0),
+            xdr.LedgerEntryChanges([]),
+            [],
+            xdr.LedgerEntryChanges([]),
+            xdr.SorobanTransactionMeta(
+                xdr.SorobanTransactionMetaExt(0), [], scval.to_void(), []
+            ),
+        ),
+    ).to_xdr()
+
+
+class SorobanRpcHandler(http.server.BaseHTTPRequestHandler):
+    """JSON-RPC endpoint, see `serve_soroban_rpc`."""
+
+    def do_POST(self):
+        rpc: SorobanRpc = self.server.rpc
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        method = request.get("method", "")
+        rpc.requests[method] += 1
+        time.sleep(rpc.latency)
+        response: dict = {"jsonrpc": "2.0", "id": request.get("id")}
+        handler = rpc.methods.get(method)
+        if handler is None:
+            response["error"] = {"code": -32601, "message": "method not found"}
+        elif rpc.rng.random() < rpc.error_rate:
+            response["error"] = {"code": -32603, "message": "stand-in error"}
+        else:
+            response["result"] = handler(request.get("params") or {})
+
+        body = json.dumps(response).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextlib.contextmanager
+def serve_soroban_rpc(
+    *,
+    latency: float = 0.0,
+    error_rate: float = 0.0,
+    failure_rate: float = 0.0,
+    ledger_close_time: float = 5.0,
+    fee_stats: str = "quiet",
+    horizon: Optional[Horizon] = None,
+    seed: Optional[int] = None,
+) -> Iterator[SorobanRpc]:
+    """Serve a Soroban RPC stand-in in a background thread.
+
+    Parameters
+    ----------
+    latency : float
+        Delay in seconds before answering each request.
+    error_rate : float
+        Probability to answer a request with a JSON-RPC error.
+    failure_rate : float
+        Probability for an included transaction to fail.
+    ledger_close_time : float
+        Seconds between two ledgers.
+    fee_stats : str
+        Fixture answered to ``getFeeStats``, ``"quiet"`` or ``"busy"``.
+    horizon : Horizon, optional
+        Horizon stand-in sharing the sequence numbers of the accounts.
+    seed : int, optional
+        Seed of the injected errors and failures.
+    """
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), SorobanRpcHandler)
+    server.daemon_threads = True
+    server.rpc = SorobanRpc(
+        latency=latency,
+        error_rate=error_rate,
+        failure_rate=failure_rate,
+        ledger_close_time=ledger_close_time,
+        fee_stats=fee_stats,
+        horizon=horizon,
+        seed=seed,
+    )
+    server.rpc.url = f"http://127.0.0.1:{server.server_port}"
+
+    threads = [
+        threading.Thread(target=server.serve_forever, daemon=True),
+        threading.Thread(target=server.rpc.close_ledgers, daemon=True),
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        yield server.rpc
+    finally:
+        server.rpc.stop()
+        server.shutdown()
+        server.server_close()
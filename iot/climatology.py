@@ -0,0 +1,296 @@
+"""Median sea ice extent per day of the year over a baseline window.
+
+The daily supply correction compares the extent of the day to the median
+extent of that day of the year over a 30-year baseline. The baseline is
+computed once from the daily record with a vectorised group-by and cached
+as a compact array of 366 ``uint16`` (extent in 10^3 km^2, e.g. 13976),
+which is then memory-mapped and indexed in O(1) without importing numpy.
+
+Leap years follow the NSIDC convention: the day of the year is counted from
+January 1st, so from March 1st a given DOY is one calendar day earlier in
+leap years and DOY 366 only has values from leap years. Every other day was
+measured before August 1987: single missing days are linearly interpolated
+while longer gaps (e.g. the December 1987 outage) are left out.
+
+When NSIDC publishes a climatology for the window, its median is used
+instead so that the controller agrees with the values hard-coded in the
+contract (``contract/src/historical_data.rs``). Use the command line to
+build a baseline, compare it with the published one or export it for the
+contract::
+
+    python climatology.py 1991 2020
+    python climatology.py 1981 2010 --check
+    python climatology.py 1981 2010 --rust > ../contract/src/historical_data.rs
+"""
+import argparse
+import mmap
+import os
+import pathlib
+import sys
+from typing import Optional
+
+import sii
+
+
+EXPLORATION_DIR = pathlib.Path(__file__).parents[1] / "exploration"
+DAILY_CSV = EXPLORATION_DIR / "N_seaice_extent_daily_v3.0.csv"
+# published NSIDC climatologies by baseline window
+NSIDC_CLIMATOLOGY_CSV = {
+    (1981, 2010): EXPLORATION_DIR / "N_seaice_extent_climatology_1981-2010_v3.0.csv",
+}
+BASELINE = (1981, 2010)
+
+N_DOY = 366
+ITEM_SIZE = 2  # uint16
+
+
+class Climatology:
+    """Memory-mapped median extent per day of the year.
+
+    Parameters
+    ----------
+    path : path-like
+        Array file written by `build`.
+
+    Examples
+    --------
+    >>> baseline = Climatology(path)
+    >>> baseline[17]  # median extent of January 17th in 10^3 km^2
+    14526
+    """
+
+    def __init__(self, path: "os.PathLike[str] | str"):
+        self.path = pathlib.Path(path)
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) != N_DOY * ITEM_SIZE:
+            self._mmap.close()
+            raise ValueError(f"Not a climatology file: {self.path}")
+        self._values = memoryview(self._mmap).cast("H")
+
+    def __getitem__(self, doy: int) -> int:
+        """Median extent of the day of the year `doy` in [1, 366]."""
+        if not 1 <= doy <= N_DOY:
+            raise IndexError(f"doy must be in [1, {N_DOY}], got {doy}")
+        return self._values[doy - 1]
+
+    def __len__(self) -> int:
+        return N_DOY
+
+    def tolist(self) -> list[int]:
+        return self._values.tolist()
+
+
+def read_daily(daily_csv: "os.PathLike[str] | str" = DAILY_CSV):
+    """Dates and extents of the daily record.
+
+    Returns
+    -------
+    dates : ndarray of datetime64[D]
+    extent : ndarray of float
+        Sea ice extent in 10^6 km^2.
+    """
+    import numpy as np
+
+    data = np.loadtxt(daily_csv, delimiter=",", skiprows=2, usecols=(0, 1, 2, 3))
+    year, month, day, extent = data.T
+    dates = (
+        (year.astype(int) - 1970).astype("datetime64[Y]")
+        + (month.astype(int) - 1).astype("timedelta64[M]")
+    ).astype("datetime64[D]") + (day.astype(int) - 1).astype("timedelta64[D]")
+    return dates, extent
+
+
+def day_of_year(dates):
+    """Day of the year in [1, 366] of an array of datetime64[D]."""
+    return (dates - dates.astype("datetime64[Y]")).astype(int) + 1
+
+
+def median_extent(
+    start: int, end: int, daily_csv: "os.PathLike[str] | str" = DAILY_CSV
+):
+    """Median extent per day of the year from the daily record.
+
+    Parameters
+    ----------
+    start, end : int
+        First and last year of the baseline window, included.
+    daily_csv : path-like
+        NSIDC daily extent CSV file.
+
+    Returns
+    -------
+    median : ndarray of shape (366,)
+        Median extent in 10^6 km^2, NaN for days without data.
+    """
+    import numpy as np
+
+    dates, extent = read_daily(daily_csv)
+
+    # daily grid, filling single missing days
+    days = (dates - dates[0]).astype(int)
+    grid = np.full(days[-1] + 1, np.nan)
+    grid[days] = extent
+    gap = np.isnan(grid[1:-1]) & ~np.isnan(grid[:-2]) & ~np.isnan(grid[2:])
+    grid[1:-1][gap] = (grid[:-2][gap] + grid[2:][gap]) / 2
+
+    grid_dates = dates[0] + np.arange(grid.size).astype("timedelta64[D]")
+    grid_year = grid_dates.astype("datetime64[Y]").astype(int) + 1970
+    mask = (grid_year >= start) & (grid_year <= end) & ~np.isnan(grid)
+    grid_dates, extent = grid_dates[mask], grid[mask]
+    doy = day_of_year(grid_dates)
+
+    # group-by day of the year: sort by (doy, extent) and pick middle values
+    order = np.lexsort((extent, doy))
+    extent = extent[order]
+    counts = np.bincount(doy, minlength=N_DOY + 1)[1:]
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    valid = counts > 0
+    lo = (starts + (counts - 1) // 2)[valid]
+    hi = (starts + counts // 2)[valid]
+
+    median = np.full(N_DOY, np.nan)
+    median[valid] = (extent[lo] + extent[hi]) / 2
+    return median
+
+
+def nsidc_median_extent(climatology_csv: "os.PathLike[str] | str"):
+    """Median extent per day of the year published by NSIDC (10^6 km^2)."""
+    import numpy as np
+
+    return np.loadtxt(climatology_csv, delimiter=",", skiprows=2, usecols=5)
+
+
+def build(
+    start: int,
+    end: int,
+    *,
+    daily_csv: "os.PathLike[str] | str" = DAILY_CSV,
+    cache_dir: "os.PathLike[str] | str" = sii.SII_CACHE_DIR,
+    published: bool = True,
+) -> pathlib.Path:
+    """Compute the baseline and write it as an array file.
+
+    Parameters
+    ----------
+    start, end : int
+        First and last year of the baseline window, included.
+    daily_csv : path-like
+        NSIDC daily extent CSV file.
+    cache_dir : path-like
+        Directory of the array file.
+    published : bool
+        Use the NSIDC published climatology if there is one for the window.
+
+    Returns
+    -------
+    path : Path
+        Array file, see `Climatology`.
+    """
+    import numpy as np
+
+    nsidc_csv = NSIDC_CLIMATOLOGY_CSV.get((start, end))
+    if published and nsidc_csv is not None and nsidc_csv.exists():
+        median = nsidc_median_extent(nsidc_csv)
+    else:
+        median = median_extent(start, end, daily_csv)
+
+    # DOY 366 only exists in leap years, reuse DOY 365 if it has no data
+    if np.isnan(median[-1]):
+        median[-1] = median[-2]
+    # truncate as the controller does with the extent of the day: 13.976 -> 13976
+    median = (np.nan_to_num(median) * 1000).astype("<u2")
+
+    path = _cache_path(start, end, cache_dir, published)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    median.tofile(tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load(
+    start: int = BASELINE[0],
+    end: int = BASELINE[1],
+    *,
+    cache_dir: "os.PathLike[str] | str" = sii.SII_CACHE_DIR,
+    published: bool = True,
+) -> Climatology:
+    """Cached baseline, built on first use. See `build`."""
+    path = _cache_path(start, end, cache_dir, published)
+    try:
+        return Climatology(path)
+    except (OSError, ValueError):
+        build(start, end, cache_dir=cache_dir, published=published)
+        return Climatology(path)
+
+
+def to_rust(baseline: Climatology) -> str:
+    """Source of ``historical_data.rs`` for the contract."""
+    values = [str(value) for value in baseline.tolist()]
+    lines = []
+    line = "   "
+    for value in values:
+        if len(line) + len(value) + 2 > 100:
+            lines.append(line)
+            line = "   "
+        line += f" {value},"
+    lines.append(line)
+    body = "\n".join(lines)
+    return f"pub const MEDIAN_EXTENT: [u32; {N_DOY}] = [\n{body}\n];\n"
+
+
+def _cache_path(
+    start: int, end: int, cache_dir: "os.PathLike[str] | str", published: bool
+) -> pathlib.Path:
+    if published and (start, end) in NSIDC_CLIMATOLOGY_CSV:
+        source = "nsidc"
+    else:
+        source = "daily"
+    return pathlib.Path(cache_dir) / f"median_extent_{start}-{end}_{source}.u16"
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Build a climatology baseline.")
+    parser.add_argument("start", type=int, help="first year of the baseline")
+    parser.add_argument("end", type=int, help="last year of the baseline")
+    parser.add_argument("--daily-csv", type=pathlib.Path, default=DAILY_CSV)
+    parser.add_argument("--cache-dir", type=pathlib.Path, default=sii.SII_CACHE_DIR)
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="compare the baseline computed from the daily record with NSIDC's",
+    )
+    parser.add_argument(
+        "--rust", action="store_true", help="print the baseline for the contract"
+    )
+    args = parser.parse_args(argv)
+
+    if args.check:
+        import numpy as np
+
+        nsidc_csv = NSIDC_CLIMATOLOGY_CSV.get((args.start, args.end))
+        if nsidc_csv is None:
+            print(f"No NSIDC climatology for {args.start}-{args.end}")
+            return 1
+        computed = median_extent(args.start, args.end, args.daily_csv) * 1000
+        published = nsidc_median_extent(nsidc_csv) * 1000
+        computed, published = computed.astype(int), published.astype(int)
+        diff = np.abs(computed - published)
+        print(f"exact match: {np.mean(diff == 0):.1%}")
+        print(f"within 1e3 km^2: {np.mean(diff <= 1):.1%}")
+        print(f"max difference: {diff.max()} on DOY {diff.argmax() + 1}")
+        return 0
+
+    path = build(
+        args.start, args.end, daily_csv=args.daily_csv, cache_dir=args.cache_dir
+    )
+    if args.rust:
+        sys.stdout.write(to_rust(Climatology(path)))
+    else:
+        print(path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
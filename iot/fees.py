@@ -0,0 +1,196 @@
+"""Inclusion fee of Soroban transactions.
+
+The inclusion fee is the part of the fee bidding for a place in the ledger,
+on top of the resource fee given by the simulation. Instead of a fixed bid,
+`PercentileFeePolicy` bids a percentile of the inclusion fees of the recent
+ledgers, from ``getFeeStats``. A transaction which is not included in time
+expires and is sent again with a higher bid.
+
+Policies record the fee of each transaction against its time to inclusion,
+see `FeePolicy.stats`. The choice of the fee only depends on the fee stats,
+so that a policy can be replayed on recorded ``getFeeStats`` responses::
+
+    stats = GetFeeStatsResponse.model_validate_json(path.read_text())
+    policy.fee_from_stats(stats)
+"""
+import collections
+import logging
+import statistics
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, NamedTuple, Optional, Protocol
+
+if TYPE_CHECKING:
+    from stellar_sdk import SorobanServerAsync
+    from stellar_sdk.soroban_rpc import GetFeeStatsResponse
+
+
+logger = logging.getLogger(__name__)
+
+# minimal fee of an operation, in stroops
+BASE_FEE = 100
+# percentiles given by getFeeStats
+PERCENTILES = (10, 20, 30, 40, 50, 60, 70, 80, 90, 95, 99)
+
+
+class FeeRecord(NamedTuple):
+    #: inclusion fee in stroops
+    fee: int
+    #: seconds from sending to inclusion, or until given up
+    elapsed: float
+    included: bool
+
+
+class FeeStats(NamedTuple):
+    transactions: int
+    #: transactions not included in time and sent again
+    bumps: int
+    #: calls to getFeeStats
+    fee_stats_calls: int
+    mean_fee: float
+    #: of the included transactions
+    mean_inclusion_time: float
+    max_inclusion_time: float
+
+
+class FeePolicy(Protocol):
+    #: seconds for a transaction to be included before it is sent again with
+    #: a higher fee, None to wait until the end of the invocation
+    inclusion_timeout: Optional[float]
+
+    async def fee(self, server: "SorobanServerAsync") -> int:
+        """Inclusion fee of a new transaction in stroops."""
+
+    def bump(self, fee: int) -> int:
+        """Inclusion fee of a transaction sent again after `fee`."""
+
+    def record(self, fee: int, elapsed: float, included: bool) -> None:
+        """Record the time to inclusion of a transaction."""
+
+    def stats(self) -> FeeStats:
+        ...
+
+
+class _FeeRecords:
+    """Bounded history of `FeeRecord` shared by the policies."""
+
+    def __init__(self, maxlen: int = 1000):
+        self._lock = threading.Lock()
+        self.records: collections.deque[FeeRecord] = collections.deque(maxlen=maxlen)
+        self.fee_stats_calls = 0
+
+    def record(self, fee: int, elapsed: float, included: bool) -> None:
+        with self._lock:
+            self.records.append(FeeRecord(fee, elapsed, included))
+
+    def stats(self) -> FeeStats:
+        with self._lock:
+            records = list(self.records)
+            fee_stats_calls = self.fee_stats_calls
+        inclusion_times = [record.elapsed for record in records if record.included]
+        return FeeStats(
+            transactions=len(records),
+            bumps=sum(not record.included for record in records),
+            fee_stats_calls=fee_stats_calls,
+            mean_fee=statistics.mean(r.fee for r in records) if records else 0.0,
+            mean_inclusion_time=(
+                statistics.mean(inclusion_times) if inclusion_times else 0.0
+            ),
+            max_inclusion_time=max(inclusion_times, default=0.0),
+        )
+
+
+class FixedFee(_FeeRecords):
+    """Same inclusion fee for all transactions, never bumped.
+
+    Parameters
+    ----------
+    fee : int
+        Inclusion fee in stroops.
+    """
+
+    inclusion_timeout = None
+
+    def __init__(self, fee: int = 200_000):
+        super().__init__()
+        self._fee = fee
+
+    async def fee(self, server: "SorobanServerAsync") -> int:
+        return self._fee
+
+    def bump(self, fee: int) -> int:
+        return fee
+
+
+class PercentileFeePolicy(_FeeRecords):
+    """Bid a percentile of the recent inclusion fees.
+
+    Parameters
+    ----------
+    percentile : int
+        Percentile of the Soroban inclusion fees of the recent ledgers, one
+        of `PERCENTILES`.
+    ttl : float
+        Lifetime of the fee stats in seconds.
+    inclusion_timeout : float, optional
+        Seconds for a transaction to be included before it is sent again
+        with a higher fee.
+    bump_factor : float
+        Factor applied to the fee of a transaction sent again.
+    min_fee, max_fee : int
+        Bounds of the inclusion fee in stroops.
+    default_fee : int
+        Fee used while the fee stats cannot be fetched.
+    clock : callable
+        Monotonic clock.
+    """
+
+    def __init__(
+        self,
+        percentile: int = 70,
+        *,
+        ttl: float = 60.0,
+        inclusion_timeout: Optional[float] = 15.0,
+        bump_factor: float = 2.0,
+        min_fee: int = BASE_FEE,
+        max_fee: int = 2_000_000,
+        default_fee: int = 200_000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if percentile not in PERCENTILES:
+            raise ValueError(f"percentile must be one of {PERCENTILES}")
+        super().__init__()
+        self.percentile = percentile
+        self.ttl = ttl
+        self.inclusion_timeout = inclusion_timeout
+        self.bump_factor = bump_factor
+        self.min_fee = min_fee
+        self.max_fee = max_fee
+        self.default_fee = default_fee
+        self.clock = clock
+        # (expiry, fee) of the last fee stats
+        self._cached: Optional[tuple[float, int]] = None
+
+    def fee_from_stats(self, stats: "GetFeeStatsResponse") -> int:
+        """Inclusion fee given the fee stats of the recent ledgers."""
+        fee = getattr(stats.soroban_inclusion_fee, f"p{self.percentile}")
+        return min(max(fee, self.min_fee), self.max_fee)
+
+    async def fee(self, server: "SorobanServerAsync") -> int:
+        cached = self._cached
+        if cached is not None and self.clock() < cached[0]:
+            return cached[1]
+        try:
+            stats = await server.get_fee_stats()
+        except Exception as ex:
+            fee = cached[1] if cached is not None else self.default_fee
+            logger.warning("Could not get the fee stats, fee of %d: %r", fee, ex)
+            return fee
+        with self._lock:
+            self.fee_stats_calls += 1
+        fee = self.fee_from_stats(stats)
+        self._cached = (self.clock() + self.ttl, fee)
+        return fee
+
+    def bump(self, fee: int) -> int:
+        return min(max(int(fee * self.bump_factor), fee + 1), self.max_fee)
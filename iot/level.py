@@ -0,0 +1,386 @@
+"""Liquid level sampling for the proof of reserve.
+
+A background thread reads the distance sensor continuously into a fixed-size
+ring buffer and keeps the median of the window up to date, so reading the
+level returns immediately instead of sampling for a second.
+
+The median is maintained incrementally: the window is also kept sorted, each
+new sample replaces the oldest one with a binary search.
+
+Readings come with a robust confidence interval on the median, derived from
+the median absolute deviation (MAD). Consecutive samples are correlated, e.g.
+by a sloshing surface, so the interval shrinks with the effective number of
+independent samples, and it is never narrower than the sensor resolution: a
+quantised sensor reads the same value over and over, with a MAD of 0. With a
+tolerance, a read returns as soon as the interval is tight enough instead of
+waiting for a full window, which is much faster when the surface is still.
+"""
+import array
+import bisect
+import logging
+import math
+import statistics
+import threading
+import time
+from typing import NamedTuple, Optional, Protocol
+
+
+logger = logging.getLogger(__name__)
+
+# MAD to standard deviation for a normal noise
+MAD_TO_STD = 1.4826
+# standard error of the median relative to the one of the mean
+MEDIAN_EFFICIENCY = math.sqrt(math.pi / 2)
+
+
+class Sensor(Protocol):
+    """Distance sensor, e.g. `gpiozero.DistanceSensor`."""
+
+    distance: float
+
+
+class RingBuffer:
+    """Fixed-size buffer of timestamped values.
+
+    Parameters
+    ----------
+    size : int
+        Number of values kept, older ones are overwritten.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.values = array.array("d", bytes(8 * size))
+        self.timestamps = array.array("d", bytes(8 * size))
+        self.count = 0
+        self._head = 0  # next slot to write, hence the oldest value when full
+
+    def __len__(self) -> int:
+        return min(self.count, self.size)
+
+    def push(self, value: float, timestamp: float) -> Optional[float]:
+        """Add a value and return the one it replaced, if any."""
+        replaced = self.values[self._head] if self.count >= self.size else None
+        self.values[self._head] = value
+        self.timestamps[self._head] = timestamp
+        self._head = (self._head + 1) % self.size
+        self.count += 1
+        return replaced
+
+    def latest(self, since: Optional[float] = None) -> list[float]:
+        """Values in insertion order, only those from `since` if given."""
+        n = len(self)
+        start = (self._head - n) % self.size
+        indices = [(start + i) % self.size for i in range(n)]
+        if since is not None:
+            indices = [i for i in indices if self.timestamps[i] >= since]
+        return [self.values[i] for i in indices]
+
+    def timestamp(self, n: int) -> float:
+        """Timestamp of the n-th newest value, 1 being the newest."""
+        return self.timestamps[(self._head - n) % self.size]
+
+    @property
+    def oldest_timestamp(self) -> float:
+        return self.timestamp(len(self))
+
+    @property
+    def newest_timestamp(self) -> float:
+        return self.timestamp(1)
+
+
+class RunningMedian:
+    """Median of a sliding window.
+
+    Parameters
+    ----------
+    size : int
+        Number of values in the window.
+    """
+
+    def __init__(self, size: int):
+        self.buffer = RingBuffer(size)
+        self._sorted: list[float] = []
+
+    def __len__(self) -> int:
+        return len(self._sorted)
+
+    def push(self, value: float, timestamp: float) -> None:
+        replaced = self.buffer.push(value, timestamp)
+        if replaced is not None:
+            del self._sorted[bisect.bisect_left(self._sorted, replaced)]
+        bisect.insort(self._sorted, value)
+
+    @property
+    def median(self) -> float:
+        n = len(self._sorted)
+        if n == 0:
+            raise ValueError("No value in the window")
+        mid = n // 2
+        if n % 2:
+            return self._sorted[mid]
+        return (self._sorted[mid - 1] + self._sorted[mid]) / 2
+
+    @property
+    def mad(self) -> float:
+        """Median absolute deviation of the window.
+
+        Deviations below and above the median are both sorted when walking
+        away from it, merging them gives the order statistics in O(n).
+        """
+        values = self._sorted
+        n = len(values)
+        median = self.median
+        right = bisect.bisect_left(values, median)
+        left = right - 1
+        deviations = []
+        while len(deviations) <= n // 2:
+            if right >= n or (
+                left >= 0 and median - values[left] <= values[right] - median
+            ):
+                deviations.append(median - values[left])
+                left -= 1
+            else:
+                deviations.append(values[right] - median)
+                right += 1
+        return (deviations[(n - 1) // 2] + deviations[n // 2]) / 2
+
+
+def confidence_half_width(
+    mad: float, n_samples: float, z: float = 1.96, resolution: float = 0.0
+) -> float:
+    """Half-width of the confidence interval on a median given the MAD.
+
+    `n_samples` is the effective number of independent samples, the
+    half-width is at least the `resolution` of the sensor.
+    """
+    half_width = z * MEDIAN_EFFICIENCY * MAD_TO_STD * mad / math.sqrt(n_samples)
+    return max(half_width, resolution)
+
+
+def effective_sample_size(values: list[float]) -> float:
+    """Number of independent samples carrying the information of `values`.
+
+    n correlated samples are worth ``n / tau`` independent ones, with the
+    integrated autocorrelation time ``tau = 1 + 2 sum(rho_k)`` summed over
+    the lags k until the autocorrelation rho_k stops being positive.
+    """
+    n = len(values)
+    if n < 3:
+        return n
+    # centred on the mean: around the median, the deviations of a quantised
+    # or skewed noise share a sign and look correlated at every lag
+    center = statistics.fmean(values)
+    deviations = [value - center for value in values]
+    variance = sum(deviation * deviation for deviation in deviations)
+    if variance == 0:
+        return n
+    tau = 1.0
+    for lag in range(1, n // 2):
+        rho = sum(a * b for a, b in zip(deviations, deviations[lag:])) / variance
+        if rho <= 0:
+            break
+        tau += 2 * rho
+    return max(n / tau, 1.0)
+
+
+def robust_interval(
+    values: list[float],
+    z: float = 1.96,
+    resolution: float = 0.0,
+    n_effective: Optional[float] = None,
+) -> tuple[float, float]:
+    """Median and half-width of its confidence interval.
+
+    The spread is estimated from the median absolute deviation so that a few
+    outliers, e.g. a missed echo, do not widen the interval. By default, the
+    effective number of samples is estimated from the values.
+    """
+    median = statistics.median(values)
+    mad = statistics.median([abs(value - median) for value in values])
+    if n_effective is None:
+        n_effective = effective_sample_size(values)
+    half_width = confidence_half_width(mad, n_effective, z=z, resolution=resolution)
+    return median, half_width
+
+
+class LevelReading(NamedTuple):
+    #: median distance in m
+    distance: float
+    #: wall-clock time of the newest sample
+    timestamp: float
+    #: seconds since the newest sample
+    age: float
+    #: seconds covered by the window
+    span: float
+    n_samples: int
+    #: half-width of the 95% confidence interval on the distance in m
+    uncertainty: float
+
+
+class LevelSampler:
+    """Read a distance sensor in a background thread.
+
+    Parameters
+    ----------
+    sensor : Sensor
+        Object with a ``distance`` attribute in m.
+    window : int
+        Number of samples in the median window.
+    interval : float
+        Pause between two samples in seconds.
+    resolution : float
+        Resolution of the sensor in m, the smallest uncertainty reported.
+    decorrelation : float
+        Seconds between two samples for them to be independent, e.g. the
+        period of the sloshing of the surface. Samples closer in time count
+        as fewer, so that an adaptive read covers at least
+        ``(min_samples - 1) * decorrelation`` seconds.
+    """
+
+    def __init__(
+        self,
+        sensor: Sensor,
+        *,
+        window: int = 100,
+        interval: float = 0.01,
+        resolution: float = 0.0,
+        decorrelation: float = 0.0,
+    ):
+        self.sensor = sensor
+        self.window = window
+        self.interval = interval
+        self.resolution = resolution
+        self.decorrelation = decorrelation
+
+        self._median = RunningMedian(window)
+        self._updated = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # offset between the monotonic clock of the samples and the wall clock
+        self._wall_offset = time.time() - time.monotonic()
+
+    def start(self) -> "LevelSampler":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="level-sampler", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def read(
+        self,
+        *,
+        since: Optional[float] = None,
+        timeout: Optional[float] = None,
+        tolerance: Optional[float] = None,
+        min_samples: int = 5,
+    ) -> LevelReading:
+        """Median level of the current window.
+
+        Parameters
+        ----------
+        since : float, optional
+            Monotonic time (`time.monotonic`) after which all samples must be
+            taken, e.g. the end of a pump run. Waits for new samples if needed.
+        timeout : float, optional
+            Maximal time to wait in seconds.
+        tolerance : float, optional
+            Adaptive mode: return as soon as the confidence interval on the
+            distance is within `tolerance` (m) with at least `min_samples`
+            effective samples. The window size is the hard cap on the number of samples.
+            By default, wait for a full window.
+        min_samples : int
+            Minimal number of effective samples in adaptive mode.
+
+        Raises
+        ------
+        TimeoutError
+            If there are not enough (recent enough) samples before `timeout`.
+        """
+        with self._updated:
+            ready = self._updated.wait_for(
+                lambda: self._is_ready(since, tolerance, min_samples),
+                timeout=timeout,
+            )
+            if not ready:
+                raise TimeoutError("Level window not filled in time")
+
+            buffer = self._median.buffer
+            values = buffer.latest(since) if tolerance is not None else None
+            if values is not None and len(values) < self.window:
+                n_samples = len(values)
+                distance, uncertainty = robust_interval(
+                    values,
+                    resolution=self.resolution,
+                    n_effective=self._effective_sample_size(values),
+                )
+            else:
+                # full window, use the running order statistics
+                n_samples = self.window
+                distance = self._median.median
+                uncertainty = confidence_half_width(
+                    self._median.mad,
+                    self._effective_sample_size(buffer.latest()),
+                    resolution=self.resolution,
+                )
+
+            newest = buffer.newest_timestamp
+            oldest = buffer.timestamp(n_samples)
+            return LevelReading(
+                distance=distance,
+                timestamp=newest + self._wall_offset,
+                age=time.monotonic() - newest,
+                span=newest - oldest,
+                n_samples=n_samples,
+                uncertainty=uncertainty,
+            )
+
+    def _is_ready(
+        self, since: Optional[float], tolerance: Optional[float], min_samples: int
+    ) -> bool:
+        buffer = self._median.buffer
+        if tolerance is None:
+            if len(buffer) < self.window:
+                return False
+            return since is None or buffer.oldest_timestamp >= since
+
+        values = buffer.latest(since)
+        if len(values) >= self.window:
+            return True
+        if len(values) < min_samples:
+            return False
+        n_effective = self._effective_sample_size(values)
+        if n_effective < min_samples:
+            return False
+        _, half_width = robust_interval(
+            values, resolution=self.resolution, n_effective=n_effective
+        )
+        return half_width <= tolerance
+
+    def _effective_sample_size(self, values: list[float]) -> float:
+        """Effective number of the newest `values`, bounded by their spacing."""
+        n_effective = effective_sample_size(values)
+        if self.decorrelation > 0:
+            buffer = self._median.buffer
+            span = buffer.newest_timestamp - buffer.timestamp(len(values))
+            n_effective = min(n_effective, 1 + span / self.decorrelation)
+        return n_effective
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                distance = self.sensor.distance
+            except Exception as ex:
+                logger.warning("Level sensor read failed: %r", ex)
+            else:
+                with self._updated:
+                    self._median.push(distance, time.monotonic())
+                    self._updated.notify_all()
+            self._stop.wait(self.interval)
@@ -0,0 +1,39 @@
+"""Cold start time of the SEAL supply controller.
+
+The timer starts before the controller module is imported, so that its own
+top-level imports are accounted for, then the heavy dependencies and the
+devices are timed by `seal_coin_supply.profile_startup`.
+
+Run it in a fresh process from the ``iot`` folder::
+
+    python profile_startup.py --budget 2
+"""
+import time
+
+_start = time.perf_counter()
+
+import seal_coin_supply  # noqa: E402
+
+_import_time = time.perf_counter() - _start
+
+
+def main(argv=None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=None,
+        help="fail if the cold start takes longer (s)",
+    )
+    args = parser.parse_args(argv)
+    return seal_coin_supply.profile_startup(
+        budget=args.budget, import_time=_import_time
+    )
+
+
+if __name__ == "__main__":
+    import sys
+
+    sys.exit(main())
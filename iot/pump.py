@@ -0,0 +1,291 @@
+"""Closed-loop pump control.
+
+Open loop, the pump runs for the volume divided by a calibrated flow rate,
+and any error in the flow rate ends up in the reserve. Closed loop, the
+level is sampled while pumping and the pump stops when the number of token
+moved, measured in litres from the level change like the flow rate, reaches
+the target. The pump is stopped ahead of the target by the latency of a
+level reading and by the time it keeps flowing once stopped, so that it
+does not overshoot.
+
+After each closed-loop run the level is measured once the surface settled,
+the actual flow rate is smoothed into the estimate used to plan the next
+runs, the overshoot corrects the coast time, and the run is recorded in
+the state store. The estimates are per direction and reloaded from the
+store on start.
+"""
+import logging
+import math
+import time
+from typing import Callable, Literal, NamedTuple, Optional, Protocol
+
+import level
+import state
+
+
+logger = logging.getLogger(__name__)
+
+Operation = Literal["mint", "burn"]
+
+
+class Pump(Protocol):
+    """Reversible pump, e.g. `gpiozero.Motor`."""
+
+    def forward(self, speed: float = 1) -> None: ...
+
+    def backward(self, speed: float = 1) -> None: ...
+
+    def stop(self) -> None: ...
+
+
+class PumpRun(NamedTuple):
+    operation: str
+    #: token requested
+    amount: int
+    #: token measured with the level, None in open loop
+    moved: Optional[int]
+    #: seconds the pump was on
+    duration: float
+    #: flow rate estimate after the run in l/s
+    flow_rate: float
+    #: coast time estimate after the run in s
+    coast: float
+
+
+class FlowRateEstimator:
+    """Exponentially weighted flow rate per direction.
+
+    Parameters
+    ----------
+    flow_rate : float
+        Initial estimate in l/s, e.g. from a manual calibration.
+    smoothing : float
+        Weight of a new measurement in [0, 1].
+    max_ratio : float
+        Measurements more than `max_ratio` times off the current estimate
+        are discarded, e.g. a missed echo of the sensor.
+    """
+
+    def __init__(
+        self, flow_rate: float, *, smoothing: float = 0.3, max_ratio: float = 4.0
+    ):
+        self.smoothing = smoothing
+        self.max_ratio = max_ratio
+        self._flow_rate = {"mint": flow_rate, "burn": flow_rate}
+
+    def __getitem__(self, operation: Operation) -> float:
+        return self._flow_rate[operation]
+
+    def __setitem__(self, operation: Operation, flow_rate: float) -> None:
+        self._flow_rate[operation] = flow_rate
+
+    def update(self, operation: Operation, measured: float) -> float:
+        """Blend a measured flow rate in and return the new estimate."""
+        estimate = self._flow_rate[operation]
+        if not estimate / self.max_ratio <= measured <= estimate * self.max_ratio:
+            logger.warning(
+                "Discarding %s flow rate of %.3g l/s, estimate is %.3g l/s",
+                operation,
+                measured,
+                estimate,
+            )
+            return estimate
+        estimate += self.smoothing * (measured - estimate)
+        self._flow_rate[operation] = estimate
+        return estimate
+
+
+class PumpController:
+    """Run the pump for a number of token.
+
+    Parameters
+    ----------
+    pump : Pump
+        Forward mints, backward burns.
+    sampler : LevelSampler
+        Level of the container, the distance decreases when minting.
+    liter_per_meter : float
+        Litres per meter of level, the surface of the container in m^2
+        times 1000.
+    liter_per_token : float
+        Volume of a token, as for the open-loop pump time.
+    flow_rate : float
+        Initial flow rate estimate in l/s, the persisted one if any.
+    store : StateStore, optional
+        Persist the runs and reload the flow rate estimates.
+    tolerance : float, optional
+        Tolerance in m of the level readings before and after a run, see
+        `LevelSampler.read`. By default, wait for a full window.
+    min_samples : int
+        Samples per level reading while pumping.
+    check_interval : float
+        Maximal time between two level readings while pumping in seconds.
+    settle_time : float
+        Time for the surface to settle after a run in seconds.
+    read_timeout : float
+        Maximal time to wait for a level reading in seconds.
+    timeout_factor : float
+        Stop the pump after `timeout_factor` times the planned time if the
+        target is not reached, e.g. an empty reservoir.
+    clock, sleep : callable
+        Monotonic clock of the sampler and the matching sleep.
+    """
+
+    def __init__(
+        self,
+        pump: Pump,
+        sampler: "level.LevelSampler",
+        *,
+        liter_per_meter: float,
+        liter_per_token: float,
+        flow_rate: float,
+        store: Optional[state.StateStore] = None,
+        tolerance: Optional[float] = None,
+        min_samples: int = 5,
+        check_interval: float = 0.5,
+        settle_time: float = 1.0,
+        read_timeout: float = 10.0,
+        timeout_factor: float = 2.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.pump = pump
+        self.sampler = sampler
+        self.liter_per_meter = liter_per_meter
+        self.liter_per_token = liter_per_token
+        self.store = store
+        self.tolerance = tolerance
+        self.min_samples = min_samples
+        self.check_interval = check_interval
+        self.settle_time = settle_time
+        self.read_timeout = read_timeout
+        self.timeout_factor = timeout_factor
+        self.clock = clock
+        self.sleep = sleep
+
+        self.flow_rate = FlowRateEstimator(flow_rate)
+        # seconds of flow after a stop, stop that much ahead of the target
+        self.coast = {"mint": 0.0, "burn": 0.0}
+        if store is not None:
+            for operation in ("mint", "burn"):
+                last_run = store.last_pump_run(operation)
+                if last_run is not None:
+                    self.flow_rate[operation] = last_run.flow_rate
+                    self.coast[operation] = last_run.coast
+
+    def planned_time(self, n_token: int, operation: Operation) -> float:
+        """Open-loop pump time in seconds."""
+        return n_token * self.liter_per_token / self.flow_rate[operation]
+
+    def token_moved(self, start_distance: float, end_distance: float) -> float:
+        """Token pumped in between two distances of the sensor in m.
+
+        Positive when the level rises, i.e. when the distance decreases.
+        """
+        liters = (start_distance - end_distance) * self.liter_per_meter
+        return liters / self.liter_per_token
+
+    def run(
+        self, n_token: int, operation: Operation, *, closed_loop: bool = True
+    ) -> PumpRun:
+        """Pump `n_token` in (mint) or out (burn).
+
+        Parameters
+        ----------
+        n_token : int
+            Number of token.
+        operation : {"mint", "burn"}
+            Mint or burn token.
+        closed_loop : bool
+            Stop on the measured level instead of the planned time.
+
+        Raises
+        ------
+        TimeoutError
+            If the level cannot be read, the pump is stopped.
+        """
+        pump_run = self.pump.forward if operation == "mint" else self.pump.backward
+        planned_time = self.planned_time(n_token, operation)
+
+        if not closed_loop:
+            pump_run(1)
+            try:
+                self.sleep(planned_time)
+            finally:
+                self.pump.stop()
+            return PumpRun(
+                operation,
+                n_token,
+                None,
+                planned_time,
+                self.flow_rate[operation],
+                self.coast[operation],
+            )
+
+        sign = 1 if operation == "mint" else -1
+        start_distance = self._read(self.tolerance).distance
+
+        def moved() -> tuple[int, float]:
+            """Token moved so far and the latency of the reading."""
+            begin = self.clock()
+            reading = self._read(math.inf)
+            moved = sign * self.token_moved(start_distance, reading.distance)
+            return math.floor(moved), self.clock() - begin
+
+        pump_run(1)
+        start = self.clock()
+        deadline = start + self.timeout_factor * planned_time
+        # token per second, the estimate until the level moved
+        rate = self.flow_rate[operation] / self.liter_per_token
+        lead = self.coast[operation]
+        try:
+            while True:
+                wait = (n_token / rate) - (self.clock() - start) - lead
+                if wait <= 0:
+                    break
+                if self.clock() >= deadline:
+                    logger.warning(
+                        "%s target of %d token not reached in %.1f s",
+                        operation.capitalize(),
+                        n_token,
+                        self.clock() - start,
+                    )
+                    break
+                self.sleep(min(wait, self.check_interval))
+                n_moved, latency = moved()
+                lead = self.coast[operation] + latency
+                if n_moved > 0:
+                    # rate of the ongoing run, accounts for the start of the pump
+                    rate = n_moved / (self.clock() - start)
+        finally:
+            self.pump.stop()
+        duration = self.clock() - start
+
+        self.sleep(self.settle_time)
+        end_distance = self._read(self.tolerance).distance
+        n_moved = math.floor(sign * self.token_moved(start_distance, end_distance))
+        if n_moved > 0:
+            measured = n_moved * self.liter_per_token / duration
+            flow_rate = self.flow_rate.update(operation, measured)
+            # integrate the overshoot, in seconds of flow, into the coast time
+            overshoot = (n_moved - n_token) * self.liter_per_token / measured
+            coast = self.coast[operation] + self.flow_rate.smoothing * overshoot
+            self.coast[operation] = min(max(coast, 0.0), duration / 2)
+        else:
+            logger.warning("Level did not change during the %s run", operation)
+        flow_rate, coast = self.flow_rate[operation], self.coast[operation]
+
+        if self.store is not None:
+            self.store.record_pump_run(
+                operation, n_token, n_moved, duration, flow_rate, coast
+            )
+        return PumpRun(operation, n_token, n_moved, duration, flow_rate, coast)
+
+    def _read(self, tolerance: Optional[float]) -> "level.LevelReading":
+        # only samples taken from now on, the level may be moving
+        return self.sampler.read(
+            since=self.clock(),
+            timeout=self.read_timeout,
+            tolerance=tolerance,
+            min_samples=self.min_samples,
+        )
@@ -0,0 +1,274 @@
+"""Event-driven scheduler of the controller tasks.
+
+Each task has its own timer: its action runs, then the task sleeps for its
+interval or for the delay returned by the action, e.g. to back off. A task
+can also be triggered, e.g. by a button, and then runs right away. Between
+two timers the scheduler sleeps, it does not poll.
+
+Time goes through a clock. `SystemClock` follows the wall clock while
+`VirtualClock` jumps straight to the next timer, so that a simulated week
+of the controller runs in milliseconds::
+
+    clock = VirtualClock(start=time.time())
+    tasks = Scheduler(clock)
+    tasks.add("screen", redraw, interval=3600)
+    tasks.run(until=clock.time() + 7 * 86400)
+"""
+import datetime
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import Callable, NamedTuple, Optional, Protocol
+
+
+logger = logging.getLogger(__name__)
+
+
+class Clock(Protocol):
+    def time(self) -> float:
+        """Seconds since the epoch."""
+
+    def wait(self, event: threading.Event, timeout: float) -> bool:
+        """Wait for `event` at most `timeout` seconds, return whether it is set."""
+
+
+class SystemClock:
+    """Wall clock."""
+
+    def time(self) -> float:
+        return time.time()
+
+    def wait(self, event: threading.Event, timeout: float) -> bool:
+        return event.wait(max(timeout, 0.0))
+
+
+class VirtualClock:
+    """Clock which only moves when waiting, by the whole timeout.
+
+    Parameters
+    ----------
+    start : float
+        Initial time in seconds since the epoch.
+    """
+
+    def __init__(self, start: float = 0.0):
+        self.now = start
+
+    def time(self) -> float:
+        return self.now
+
+    def wait(self, event: threading.Event, timeout: float) -> bool:
+        if event.is_set():
+            return True
+        self.now += max(timeout, 0.0)
+        return False
+
+
+class TaskStats(NamedTuple):
+    runs: int
+    triggered: int
+    errors: int
+    #: seconds spent in the action
+    busy_time: float
+    #: clock time of the last run, None if it never ran
+    last_run: Optional[float]
+    #: clock time of the next run
+    next_run: float
+
+
+class _Task:
+    def __init__(
+        self, name: str, action: Callable[[], Optional[float]], interval: float
+    ):
+        self.name = name
+        self.action = action
+        self.interval = interval
+        self.due = 0.0
+        # id of the current timer, older timers of the task are stale
+        self.timer = -1
+        self.runs = self.triggered = self.errors = 0
+        self.busy_time = 0.0
+        self.last_run: Optional[float] = None
+
+
+class Scheduler:
+    """Run tasks on their own timers in the calling thread.
+
+    Parameters
+    ----------
+    clock : Clock, optional
+        By default, the wall clock.
+    """
+
+    def __init__(self, clock: Optional[Clock] = None):
+        self.clock = SystemClock() if clock is None else clock
+        self._tasks: dict[str, _Task] = {}
+        self._timers: list[tuple[float, int, str]] = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = False
+
+    def add(
+        self,
+        name: str,
+        action: Callable[[], Optional[float]],
+        interval: float,
+        *,
+        delay: float = 0.0,
+    ) -> None:
+        """Schedule a task.
+
+        Parameters
+        ----------
+        name : str
+            Unique name of the task.
+        action : callable
+            Called without argument. It may return the delay in seconds until
+            its next run, by default the interval is used.
+        interval : float
+            Seconds between the end of a run and the next one.
+        delay : float
+            Seconds until the first run.
+        """
+        with self._lock:
+            if name in self._tasks:
+                raise ValueError(f"Task {name!r} already scheduled")
+            task = _Task(name, action, interval)
+            self._tasks[name] = task
+            self._schedule(task, self.clock.time() + delay)
+        self._wake.set()
+
+    def trigger(self, name: str) -> None:
+        """Run a task as soon as possible, e.g. from a button callback."""
+        with self._lock:
+            task = self._tasks[name]
+            task.triggered += 1
+            self._schedule(task, self.clock.time())
+        self._wake.set()
+
+    def stop(self) -> None:
+        """Make `run` return after the current task."""
+        self._stop = True
+        self._wake.set()
+
+    def stats(self) -> dict[str, TaskStats]:
+        with self._lock:
+            return {
+                name: TaskStats(
+                    task.runs,
+                    task.triggered,
+                    task.errors,
+                    task.busy_time,
+                    task.last_run,
+                    task.due,
+                )
+                for name, task in self._tasks.items()
+            }
+
+    def run(self, until: Optional[float] = None) -> None:
+        """Run the tasks until `stop` is called or the clock reaches `until`.
+
+        An exception in an action is logged and the task runs again after
+        its interval.
+        """
+        self._stop = False
+        while not self._stop:
+            self._wake.clear()
+            now = self.clock.time()
+            with self._lock:
+                task = self._next()
+            if until is not None and now >= until:
+                return
+            if task is None or task.due > now:
+                due = float("inf") if task is None else task.due
+                if until is not None:
+                    due = min(due, until)
+                self.clock.wait(self._wake, due - now)
+                continue
+
+            with self._lock:
+                heapq.heappop(self._timers)
+                timer = task.timer
+            start = self.clock.time()
+            try:
+                delay = task.action()
+            except Exception:
+                logger.exception("Task %s failed", task.name)
+                delay = None
+                task.errors += 1
+            end = self.clock.time()
+            with self._lock:
+                task.runs += 1
+                task.busy_time += end - start
+                task.last_run = start
+                # a trigger during the run already scheduled the next one
+                if task.timer == timer:
+                    self._schedule(
+                        task, end + (task.interval if delay is None else delay)
+                    )
+
+    def _schedule(self, task: _Task, due: float) -> None:
+        task.due = due
+        task.timer = next(self._counter)
+        heapq.heappush(self._timers, (due, task.timer, task.name))
+
+    def _next(self) -> Optional[_Task]:
+        """Earliest task, dropping timers replaced by a later schedule."""
+        while self._timers:
+            _, timer, name = self._timers[0]
+            task = self._tasks[name]
+            if task.timer == timer:
+                return task
+            heapq.heappop(self._timers)
+        return None
+
+
+class DailyBackoff:
+    """Delay until the next poll of a value published once a day.
+
+    Wait for the expected publication time, less `early` seconds. From then
+    on and until the value is found, poll every `min_interval` seconds
+    doubling up to `max_interval`. Once found, wait for the next day.
+
+    Parameters
+    ----------
+    publication : datetime.time
+        Expected publication time, timezone aware.
+    early : float
+        Seconds before the expected publication time to start polling.
+    min_interval, max_interval : float
+        Bounds of the polling interval in seconds.
+    """
+
+    def __init__(
+        self,
+        publication: datetime.time,
+        *,
+        early: float = 0,
+        min_interval: float = 300,
+        max_interval: float = 3600,
+    ):
+        self.publication = publication
+        self.early = early
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self._attempt = 0
+
+    def __call__(self, now: float, found: bool) -> float:
+        """Seconds from `now` (since the epoch) until the next poll."""
+        now_date = datetime.datetime.fromtimestamp(now, tz=self.publication.tzinfo)
+        publication = datetime.datetime.combine(now_date.date(), self.publication)
+        publication -= datetime.timedelta(seconds=self.early)
+        if found:
+            self._attempt = 0
+            publication += datetime.timedelta(days=1)
+            return (publication - now_date).total_seconds()
+        if now_date < publication:
+            self._attempt = 0
+            return (publication - now_date).total_seconds()
+        delay = min(self.min_interval * 2**self._attempt, self.max_interval)
+        self._attempt += 1
+        return delay
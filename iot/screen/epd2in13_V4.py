@@ -39,6 +39,7 @@ if sys.platform == "darwin":
 
 import logging
 import time
+from typing import Iterable, NamedTuple, Optional, Union
 
 import gpiozero
 import spidev
@@ -55,8 +56,12 @@ class RaspberryPi:
     BUSY_PIN = 18
     PWR_PIN = 22
 
-    def __init__(self):
+    def __init__(self, max_speed_hz: int = 4_000_000):
         self.SPI = spidev.SpiDev()
+        self.max_speed_hz = max_speed_hz
+        self.spi_open = False
+        # level of the DC pin, None if unknown
+        self._dc: Optional[int] = None
         self.GPIO_RST_PIN = gpiozero.LED(self.RST_PIN)
         self.GPIO_DC_PIN = gpiozero.LED(self.DC_PIN)
         # self.GPIO_CS_PIN     = gpiozero.LED(self.CS_PIN)
@@ -74,6 +79,7 @@ class RaspberryPi:
                 self.GPIO_DC_PIN.on()
             else:
                 self.GPIO_DC_PIN.off()
+            self._dc = value
         # elif pin == self.CS_PIN:
         #     if value:
         #         self.GPIO_CS_PIN.on()
@@ -85,6 +91,21 @@ class RaspberryPi:
             else:
                 self.GPIO_PWR_PIN.off()
 
+    def set_dc(self, value):
+        """Select commands (0) or data (1), only toggling the pin on change."""
+        if value != self._dc:
+            self.digital_write(self.DC_PIN, value)
+
+    def wait_busy(self, level, timeout):
+        """Wait for the BUSY pin to be at `level`, woken up by its edges.
+
+        Returns False if the pin is still at the other level after
+        `timeout` seconds.
+        """
+        if level:
+            return self.GPIO_BUSY_PIN.wait_for_press(timeout)
+        return self.GPIO_BUSY_PIN.wait_for_release(timeout)
+
     def digital_read(self, pin):
         if pin == self.BUSY_PIN:
             return self.GPIO_BUSY_PIN.value
@@ -108,19 +129,24 @@ class RaspberryPi:
 
     def module_init(self):
         self.GPIO_PWR_PIN.on()
+        if self.spi_open:
+            return 0
 
         # SPI device, bus = 0, device = 0
         self.SPI.open(0, 0)
-        self.SPI.max_speed_hz = 4000000
+        self.SPI.max_speed_hz = self.max_speed_hz
         self.SPI.mode = 0b00
+        self.spi_open = True
         return 0
 
     def module_exit(self, cleanup=False):
         logger.debug("spi end")
         self.SPI.close()
+        self.spi_open = False
 
         self.GPIO_RST_PIN.off()
         self.GPIO_DC_PIN.off()
+        self._dc = 0
         self.GPIO_PWR_PIN.off()
         logger.debug("close 5V, Module enters 0 power consumption ...")
 
@@ -132,9 +158,81 @@ class RaspberryPi:
             self.GPIO_BUSY_PIN.close()
 
 
+# bytes-like payload of a command, sent as is
+Payload = Optional[Union[bytes, bytearray, memoryview]]
+
+
+class SpiTransport:
+    """Send sequences of commands with their data in few SPI transfers.
+
+    Consecutive commands without data are sent in a single transfer, and
+    the data of a command in another one, as is: the framebuffer of
+    `EPD.get_buffer` is not copied. The DC pin only toggles between
+    commands and data. Chip select is driven by the SPI device itself.
+    """
+
+    def __init__(self, epdconfig: RaspberryPi):
+        self.epdconfig = epdconfig
+
+    def send(self, sequence: "Iterable[tuple[int, Payload]]") -> None:
+        """Send ``(command, data)`` pairs, data may be None or empty."""
+        commands = bytearray()
+        for command, payload in sequence:
+            commands.append(command)
+            if payload:
+                self._write(0, commands)
+                commands = bytearray()
+                self._write(1, payload)
+        if commands:
+            self._write(0, commands)
+
+    def _write(self, dc, data) -> None:
+        self.epdconfig.set_dc(dc)
+        self.epdconfig.spi_writebyte2(data)
+
+
+class BusyStats(NamedTuple):
+    """Waits for the panel of one kind, e.g. full or partial refreshes."""
+
+    count: int
+    #: seconds the panel was busy
+    total: float
+    longest: float
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
 class EPD:
-    def __init__(self):
-        self.epdconfig = RaspberryPi()
+    """Driver of the panel.
+
+    The frame last written to the RAM of the panel is kept, so that
+    `display_diff` only sends the region which changed. Commands are sent
+    in sequences by a `SpiTransport`.
+
+    Parameters
+    ----------
+    epdconfig : RaspberryPi, optional
+        GPIO and SPI of the panel, e.g. a fake one to benchmark the driver.
+    max_speed_hz : int
+        SPI clock of the default `RaspberryPi`, the controller accepts up
+        to 20 MHz for writes.
+    busy_timeout : float
+        Seconds to wait for the panel before raising a `TimeoutError`, a
+        full refresh takes a few seconds, longer in the cold.
+    """
+
+    def __init__(
+        self,
+        epdconfig: Optional[RaspberryPi] = None,
+        max_speed_hz: int = 4_000_000,
+        busy_timeout: float = 20.0,
+    ):
+        if epdconfig is None:
+            epdconfig = RaspberryPi(max_speed_hz=max_speed_hz)
+        self.epdconfig = epdconfig
+        self.transport = SpiTransport(epdconfig)
 
         self.reset_pin = self.epdconfig.RST_PIN
         self.dc_pin = self.epdconfig.DC_PIN
@@ -142,6 +240,13 @@ class EPD:
         self.cs_pin = self.epdconfig.CS_PIN
         self.width = 122
         self.height = 250
+        # bytes of a line of the framebuffer, the last one is padded
+        self.line_bytes = (self.width + 7) // 8
+        # framebuffer in the RAM of the panel, None if unknown
+        self._frame: Optional[bytes] = None
+        self.busy_timeout = busy_timeout
+        # seconds of each wait for the panel, by kind of operation
+        self._busy: dict[str, list[float]] = {}
 
         # some magic as not working
         # self.init()
@@ -149,66 +254,58 @@ class EPD:
 
     def init(self):
         """Initialize the e-Paper register."""
+        # powered off and SPI closed by `sleep`
+        self.epdconfig.module_init()
         # EPD hardware init start
         self._reset()
 
-        self._read_busy()
-        self._send_command(0x12)  # SWRESET
-        self._read_busy()
-
-        self._send_command(0x01)  # Driver output control
-        self._send_data(0xF9)
-        self._send_data(0x00)
-        self._send_data(0x00)
-
-        self._send_command(0x11)  # data entry mode
-        self._send_data(0x03)
-
-        self._set_window(0, 0, self.width - 1, self.height - 1)
-        self._set_cursor(0, 0)
-
-        self._send_command(0x3C)
-        self._send_data(0x05)
-
-        self._send_command(0x21)  # Display update control
-        self._send_data(0x00)
-        self._send_data(0x80)
-
-        self._send_command(0x18)
-        self._send_data(0x80)
-
-        self._read_busy()
+        self._read_busy("reset")
+        self._send([(0x12, None)])  # SWRESET
+        self._read_busy("reset")
+
+        self._send(
+            [
+                (0x01, b"\xf9\x00\x00"),  # Driver output control
+                (0x11, b"\x03"),  # data entry mode
+                *self._window(0, 0, self.width - 1, self.height - 1),
+                *self._cursor(0, 0),
+                (0x3C, b"\x05"),
+                (0x21, b"\x00\x80"),  # Display update control
+                (0x18, b"\x80"),
+            ]
+        )
+        self._read_busy("init")
 
     def init_fast(self):
         """Initialize the e-Paper fast register."""
+        self.epdconfig.module_init()
         # EPD hardware init start
         self._reset()
 
-        self._send_command(0x12)  # SWRESET
-        self._read_busy()
-
-        self._send_command(0x18)  # Read built-in temperature sensor
-        self._send_command(0x80)
-
-        self._send_command(0x11)  # data entry mode
-        self._send_data(0x03)
-
-        self._set_window(0, 0, self.width - 1, self.height - 1)
-        self._set_cursor(0, 0)
-
-        self._send_command(0x22)  # Load temperature value
-        self._send_data(0xB1)
-        self._send_command(0x20)
-        self._read_busy()
-
-        self._send_command(0x1A)  # Write to temperature register
-        self._send_data(0x64)
-        self._send_data(0x00)
-
-        self._send_command(0x22)  # Load temperature value
-        self._send_data(0x91)
-        self._send_command(0x20)
-        self._read_busy()
+        self._send([(0x12, None)])  # SWRESET
+        self._read_busy("reset")
+
+        self._send(
+            [
+                (0x18, None),  # Read built-in temperature sensor
+                (0x80, None),
+                (0x11, b"\x03"),  # data entry mode
+                *self._window(0, 0, self.width - 1, self.height - 1),
+                *self._cursor(0, 0),
+                (0x22, b"\xb1"),  # Load temperature value
+                (0x20, None),
+            ]
+        )
+        self._read_busy("init")
+
+        self._send(
+            [
+                (0x1A, b"\x64\x00"),  # Write to temperature register
+                (0x22, b"\x91"),  # Load temperature value
+                (0x20, None),
+            ]
+        )
+        self._read_busy("init")
 
         return 0
 
@@ -229,72 +326,169 @@ class EPD:
                 + str(self.height)
             )
             # return a blank buffer
-            return [0x00] * (int(self.width / 8) * self.height)
+            return bytearray(self.line_bytes * self.height)
 
         buf = bytearray(img.tobytes("raw"))
         return buf
 
     def display(self, image):
         """Sends the image buffer in RAM to e-Paper and displays."""
-        self._send_command(0x24)
-        self._send_data2(image)
-        self._turn_on_display()
+        self._send([(0x24, image), *self._UPDATE_FULL])
+        self._frame = bytes(image)
+        self._read_busy("full")
 
     def display_partial(self, image):
         """Sends the image buffer in RAM to e-Paper and partial refresh."""
-        self.epdconfig.digital_write(self.reset_pin, 0)
-        self.epdconfig.delay_ms(1)
-        self.epdconfig.digital_write(self.reset_pin, 1)
-
-        self._send_command(0x3C)  # BorderWavefrom
-        self._send_data(0x80)
-
-        self._send_command(0x01)  # Driver output control
-        self._send_data(0xF9)
-        self._send_data(0x00)
-        self._send_data(0x00)
-
-        self._send_command(0x11)  # data entry mode
-        self._send_data(0x03)
-
-        self._set_window(0, 0, self.width - 1, self.height - 1)
-        self._set_cursor(0, 0)
+        self._pulse_reset()
+        self._send(
+            [
+                *self._PARTIAL_SETUP,
+                *self._window(0, 0, self.width - 1, self.height - 1),
+                *self._cursor(0, 0),
+                (0x24, image),  # WRITE_RAM
+                *self._UPDATE_PARTIAL,
+            ]
+        )
+        self._frame = bytes(image)
+        self._read_busy("partial")
+
+    def display_diff(self, image, force=False):
+        """Partial refresh of the region which changed since the last frame.
+
+        The framebuffer of `image` is compared with the one in the RAM of
+        the panel and only the bounding rectangle of the changed bytes is
+        sent. If the RAM is unknown, e.g. after a power off, the whole frame
+        is sent.
+
+        Parameters
+        ----------
+        image : PIL.Image
+            Frame, in landscape or portrait.
+        force : bool
+            Refresh the panel even if nothing changed, the whole frame is
+            then sent.
+
+        Returns
+        -------
+        region : tuple of int, optional
+            ``(x_start, y_start, x_end, y_end)`` refreshed in pixels of the
+            panel, None if nothing changed and the panel was not refreshed.
+        """
+        buffer = self.get_buffer(image)
+        region = self._dirty_region(buffer)
+        if region is None:
+            if not force:
+                return None
+            region = 0, 0, self.line_bytes - 1, self.height - 1
+        x_start, y_start, x_end, y_end = region
+        line = self.line_bytes
+        if x_end - x_start + 1 == line:
+            data = memoryview(buffer)[y_start * line : (y_end + 1) * line]
+        else:
+            data = b"".join(
+                buffer[y * line + x_start : y * line + x_end + 1]
+                for y in range(y_start, y_end + 1)
+            )
 
-        self._send_command(0x24)  # WRITE_RAM
-        self._send_data2(image)
-        self._turn_on_display_part()
+        self._pulse_reset()
+        self._send(
+            [
+                *self._PARTIAL_SETUP,
+                *self._window(x_start * 8, y_start, x_end * 8 + 7, y_end),
+                *self._cursor(x_start, y_start),
+                (0x24, data),  # WRITE_RAM
+                *self._UPDATE_PARTIAL,
+            ]
+        )
+        # a new buffer, kept without a copy
+        self._frame = buffer
+        self._read_busy("partial")
+        return x_start * 8, y_start, min(x_end * 8 + 7, self.width - 1), y_end
 
     def display_part_base_image(self, image):
         """Refresh a base image."""
-        self._send_command(0x24)
-        self._send_data2(image)
-
-        self._send_command(0x26)
-        self._send_data2(image)
-        self._turn_on_display()
+        self._send([(0x24, image), (0x26, image), *self._UPDATE_FULL])
+        self._frame = bytes(image)
+        self._read_busy("full")
 
     def clear(self, color=0xFF):
         """Clear screen."""
-        if self.width % 8 == 0:
-            linewidth = int(self.width / 8)
-        else:
-            linewidth = int(self.width / 8) + 1
-        # logger.debug(linewidth)
+        frame = bytes([color]) * (self.line_bytes * self.height)
+        self._send([(0x24, frame), *self._UPDATE_FULL])
+        self._frame = frame
+        self._read_busy("full")
 
-        self._send_command(0x24)
-        self._send_data2([color] * int(self.height * linewidth))
-        self._turn_on_display()
+    def sleep(self, deep=False, power_off=True):
+        """Enter sleep mode.
 
-    def sleep(self, deep=False):
-        """Enter sleep mode."""
-        self._send_command(0x10)  # enter deep sleep
-        self._send_data(0x01)
-
-        self.epdconfig.delay_ms(2000)
+        The deep sleep mode 1 keeps the RAM. Unless `power_off` is False,
+        the module is then powered off and the RAM lost: the next
+        `display_diff` sends the whole frame.
+        """
+        self._send([(0x10, b"\x01")])  # enter deep sleep
+        if not power_off:
+            return
+
+        # BUSY stays high in deep sleep, at most the 2 s waited before
+        start = time.perf_counter()
+        if self.epdconfig.wait_busy(1, 2.0):
+            self._busy.setdefault("deep sleep", []).append(
+                time.perf_counter() - start
+            )
+        else:
+            logger.debug("e-Paper deep sleep not signalled on BUSY")
         self.epdconfig.module_exit(cleanup=deep)
+        self._frame = None
+
+    def busy_stats(self) -> "dict[str, BusyStats]":
+        """Time the panel was busy, by kind: full, partial, init, etc."""
+        return {
+            kind: BusyStats(len(times), sum(times), max(times))
+            for kind, times in self._busy.items()
+        }
 
     # Private API
 
+    # Display Update Control, then Activate Display Update Sequence
+    _UPDATE_FULL = ((0x22, b"\xf7"), (0x20, None))
+    _UPDATE_FAST = ((0x22, b"\xc7"), (0x20, None))  # fast:0x0c, quality:0x0f, 0xcf
+    _UPDATE_PARTIAL = ((0x22, b"\xff"), (0x20, None))
+    _PARTIAL_SETUP = (
+        (0x3C, b"\x80"),  # BorderWavefrom
+        (0x01, b"\xf9\x00\x00"),  # Driver output control
+        (0x11, b"\x03"),  # data entry mode
+    )
+
+    def _send(self, sequence):
+        self.transport.send(sequence)
+
+    def _pulse_reset(self):
+        # the RAM is kept by the reset, as by the SWRESET of `init`
+        self.epdconfig.digital_write(self.reset_pin, 0)
+        self.epdconfig.delay_ms(1)
+        self.epdconfig.digital_write(self.reset_pin, 1)
+
+    def _dirty_region(self, buffer):
+        """Changed bytes ``(x_start, y_start, x_end, y_end)``, x in bytes."""
+        line = self.line_bytes
+        previous = self._frame
+        if previous is None or len(previous) != len(buffer):
+            return 0, 0, line - 1, self.height - 1
+        rows = [
+            y
+            for y in range(self.height)
+            if buffer[y * line : (y + 1) * line] != previous[y * line : (y + 1) * line]
+        ]
+        if not rows:
+            return None
+        columns = [
+            x
+            for y in rows
+            for x in range(line)
+            if buffer[y * line + x] != previous[y * line + x]
+        ]
+        return min(columns), rows[0], max(columns), rows[-1]
+
     def _reset(self):
         """Hardware reset."""
         self.epdconfig.digital_write(self.reset_pin, 1)
@@ -305,48 +499,58 @@ class EPD:
         self.epdconfig.delay_ms(20)
 
     def _send_command(self, command):
-        self.epdconfig.digital_write(self.dc_pin, 0)
-        self.epdconfig.digital_write(self.cs_pin, 0)
-        self.epdconfig.spi_writebyte([command])
-        self.epdconfig.digital_write(self.cs_pin, 1)
+        self._send([(command, None)])
 
     def _send_data(self, data):
-        self.epdconfig.digital_write(self.dc_pin, 1)
-        self.epdconfig.digital_write(self.cs_pin, 0)
-        self.epdconfig.spi_writebyte([data])
-        self.epdconfig.digital_write(self.cs_pin, 1)
+        self.transport._write(1, bytes([data]))
 
     def _send_data2(self, data):
         """Send more data"""
-        self.epdconfig.digital_write(self.dc_pin, 1)
-        self.epdconfig.digital_write(self.cs_pin, 0)
-        self.epdconfig.spi_writebyte2(data)
-        self.epdconfig.digital_write(self.cs_pin, 1)
+        self.transport._write(1, data)
+
+    def _read_busy(self, kind):
+        """Wait until the busy_pin goes LOW, on its falling edge.
 
-    def _read_busy(self):
-        """Wait until the busy_pin goes LOW."""
-        logger.debug("e-Paper busy")
-        while self.epdconfig.digital_read(self.busy_pin) == 1:  # 0: idle, 1: busy
-            self.epdconfig.delay_ms(10)
-        logger.debug("e-Paper busy release")
+        Raises a `TimeoutError` after `busy_timeout` seconds, the panel then
+        needs an `init`.
+        """
+        start = time.perf_counter()
+        released = self.epdconfig.wait_busy(0, self.busy_timeout)  # 0: idle, 1: busy
+        elapsed = time.perf_counter() - start
+        if not released:
+            # the RAM may not hold the frame sent
+            self._frame = None
+            raise TimeoutError(
+                f"e-Paper busy for more than {self.busy_timeout} s ({kind})"
+            )
+        self._busy.setdefault(kind, []).append(elapsed)
+        logger.debug(f"e-Paper busy for {elapsed:.3f} s ({kind})")
 
     def _turn_on_display(self):
-        self._send_command(0x22)  # Display Update Control
-        self._send_data(0xF7)
-        self._send_command(0x20)  # Activate Display Update Sequence
-        self._read_busy()
+        self._send(self._UPDATE_FULL)
+        self._read_busy("full")
 
     def _turn_on_display_fast(self):
-        self._send_command(0x22)  # Display Update Control
-        self._send_data(0xC7)  # fast:0x0c, quality:0x0f, 0xcf
-        self._send_command(0x20)  # Activate Display Update Sequence
-        self._read_busy()
+        self._send(self._UPDATE_FAST)
+        self._read_busy("fast")
 
     def _turn_on_display_part(self):
-        self._send_command(0x22)  # Display Update Control
-        self._send_data(0xFF)  # fast:0x0c, quality:0x0f, 0xcf
-        self._send_command(0x20)  # Activate Display Update Sequence
-        self._read_busy()
+        self._send(self._UPDATE_PARTIAL)
+        self._read_busy("partial")
+
+    def _window(self, x_start, y_start, x_end, y_end):
+        # SET_RAM_X_ADDRESS_START_END_POSITION
+        # x point must be the multiple of 8 or the last 3 bits will be ignored
+        x_range = bytes([(x_start >> 3) & 0xFF, (x_end >> 3) & 0xFF])
+        # SET_RAM_Y_ADDRESS_START_END_POSITION
+        y_range = bytes(
+            [y_start & 0xFF, (y_start >> 8) & 0xFF, y_end & 0xFF, (y_end >> 8) & 0xFF]
+        )
+        return (0x44, x_range), (0x45, y_range)
+
+    def _cursor(self, x, y):
+        # SET_RAM_X_ADDRESS_COUNTER, SET_RAM_Y_ADDRESS_COUNTER
+        return (0x4E, bytes([x & 0xFF])), (0x4F, bytes([y & 0xFF, (y >> 8) & 0xFF]))
 
     def _set_window(self, x_start, y_start, x_end, y_end):
         """Setting the display window.
@@ -356,27 +560,12 @@ class EPD:
             xend : End position of X-axis
             yend : End position of Y-axis
         """
-        self._send_command(0x44)  # SET_RAM_X_ADDRESS_START_END_POSITION
-        # x point must be the multiple of 8 or the last 3 bits will be ignored
-        self._send_data((x_start >> 3) & 0xFF)
-        self._send_data((x_end >> 3) & 0xFF)
-
-        self._send_command(0x45)  # SET_RAM_Y_ADDRESS_START_END_POSITION
-        self._send_data(y_start & 0xFF)
-        self._send_data((y_start >> 8) & 0xFF)
-        self._send_data(y_end & 0xFF)
-        self._send_data((y_end >> 8) & 0xFF)
+        self._send(self._window(x_start, y_start, x_end, y_end))
 
     def _set_cursor(self, x, y):
         """Set Cursor.
         parameter:
-            x : X-axis starting position
+            x : X-axis starting position, in bytes
             y : Y-axis starting position
         """
-        self._send_command(0x4E)  # SET_RAM_X_ADDRESS_COUNTER
-        # x point must be the multiple of 8 or the last 3 bits will be ignored
-        self._send_data(x & 0xFF)
-
-        self._send_command(0x4F)  # SET_RAM_Y_ADDRESS_COUNTER
-        self._send_data(y & 0xFF)
-        self._send_data((y >> 8) & 0xFF)
+        self._send(self._cursor(x, y))
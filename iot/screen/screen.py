@@ -1,20 +1,69 @@
 import atexit
+import hashlib
 import logging
 import pathlib
+import threading
+import time
+from typing import NamedTuple, Optional
 
 from PIL import Image, ImageDraw
 
-import epd2in13_V4
+from . import epd2in13_V4
 
 logging.basicConfig(level=logging.INFO)
 
+logger = logging.getLogger(__name__)
+
+
+class RefreshStats(NamedTuple):
+    full_refreshes: int
+    partial_refreshes: int
+    #: seconds spent in full refreshes, wake up and sleep included
+    full_time: float
+    partial_time: float
+    #: updates which would not change the frame on the panel
+    skipped: int
+
 
 class SealScreen:
-    def __init__(self):
-        self.epd = epd2in13_V4.EPD()
-        self.epd.init()
-        self.epd.clear()
+    """Long-lived display session.
+
+    The template is rendered and uploaded with a full refresh once, then
+    each update only sends the region which changed, with a partial
+    refresh. Every `full_refresh_every` updates, a full refresh clears the
+    ghosting left by partial ones. Between updates the panel sleeps but
+    stays powered, so that its RAM holds the last frame.
+
+    An update rendering the same frame as the one on the panel is skipped,
+    without waking it up.
+
+    Parameters
+    ----------
+    full_refresh_every : int
+        Number of updates between two full refreshes.
+    epd : EPD, optional
+        Driver of the panel, e.g. with a fake GPIO and SPI.
+    """
+
+    def __init__(
+        self,
+        full_refresh_every: int = 24,
+        epd: Optional[epd2in13_V4.EPD] = None,
+    ):
+        self.full_refresh_every = full_refresh_every
+        self.epd = epd2in13_V4.EPD() if epd is None else epd
+        self._lock = threading.RLock()
+        self._awake = False
+        self._partials = 0
+        # hash of the frame on the panel
+        self._frame_hash: Optional[bytes] = None
+        self._skipped = 0
+        self._counts = {"full": 0, "partial": 0}
+        self._times = {"full": 0.0, "partial": 0.0}
+
         self._render_template()
+        self._refresh("full")
+        atexit.register(self.shutdown)
 
     def _render_template(self):
         self.base_image = Image.new("1", (self.epd.height, self.epd.width), 255)
@@ -29,30 +78,88 @@ class SealScreen:
         logo = logo.convert("1", dither=Image.Dither.NONE)
         self.base_image.paste(logo, (5, 10))
 
-        self.epd.display_part_base_image(self.epd.get_buffer(self.base_image))
-        self.epd.sleep()  # deep?
+    def wake(self):
+        """Wake the panel up ahead of an update, e.g. while data loads."""
+        with self._lock:
+            if not self._awake:
+                self.epd.init()
+                self._awake = True
+
+    def update_screen(
+        self, seal_onchain, seal_offchain, ice_extent, delta, force=False
+    ):
+        """Draw the values, refreshing the panel only if the frame changed.
+
+        With `force`, the panel is refreshed even if the frame is the same.
+        Returns whether the panel was refreshed.
+        """
+        with self._lock:
+            # blank fill update area
+            self.draw.rectangle(((140, 0), (250, 122)), fill=255)
+
+            self.draw.text((140, 30), f"Ice Extent: {ice_extent}", fill=0)
+            self.draw.text((140, 45), f"Delta: {delta} Mkm^2", fill=0)
+
+            self.draw.text((140, 70), "Supply", fill=0)
+            self.draw.text((140, 85), f"- On-chain:  {seal_onchain:.2e}", fill=0)
+            self.draw.text((140, 100), f"- Off-chain:   {seal_offchain:.2e}", fill=0)
 
-    def update_screen(self, seal_onchain, seal_offchain, ice_extent, delta):
-        self.epd.init()
+            frame_hash = hashlib.blake2b(self.base_image.tobytes()).digest()
+            if frame_hash == self._frame_hash and not force:
+                self._skipped += 1
+                if self._awake:
+                    # woken up ahead of time for nothing
+                    self.epd.sleep(power_off=False)
+                    self._awake = False
+                return False
 
-        # blank fill update area
-        self.draw.rectangle(((140, 0), (250, 122)), fill=255)
+            # screen refresh
+            if self._partials + 1 >= self.full_refresh_every:
+                self._refresh("full")
+            else:
+                self._refresh("partial", force=force)
+            return True
 
-        self.draw.text((140, 30), f"Ice Extent: {ice_extent}", fill=0)
-        self.draw.text((140, 45), f"Delta: {delta} Mkm^2", fill=0)
+    def _refresh(self, kind, force=False):
+        start = time.perf_counter()
+        try:
+            self.wake()
+            if kind == "full":
+                # both RAMs hold the frame, the base of the next partial refresh
+                self.epd.display_part_base_image(
+                    self.epd.get_buffer(self.base_image)
+                )
+                self._partials = 0
+            else:
+                self.epd.display_diff(self.base_image, force=force)
+                self._partials += 1
+        except TimeoutError:
+            # hung panel, initialized again and refreshed by the next update
+            self._awake = False
+            self._frame_hash = None
+            raise
+        self.epd.sleep(power_off=False)
+        self._awake = False
+        self._frame_hash = hashlib.blake2b(self.base_image.tobytes()).digest()
 
-        self.draw.text((140, 70), "Supply", fill=0)
-        self.draw.text((140, 85), f"- On-chain:  {seal_onchain:.2e}", fill=0)
-        self.draw.text((140, 100), f"- Off-chain:   {seal_offchain:.2e}", fill=0)
+        elapsed = time.perf_counter() - start
+        self._counts[kind] += 1
+        self._times[kind] += elapsed
+        logger.debug(f"{kind} refresh in {elapsed:.2f} s")
 
-        # screen refresh
-        self.epd.display_partial(self.epd.get_buffer(self.base_image))
-        self.epd.sleep()
+    def stats(self) -> RefreshStats:
+        with self._lock:
+            return RefreshStats(
+                full_refreshes=self._counts["full"],
+                partial_refreshes=self._counts["partial"],
+                full_time=self._times["full"],
+                partial_time=self._times["partial"],
+                skipped=self._skipped,
+            )
 
-    @staticmethod
-    @atexit.register
-    def shutdown():
-        _epd = epd2in13_V4.EPD()
-        _epd.init()
-        _epd.clear()
-        _epd.sleep()
+    def shutdown(self):
+        with self._lock:
+            self._frame_hash = None
+            self.epd.init()
+            self.epd.clear()
+            self.epd.sleep()
@@ -1,18 +1,39 @@
+"""SEAL supply controller.
+
+Heavy dependencies (gpiozero, stellar_sdk, PIL/spidev for the screen) are
+imported and the devices and network clients created on first use, so that
+the controller restarts quickly after a crash or power loss.
+
+Use ``--profile-startup`` to report the import and initialisation time
+per module. On a machine without GPIO, set ``GPIOZERO_PIN_FACTORY=mock``.
+
+The testnet servers can be overridden with the ``HORIZON_URL`` and
+``SOROBAN_RPC_URL`` environment variables, e.g. to run against the local
+stand-ins of ``benchmarks/standin.py``.
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import contextlib
 import datetime
+import decimal
+import functools
+import importlib
 import logging
 import math
 import os
-import statistics
+import sys
 import time
-from typing import Literal
-
-from gpiozero import Button, DistanceSensor, LED, Motor
-import stellar_sdk
-from stellar_sdk.exceptions import SdkError
-
+from typing import Awaitable, Callable, Iterator, Literal, NamedTuple, Optional
+
+import actuator
+import balance
+import climatology
+import level
+import pump
+import scheduler
 import sii
-from screen import screen
-from soroban import soroban_invoke
+import state
 
 
 logging.basicConfig(level=logging.INFO)
@@ -22,9 +43,7 @@ CONTRACT_HASH = os.getenv("CONTRACT_HASH")
 ISSUER_ADDR_SECRET = os.getenv("ISSUER_ADDR_SECRET")
 DISTRIBUTION_ADDR_SECRET = os.getenv("DISTRIBUTION_ADDR_SECRET")
 
-issuer_kp = stellar_sdk.Keypair.from_secret(ISSUER_ADDR_SECRET)
-distribution_kp = stellar_sdk.Keypair.from_secret(DISTRIBUTION_ADDR_SECRET)
-stellar_server = stellar_sdk.Server(horizon_url="https://horizon-testnet.stellar.org")
+HORIZON_URL = os.getenv("HORIZON_URL", "https://horizon-testnet.stellar.org")
 
 # if CONTRACT_HASH is None or ISSUER_ADDR_SECRET is None or DISTRIBUTION_ADDR_SECRET is None:
 #     raise ValueError(
@@ -37,132 +56,643 @@ stellar_server = stellar_sdk.Server(horizon_url="https://horizon-testnet.stellar
 TOKEN_GENESIS = 1_000_000_000
 LITER_PER_TOKEN = 1 / TOKEN_GENESIS
 TOKEN_VOLATILE = 500_000_000
+# amounts of the token contract are in 1e-7 SEAL
+TOKEN_BASE_UNIT = 10_000_000
+# median extent baseline, must match contract/src/historical_data.rs
+BASELINE = (1981, 2010)
+# only trigger if outside [-1000,1000]
+DEAD_BAND = 1000
 
 # hardware setup
-mint_button = Button(2)
-burn_button = Button(26)
 MINT_AMOUNT = 100_000_000
 BURN_AMOUNT = 100_000_000
 
-burn_led = LED(5)  # Red
-mint_led = LED(6)  # Blue
+FLOW_RATE = 1 / (34 * 10)  # l/s  calibration on 100ml, refined in closed loop
+# stop the pump on the measured level instead of the pump time, off until
+# validated on the hardware
+PUMP_CLOSED_LOOP = False
+# button presses closer than this are dropped
+BUTTON_DEBOUNCE = 0.5  # s
+# at most BUTTON_MAX_PRESSES per button over BUTTON_PERIOD
+BUTTON_MAX_PRESSES = 5
+BUTTON_PERIOD = 60  # s
+
+# task timers
+# expected NSIDC update, the oracle is polled from ORACLE_EARLY before until
+# the day is settled
+ORACLE_PUBLICATION = datetime.time(12, tzinfo=datetime.timezone.utc)
+ORACLE_EARLY = 2 * 3600  # s
+ORACLE_MIN_INTERVAL = 300  # s, doubled until ORACLE_MAX_INTERVAL
+ORACLE_MAX_INTERVAL = 1800  # s
+# days missed while offline are settled up to this many days back
+CATCHUP_DAYS = 10
+OFFCHAIN_INTERVAL = 3600  # s
+ONCHAIN_INTERVAL = 3600  # s
+SCREEN_INTERVAL = 3600  # s
+# partial refreshes in between leave ghosting, about once a day
+SCREEN_FULL_REFRESH_EVERY = 24
+# the SSD1680 accepts writes up to 20 MHz, lower it on long wires
+SCREEN_SPI_SPEED = 10_000_000  # Hz
+# the on-chain balance is streamed, only polled if the stream is down
+BALANCE_POLL_INTERVAL = 300  # s
+BALANCE_TIMEOUT = 30  # s, first load of the account
+
+# reuse the simulation of correct_supply, only the amounts change every day
+SIMULATION_CACHE = True
+SIMULATION_TTL = 36 * 3600  # s
+# bid a percentile of the recent inclusion fees, bumped if not included
+FEE_PERCENTILE = 70
+FEE_STATS_TTL = 60  # s
+FEE_INCLUSION_TIMEOUT = 15  # s, 3 ledgers
+FEE_MAX = 2_000_000  # stroops
 
-pump = Motor(forward=4, backward=14)
-FLOW_RATE = 1 / (34 * 10)  # l/s  calibration on 100ml
-
-d_sensor = DistanceSensor(23, 24)
 SURFACE_CONTAINER = math.pi * 0.01**2  # m^2
 LENGTH_CONTAINER = 0.1  # m
+# level in m to token, same conversion as the volume
+TOKEN_PER_METER = SURFACE_CONTAINER / LITER_PER_TOKEN
+# level in m to litres, the unit of the flow rate
+LITER_PER_METER = SURFACE_CONTAINER * 1000
+LEVEL_WINDOW = 100  # samples, also the cap of the adaptive mode
+LEVEL_INTERVAL = 0.01  # s
+LEVEL_TIMEOUT = 10  # s
+LEVEL_TOLERANCE = 1_000  # SEAL, ~3 mm the sensor resolution, see `proof_of_reserve`
+LEVEL_RESOLUTION = 0.003  # m, smallest uncertainty of a level reading
+# samples closer than this are correlated, e.g. by sloshing after a run
+LEVEL_DECORRELATION = 0.1  # s
+LEVEL_MIN_SAMPLES = 5
+
+
+class Hardware:
+    """GPIO devices, each one is only claimed on first access."""
+
+    @functools.cached_property
+    def mint_button(self):
+        from gpiozero import Button
+
+        return Button(2)
+
+    @functools.cached_property
+    def burn_button(self):
+        from gpiozero import Button
+
+        return Button(26)
+
+    @functools.cached_property
+    def burn_led(self):
+        from gpiozero import LED
+
+        return LED(5)  # Red
+
+    @functools.cached_property
+    def mint_led(self):
+        from gpiozero import LED
+
+        return LED(6)  # Blue
+
+    @functools.cached_property
+    def pump(self):
+        from gpiozero import Motor
+
+        return Motor(forward=4, backward=14)
+
+    @functools.cached_property
+    def d_sensor(self):
+        from gpiozero import DistanceSensor
+
+        # raw echoes, `level_sampler` does the filtering
+        return DistanceSensor(23, 24, queue_len=1)
+
+    @functools.cached_property
+    def level_sampler(self):
+        return level.LevelSampler(
+            self.d_sensor,
+            window=LEVEL_WINDOW,
+            interval=LEVEL_INTERVAL,
+            resolution=LEVEL_RESOLUTION,
+            decorrelation=LEVEL_DECORRELATION,
+        ).start()
+
+
+hw = Hardware()
+
+
+@functools.lru_cache(maxsize=None)
+def get_keypair(secret: str):
+    """Keypair of the account with the given secret."""
+    import stellar_sdk
+
+    return stellar_sdk.Keypair.from_secret(secret)
+
+
+def supply_correction(extent: int, median_extent: int) -> int:
+    """Number of token to mint (positive) or burn (negative).
+
+    Parameters
+    ----------
+    extent : int
+        Sea ice extent of the day in 10^3 km^2.
+    median_extent : int
+        Median extent of the day of the year in 10^3 km^2.
+    """
+    # convert delta extent to token amount e.g.
+    # sea_ice_extent = 13976, median_extent = 14526
+    # 13976-14526 = -550
+    # -550 * 100 = -55k SEAL
+    delta = extent - median_extent
+    return int(delta * 100)
+
+
+def is_supply_valid(supply: int) -> bool:
+    """Whether the supply stays within the volatility range."""
+    return TOKEN_GENESIS - TOKEN_VOLATILE < supply < TOKEN_GENESIS + TOKEN_VOLATILE
+
+
+@functools.lru_cache(maxsize=None)
+def get_store() -> state.StateStore:
+    """State database, shared by the controller and the pump, opened on first use."""
+    return state.StateStore()
+
+
+@functools.lru_cache(maxsize=None)
+def get_pump_controller() -> pump.PumpController:
+    """Pump controller with the persisted flow rate, created on first use."""
+    return pump.PumpController(
+        hw.pump,
+        hw.level_sampler,
+        liter_per_meter=LITER_PER_METER,
+        liter_per_token=LITER_PER_TOKEN,
+        flow_rate=FLOW_RATE,
+        store=get_store(),
+        tolerance=LEVEL_TOLERANCE / TOKEN_PER_METER,
+        min_samples=LEVEL_MIN_SAMPLES,
+        read_timeout=LEVEL_TIMEOUT,
+    )
 
 
-def token_control(n_token: int, operation: Literal["mint", "burn"]) -> None:
+def token_control(
+    n_token: int,
+    operation: Literal["mint", "burn"],
+    *,
+    closed_loop: bool = PUMP_CLOSED_LOOP,
+) -> pump.PumpRun:
     """Mint or burn `n_token` by pumping in/out.
 
+    Drives the pump directly, use the queue of `get_actuator` instead so that
+    the pump never gets concurrent commands.
+
     Parameters
     ----------
     n_token : int
         Number of token.
     operation : {"mint", "burn"}
         Mint or burn token.
+    closed_loop : bool
+        Stop the pump on the measured level, otherwise after the pump time
+        given by the flow rate estimate.
     """
     if operation == "mint":
-        led = mint_led
-        pump_run = pump.forward
+        led = hw.mint_led
     else:
-        led = burn_led
-        pump_run = pump.backward
+        led = hw.burn_led
 
-    vol = n_token * LITER_PER_TOKEN  # l
-    pump_time = vol / FLOW_RATE  # s
+    controller = get_pump_controller()
+    pump_time = controller.planned_time(n_token, operation)  # s
 
     led.blink(on_time=0.25, off_time=0.25, n=2 * max(2, int(pump_time)))
-    pump_run(1)
-    time.sleep(pump_time)
-    pump.stop()
+    pump_run = controller.run(n_token, operation, closed_loop=closed_loop)
+    if pump_run.moved is not None:
+        logging.info(
+            f"Pumped {pump_run.moved} of {n_token} token in "
+            f"{pump_run.duration:.1f} s, flow rate {pump_run.flow_rate:.3g} l/s"
+        )
+    return pump_run
 
 
-def supply_offchain() -> int:
-    """Proof of reserve by checking the liquid level. Referred as off-chain."""
-    dists = []
-    for _ in range(100):
-        dists.append(d_sensor.distance)
-        time.sleep(0.01)
-    dist = statistics.median(dists)  # m
-    vol = SURFACE_CONTAINER * (LENGTH_CONTAINER - dist)  # m^3
+def _pump_token(amount: int) -> pump.PumpRun:
+    if amount > 0:
+        return token_control(amount, "mint")
+    return token_control(-amount, "burn")
+
+
+@functools.lru_cache(maxsize=None)
+def get_actuator() -> actuator.ActuatorQueue:
+    """Worker owning the pump, started on first use."""
+    return actuator.ActuatorQueue(
+        _pump_token,
+        debounce=BUTTON_DEBOUNCE,
+        max_jobs=BUTTON_MAX_PRESSES,
+        period=BUTTON_PERIOD,
+    ).start()
+
+
+class Reserve(NamedTuple):
+    supply: int
+    #: half-width of the 95% confidence interval on the supply
+    uncertainty: int
+    level: level.LevelReading
+
+
+def proof_of_reserve(
+    since: Optional[float] = None, tolerance: Optional[int] = LEVEL_TOLERANCE
+) -> Reserve:
+    """Off-chain supply from the liquid level, with its timestamp and freshness.
+
+    Parameters
+    ----------
+    since : float, optional
+        Only use samples taken after this `time.monotonic` time, e.g. after
+        a pump run. By default, the current window is used without waiting.
+    tolerance : int, optional
+        Stop sampling as soon as the supply is known within `tolerance`
+        SEAL, or after `LEVEL_WINDOW` samples. If None, always use a full
+        window.
+    """
+    reading = hw.level_sampler.read(
+        since=since,
+        timeout=LEVEL_TIMEOUT,
+        tolerance=None if tolerance is None else tolerance / TOKEN_PER_METER,
+        min_samples=LEVEL_MIN_SAMPLES,
+    )
+    vol = SURFACE_CONTAINER * (LENGTH_CONTAINER - reading.distance)  # m^3
     n_token = math.floor(vol / LITER_PER_TOKEN)
-    return n_token
+    uncertainty = math.ceil(reading.uncertainty * TOKEN_PER_METER)
+    return Reserve(n_token, uncertainty, reading)
 
 
-def supply_onchain() -> int:
-    """On-chain available supply."""
-    account = stellar_server.load_account(distribution_kp.public_key)
-    balances = account.raw_data["balances"]
-    seal_onchain = [
-        asset["balance"]
-        for asset in balances
-        if "asset_code" in asset and asset["asset_code"] == "SEAL"
-    ]
-    try:
-        seal_onchain = int(seal_onchain[0])
-    except IndexError:
-        seal_onchain = 0
-    return seal_onchain
-
-
-# Special Mint and Burn event
-mint_button.when_activated = lambda x: token_control(
-    n_token=MINT_AMOUNT, operation="mint"
-)
-burn_button.when_activated = lambda x: token_control(
-    n_token=BURN_AMOUNT, operation="burn"
-)
-
-doy_last_executed = 0
-while "SEAL management":
-    print("-----------------")
-    today_date = datetime.datetime.now(tz=datetime.timezone.utc)
-    doy = today_date.timetuple().tm_yday
-
-    doy_oracle, extent_oracle = sii.daily_sea_ice_extent()
-    # convert to int but keep 3 digit precision
-    # 13.976 -> 13976
-    extent_oracle = int(extent_oracle * 1000)
-    delta = extent_oracle - sii.MEDIAN_EXTENT[doy - 1]
-
-    print(f"It's a beautiful day: {today_date.strftime('%Y-%m-%d')}")
-    seal_offchain = supply_offchain()
-    print(f"Current supply: {seal_offchain}")
-
-    print(f"DOY extent: {extent_oracle}")
-
-    # only execute if measurement is from current DOY and only once per day
-    if (doy == doy_oracle) and (doy_oracle != doy_last_executed):
-        # convert delta extent to token amount e.g.
-        # sea_ice_extent = 13976, MEDIAN_EXTENT = 14526
-        # 13976-14526 = -550
-        # -550 * 100 = -55k SEAL
-        amount = int(delta * 100)
-
-        new_supply = seal_offchain + amount
-        if not (
-            TOKEN_GENESIS - TOKEN_VOLATILE < new_supply < TOKEN_GENESIS + TOKEN_VOLATILE
-        ):
-            logging.warning(f"New supply would be too much or too little: {new_supply}")
-            continue
+def supply_offchain(since: Optional[float] = None) -> int:
+    """Proof of reserve by checking the liquid level. Referred as off-chain."""
+    return proof_of_reserve(since=since).supply
+
+
+@functools.lru_cache(maxsize=None)
+def get_balance_cache() -> balance.BalanceCache:
+    """Streamed SEAL balance of the distribution account, started on first use."""
+    distribution_kp = get_keypair(DISTRIBUTION_ADDR_SECRET)
+    return balance.BalanceCache(
+        HORIZON_URL,
+        distribution_kp.public_key,
+        "SEAL",
+        poll_interval=BALANCE_POLL_INTERVAL,
+    ).start()
+
+
+@functools.lru_cache(maxsize=None)
+def get_screen():
+    """Display session, the template is uploaded on first use."""
+    from screen import epd2in13_V4, screen
+
+    return screen.SealScreen(
+        full_refresh_every=SCREEN_FULL_REFRESH_EVERY,
+        epd=epd2in13_V4.EPD(max_speed_hz=SCREEN_SPI_SPEED),
+    )
+
+
+def supply_onchain() -> decimal.Decimal:
+    """On-chain available supply, without a network round trip once loaded."""
+    return get_balance_cache().wait(timeout=BALANCE_TIMEOUT)
 
-        # only trigger if outside [-1000,1000]
-        if amount > 1000:
-            print("There is more ice than usual, Seals will be happy! Minting token")
-            token_control(amount, "mint")
-        elif amount < -1000:
-            print("Ice is melting faster, poo Seals! Burning token")
-            token_control(amount, "burn")
 
-        seal_offchain = supply_offchain()
-        print(f"New supply: {seal_offchain}")
+def record_settlements(
+    store: state.StateStore,
+    corrections: list[tuple[datetime.date, int, int, int]],
+    results: list,
+) -> bool:
+    """Mark the days settled on-chain as executed.
 
-        # calling Soroban smart contract
+    Parameters
+    ----------
+    store : StateStore
+        State of the controller.
+    corrections : list of tuple
+        Date, day of the year, extent and amount of each day.
+    results : list of InvokeResult or Exception
+        Result of the ``correct_supply`` invocation of each day.
+
+    Returns
+    -------
+    settled : bool
+        Whether a day was settled.
+    """
+    from soroban import SendAfterError
+
+    settled = False
+    for (date, doy, extent_oracle, amount), result in zip(corrections, results):
+        if isinstance(result, SendAfterError):
+            # the pump or its GPIO failed, the transaction was not sent
+            logging.error(f"Pump run of {date} failed: {result.__cause__!r}")
+            continue
+        if isinstance(result, Exception):
+            # it may have been sent, see the pending transactions
+            logging.error(f"Could not settle {date}: {result!r}")
+            continue
+        timing = result.timing
+        logging.info(
+            f"correct_supply of {date} confirmed in {timing.total:.1f} s: "
+            f"simulate {timing.simulate:.1f} s, wait {timing.wait:.1f} s, "
+            f"send {timing.send:.1f} s, confirm {timing.confirm:.1f} s "
+            f"({timing.polls} polls)"
+        )
+        # mark as executed only if no error with Soroban
+        store.record_execution(date, doy, extent_oracle, amount, result.hash)
+        settled = True
+    return settled
+
+
+class CycleTimer:
+    """Start and end of the stages of a settlement cycle.
+
+    Stages may overlap, e.g. the transaction is simulated while the pump
+    runs: the report gives each stage as an interval from the start of the
+    cycle, along with the end-to-end time.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter):
+        self.clock = clock
+        self.start = clock()
+        self.stages: dict[str, tuple[float, float]] = {}
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = self.clock()
         try:
+            yield
+        finally:
+            self.add(name, start)
+
+    def add(self, name: str, start: float) -> None:
+        """Record a stage which started at `start` and ends now."""
+        self.stages[name] = (start - self.start, self.clock() - self.start)
+
+    def report(self) -> str:
+        stages = ", ".join(
+            f"{name} {start:.1f}-{end:.1f} s"
+            for name, (start, end) in sorted(
+                self.stages.items(), key=lambda item: item[1]
+            )
+        )
+        return f"Cycle of {self.clock() - self.start:.1f} s: {stages}"
+
+
+def run(clock: Optional[scheduler.Clock] = None) -> None:
+    """Supply management tasks.
+
+    The oracle is polled around its expected publication time and the day
+    settled once. The reserve, the on-chain supply and the screen are
+    refreshed on their own timers, and right away after a button press.
+
+    A settlement is pipelined: the pump runs once the transaction is
+    simulated and it is sent once the pump is done, the reserve is measured
+    again while it is confirmed, then the on-chain balance is loaded while
+    the screen wakes up. The time of each
+    stage is logged.
+
+    Parameters
+    ----------
+    clock : Clock, optional
+        Clock of the scheduler, by default the wall clock.
+    """
+    import stellar_sdk
+
+    from fees import PercentileFeePolicy
+    from soroban import (
+        Invocation,
+        SimulationCache,
+        soroban_invoke_batch,
+        transaction_outcome,
+    )
+
+    issuer_kp = get_keypair(ISSUER_ADDR_SECRET)
+    distribution_kp = get_keypair(DISTRIBUTION_ADDR_SECRET)
+    median_extent = climatology.load(*BASELINE)
+    store = get_store()
+    hw.level_sampler.start()
+    actuator_queue = get_actuator()
+    balances = get_balance_cache()
+    # stages of a settlement running next to the scheduler thread
+    cycle_pool = concurrent.futures.ThreadPoolExecutor(
+        max_workers=3, thread_name_prefix="cycle"
+    )
+    tasks = scheduler.Scheduler(clock)
+    oracle_backoff = scheduler.DailyBackoff(
+        ORACLE_PUBLICATION,
+        early=ORACLE_EARLY,
+        min_interval=ORACLE_MIN_INTERVAL,
+        max_interval=ORACLE_MAX_INTERVAL,
+    )
+
+    def correct_supply_auth(function_name, args, invocation) -> None:
+        """Amount minted or burned by `correct_supply`, as the contract does."""
+        doy = stellar_sdk.scval.from_int32(args[2])
+        extent = stellar_sdk.scval.from_int32(args[3])
+        amount = supply_correction(extent, median_extent[doy]) * TOKEN_BASE_UNIT
+        for sub_invocation in invocation.sub_invocations:
+            contract_fn = sub_invocation.function.contract_fn
+            if contract_fn is not None and contract_fn.function_name.sc_symbol in (
+                b"mint",
+                b"burn",
+            ):
+                contract_fn.args[-1] = stellar_sdk.scval.to_int128(abs(amount))
+
+    simulations = (
+        SimulationCache(ttl=SIMULATION_TTL, rewrite_auth=correct_supply_auth)
+        if SIMULATION_CACHE
+        else None
+    )
+
+    fee_policy = PercentileFeePolicy(
+        FEE_PERCENTILE,
+        ttl=FEE_STATS_TTL,
+        inclusion_timeout=FEE_INCLUSION_TIMEOUT,
+        max_fee=FEE_MAX,
+    )
+
+    def today() -> datetime.datetime:
+        return datetime.datetime.fromtimestamp(
+            tasks.clock.time(), tz=datetime.timezone.utc
+        )
+
+    def press(amount: int, source: str) -> None:
+        future = actuator_queue.submit(amount, source)
+        if future is not None:
+            future.add_done_callback(lambda _: refresh_after_pump())
+
+    def refresh_after_pump() -> None:
+        tasks.trigger("offchain")
+        tasks.trigger("screen")
+
+    balances.on_change = lambda _: tasks.trigger("onchain")
+
+    # Special Mint and Burn event, merged with pending jobs
+    hw.mint_button.when_activated = lambda x: press(MINT_AMOUNT, "mint_button")
+    hw.burn_button.when_activated = lambda x: press(-BURN_AMOUNT, "burn_button")
+
+    def settle_day() -> float:
+        """Query the oracle and correct the supply once per day.
+
+        Days missed while offline are settled along.
+        """
+        print("-----------------")
+        today_date = today()
+
+        # once the day is settled, its reading does not change
+        if store.is_executed(today_date.date()):
+            return oracle_backoff(tasks.clock.time(), found=True)
+
+        timer = CycleTimer()
+        with timer.stage("oracle"):
+            doy_oracle, extent_oracle = sii.daily_sea_ice_extent()
+            # convert to int but keep 3 digit precision
+            # 13.976 -> 13976
+            extent_oracle = int(extent_oracle * 1000)
+            date_oracle = state.oracle_date(today_date.date(), doy_oracle)
+            store.record_reading(date_oracle, doy_oracle, extent_oracle)
+
+            print(f"It's a beautiful day: {today_date.strftime('%Y-%m-%d')}")
+            print(f"DOY extent: {extent_oracle}")
+
+            # today once published and the days missed since the first
+            # settlement
+            days = unsettled_days(today_date.date())
+        if not days or not correct_supply(days, timer):
+            tasks.trigger("screen")
+        return oracle_backoff(
+            tasks.clock.time(), found=store.is_executed(today_date.date())
+        )
+
+    def unsettled_days(
+        today_date: datetime.date,
+    ) -> list[tuple[datetime.date, int, int]]:
+        """Date, day of the year and extent of the days to settle, oldest first.
+
+        Days before the first settlement are not caught up, e.g. on the
+        first run only today is settled.
+        """
+        since = today_date
+        first = store.first_execution()
+        if first is not None:
+            since = max(first.date, today_date - datetime.timedelta(days=CATCHUP_DAYS))
+        days = []
+        for date, extent in sii.sea_ice_extent_history(since):
+            if date > today_date or store.is_executed(date):
+                continue
+            if not reconcile(date):
+                continue
+            extent = int(extent * 1000)
+            doy = date.timetuple().tm_yday
+            store.record_reading(date, doy, extent)
+            days.append((date, doy, extent))
+        return days
+
+    def reconcile(date: datetime.date) -> bool:
+        """Check the transactions sent for a day before it is settled again.
+
+        A transaction sent before a crash or a timeout may have been
+        applied, the contract would mint or burn the day twice. Returns
+        whether the day can be settled.
+        """
+        for pending in store.pending_executions(date):
+            try:
+                outcome = transaction_outcome(
+                    pending.tx_hash,
+                    pending.account,
+                    pending.sequence,
+                    pending.max_time,
+                    pending.sent_at,
+                )
+            except Exception as ex:
+                logging.warning(f"Could not check the transactions of {date}: {ex!r}")
+                return False
+            if outcome == "success":
+                logging.info(f"{date} was settled by {pending.tx_hash}")
+                store.record_execution(
+                    date, pending.doy, pending.extent, pending.amount, pending.tx_hash
+                )
+                return False
+            if outcome == "pending":
+                logging.info(f"{pending.tx_hash} of {date} may still be included")
+                return False
+            if outcome == "unknown":
+                logging.error(
+                    f"Cannot tell whether {pending.tx_hash} settled {date}, "
+                    f"check the account history and settle it by hand"
+                )
+                return False
+        store.discard_pending(date)
+        return True
+
+    def correct_supply(
+        days: list[tuple[datetime.date, int, int]], timer: CycleTimer
+    ) -> bool:
+        """Pump the correction of the days and settle them on-chain.
+
+        Returns whether the screen was refreshed.
+        """
+        with timer.stage("measure"):
+            seal_offchain = supply_offchain()
+        store.record_measurement("offchain", seal_offchain)
+        print(f"Current supply: {seal_offchain}")
+
+        corrections = []
+        new_supply = seal_offchain
+        for date, doy, extent_oracle in days:
+            amount = supply_correction(extent_oracle, median_extent[doy])
+            if not is_supply_valid(new_supply + amount):
+                logging.warning(
+                    f"New supply would be too much or too little: "
+                    f"{new_supply + amount}, not settling {date}"
+                )
+                continue
+            new_supply += amount
+            corrections.append((date, doy, extent_oracle, amount))
+        if not corrections:
+            return False
+
+        def invocation(
+            date: datetime.date, doy: int, extent_oracle: int, amount: int
+        ) -> Invocation:
+            """Simulate, pump once simulated, then send and confirm."""
+
+            def start_pump() -> Awaitable[None]:
+                # the correction is only pumped once the transaction is
+                # simulated, it is sent once the pump is done
+                jobs = []
+                if amount > DEAD_BAND:
+                    print(
+                        "There is more ice than usual, Seals will be happy! "
+                        "Minting token"
+                    )
+                elif amount < -DEAD_BAND:
+                    print("Ice is melting faster, poo Seals! Burning token")
+                if abs(amount) > DEAD_BAND:
+                    jobs.append(
+                        actuator_queue.submit(amount, "correction", throttle=False)
+                    )
+                return pumped(jobs, timer.clock())
+
+            def record_pending(tx) -> None:
+                # before it is sent, a crash would otherwise settle it twice
+                preconditions = tx.transaction.preconditions
+                bounds = None if preconditions is None else preconditions.time_bounds
+                store.record_pending(
+                    tx.hash_hex(),
+                    date,
+                    doy,
+                    extent_oracle,
+                    amount,
+                    tx.transaction.source.account_id,
+                    tx.transaction.sequence,
+                    0 if bounds is None else bounds.max_time,
+                )
+
+            async def pumped(jobs: list, pump_start: float) -> None:
+                for job in jobs:
+                    await asyncio.wrap_future(job)
+                if jobs:
+                    timer.add("pump", pump_start)
+                    # measured while the transaction is confirmed
+                    measurements.append(cycle_pool.submit(measure_after_pump))
+
+            # calling Soroban smart contract
             # fn correct_supply(
             #     env: &Env, issuer: Address, distributor: Address,
             #     doy: u32, sea_ice_extent: u32
@@ -177,26 +707,212 @@ while "SEAL management":
                 # sea_ice_extent
                 stellar_sdk.scval.to_int32(extent_oracle),
             ]
-            result = soroban_invoke(
-                secret_key=ISSUER_ADDR_SECRET if amount > 0 else DISTRIBUTION_ADDR_SECRET,
-                contract_id=CONTRACT_HASH,
-                function_name="correct_supply",
-                args=args,
+            return Invocation(
+                ISSUER_ADDR_SECRET if amount > 0 else DISTRIBUTION_ADDR_SECRET,
+                args,
+                send_after=start_pump,
+                on_send=record_pending,
             )
-        except SdkError as ex:
-            logging.error(ex)
-        else:
-            # mark as executed only if no error with Soroban
-            doy_last_executed = doy
-
-    seal_onchain = supply_onchain()
-
-    epd = screen.SealScreen()
-    epd.update_screen(
-        seal_onchain=seal_onchain,
-        seal_offchain=seal_offchain,
-        ice_extent=extent_oracle,
-        delta=delta/1000,
+
+        def measure_after_pump() -> int:
+            # the window must not contain samples from before the pump run
+            with timer.stage("measure again"):
+                return supply_offchain(since=time.monotonic())
+
+        measurements: list[concurrent.futures.Future] = []
+        # the days of a signer are settled in turn, minted days next to
+        # burned ones
+        with timer.stage("settle"):
+            results = soroban_invoke_batch(
+                CONTRACT_HASH,
+                "correct_supply",
+                [invocation(*correction) for correction in corrections],
+                simulations=simulations,
+                fees=fee_policy,
+            )
+
+        if measurements:
+            try:
+                seal_offchain = measurements[-1].result()
+            except Exception as ex:
+                logging.warning(f"Could not measure the new supply: {ex!r}")
+            else:
+                store.record_measurement("offchain", seal_offchain)
+                print(f"New supply: {seal_offchain}")
+
+        settled = record_settlements(store, corrections, results)
+
+        fee_stats = fee_policy.stats()
+        logging.info(
+            f"Inclusion fee {fee_stats.mean_fee:.0f} stroops on average, "
+            f"included in {fee_stats.mean_inclusion_time:.1f} s, "
+            f"{fee_stats.bumps} bumps over {fee_stats.transactions} transactions"
+        )
+
+        if settled:
+            with timer.stage("refresh"):
+                refresh_after_settlement()
+        logging.info(timer.report())
+        return settled
+
+    def refresh_after_settlement() -> None:
+        """Load the new balance while the screen wakes up, then draw it."""
+        onchain = cycle_pool.submit(balances.sync)
+        display = cycle_pool.submit(lambda: get_screen().wake())
+        try:
+            store.record_measurement("onchain", int(onchain.result()))
+        except Exception as ex:
+            # the stream catches up, the screen shows the last measurement
+            logging.warning(f"Could not load the on-chain supply: {ex!r}")
+        display.result()
+        refresh_screen()
+
+    def measure_offchain() -> None:
+        store.record_measurement("offchain", supply_offchain())
+
+    def measure_onchain() -> None:
+        # the log keeps whole token like the off-chain supply
+        store.record_measurement("onchain", int(supply_onchain()))
+
+    def refresh_screen() -> None:
+        reading = store.last_reading()
+        seal_offchain = store.last_measurement("offchain")
+        seal_onchain = store.last_measurement("onchain")
+        if reading is None or seal_offchain is None or seal_onchain is None:
+            return
+        # against the median of the day read, which lags today
+        delta = reading.extent - median_extent[reading.doy]
+
+        epd = get_screen()
+        epd.update_screen(
+            seal_onchain=seal_onchain.supply,
+            seal_offchain=seal_offchain.supply,
+            ice_extent=reading.extent,
+            delta=delta / 1000,
+        )
+        stats = epd.stats()
+        logging.info(
+            f"Screen refreshes: {stats.partial_refreshes} partial in "
+            f"{stats.partial_time:.1f} s, {stats.full_refreshes} full in "
+            f"{stats.full_time:.1f} s, {stats.skipped} skipped as unchanged"
+        )
+        for kind, busy in epd.epd.busy_stats().items():
+            logging.debug(
+                f"e-Paper busy on {kind}: {busy.mean:.2f} s on average, "
+                f"{busy.longest:.2f} s at most over {busy.count} waits"
+            )
+
+    # tasks due at the same time run in this order
+    tasks.add("oracle", settle_day, ORACLE_MAX_INTERVAL)
+    tasks.add("offchain", measure_offchain, OFFCHAIN_INTERVAL)
+    tasks.add("onchain", measure_onchain, ONCHAIN_INTERVAL)
+    tasks.add("screen", refresh_screen, SCREEN_INTERVAL)
+    tasks.run()
+
+
+def _get_soroban_server():
+    from soroban import get_soroban_server
+
+    return get_soroban_server()
+
+
+def profile_startup(
+    budget: Optional[float] = None, import_time: Optional[float] = None
+) -> int:
+    """Report import and initialisation time per module.
+
+    Imports are timed in order, so a dependency shared by several modules is
+    accounted to the first one importing it. This module is already
+    imported: its own top-level imports are timed by the ``profile_startup``
+    entry point, which passes `import_time`. Run it in a fresh process to
+    measure a cold start.
+
+    Parameters
+    ----------
+    budget : float, optional
+        Maximal total time in seconds.
+    import_time : float, optional
+        Time to import this module, in seconds.
+
+    Returns
+    -------
+    status : int
+        0 if all steps succeeded within the budget, 1 otherwise.
+    """
+    steps: list[tuple[str, Callable[[], object]]] = [
+        (f"import {module}", functools.partial(importlib.import_module, module))
+        for module in ("gpiozero", "stellar_sdk", "soroban", "screen.screen")
+    ]
+    steps += [
+        (f"init {device}", functools.partial(getattr, hw, device))
+        for device in (
+            "mint_button",
+            "burn_button",
+            "burn_led",
+            "mint_led",
+            "pump",
+            "d_sensor",
+            "level_sampler",
+        )
+    ]
+    steps += [
+        ("init horizon", get_balance_cache),
+        ("init soroban", _get_soroban_server),
+    ]
+
+    status = 0
+    total = 0.0
+    print(f"{'step':<24} {'time [ms]':>10}")
+    if import_time is not None:
+        total += import_time
+        print(f"{'import ' + __name__:<24} {import_time * 1e3:>10.1f}")
+    for name, step in steps:
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception as ex:
+            status = 1
+            print(f"{name:<24} {'failed':>10}  {ex!r}")
+            continue
+        elapsed = time.perf_counter() - start
+        total += elapsed
+        print(f"{name:<24} {elapsed * 1e3:>10.1f}")
+    print(f"{'total':<24} {total * 1e3:>10.1f}")
+
+    if budget is not None and total > budget:
+        print(f"Cold start above budget: {total:.3f} s > {budget:.3f} s")
+        status = 1
+    return status
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="SEAL supply controller.")
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="report import and initialisation time per module and exit",
+    )
+    parser.add_argument(
+        "--startup-budget",
+        type=float,
+        default=None,
+        help="with --profile-startup, fail if the cold start takes longer (s)",
     )
+    args = parser.parse_args(argv)
+
+    if args.profile_startup:
+        # in a fresh interpreter, to also time the imports of this module
+        import subprocess
+
+        entry_point = os.path.join(os.path.dirname(__file__), "profile_startup.py")
+        command = [sys.executable, entry_point]
+        if args.startup_budget is not None:
+            command += ["--budget", str(args.startup_budget)]
+        return subprocess.call(command)
+
+    run()
+    return 0
+
 
-    time.sleep(3600)
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,389 +1,562 @@
-import pandas as pd
-
-
-MEDIAN_EXTENT = [
-    13823,
-    13886,
-    13884,
-    13925,
-    14036,
-    14139,
-    14188,
-    14303,
-    14310,
-    14240,
-    14265,
-    14332,
-    14398,
-    14401,
-    14449,
-    14476,
-    14526,
-    14602,
-    14638,
-    14715,
-    14698,
-    14680,
-    14731,
-    14717,
-    14773,
-    14783,
-    14803,
-    14880,
-    14892,
-    14954,
-    14963,
-    15040,
-    15076,
-    15147,
-    15171,
-    15222,
-    15173,
-    15204,
-    15229,
-    15266,
-    15261,
-    15301,
-    15303,
-    15317,
-    15364,
-    15382,
-    15385,
-    15420,
-    15420,
-    15472,
-    15475,
-    15483,
-    15467,
-    15466,
-    15498,
-    15496,
-    15527,
-    15542,
-    15548,
-    15556,
-    15558,
-    15478,
-    15478,
-    15449,
-    15439,
-    15444,
-    15532,
-    15483,
-    15487,
-    15489,
-    15474,
-    15538,
-    15511,
-    15499,
-    15496,
-    15483,
-    15487,
-    15494,
-    15454,
-    15451,
-    15402,
-    15472,
-    15489,
-    15473,
-    15453,
-    15387,
-    15374,
-    15389,
-    15391,
-    15397,
-    15313,
-    15270,
-    15197,
-    15128,
-    15111,
-    15097,
-    15090,
-    15064,
-    15002,
-    14890,
-    14859,
-    14749,
-    14711,
-    14701,
-    14658,
-    14649,
-    14617,
-    14602,
-    14561,
-    14550,
-    14523,
-    14503,
-    14477,
-    14443,
-    14425,
-    14345,
-    14298,
-    14256,
-    14187,
-    14109,
-    14036,
-    13922,
-    13874,
-    13862,
-    13786,
-    13778,
-    13691,
-    13663,
-    13594,
-    13534,
-    13457,
-    13412,
-    13350,
-    13312,
-    13286,
-    13227,
-    13186,
-    13150,
-    13144,
-    13075,
-    13059,
-    13024,
-    12953,
-    12953,
-    12911,
-    12860,
-    12818,
-    12791,
-    12767,
-    12733,
-    12649,
-    12556,
-    12462,
-    12435,
-    12394,
-    12339,
-    12279,
-    12235,
-    12222,
-    12216,
-    12156,
-    12088,
-    12067,
-    11999,
-    11976,
-    11890,
-    11815,
-    11714,
-    11662,
-    11590,
-    11543,
-    11471,
-    11398,
-    11376,
-    11342,
-    11283,
-    11197,
-    11134,
-    11093,
-    11010,
-    10900,
-    10830,
-    10668,
-    10617,
-    10555,
-    10477,
-    10318,
-    10216,
-    10175,
-    10106,
-    10005,
-    9889,
-    9819,
-    9708,
-    9657,
-    9526,
-    9488,
-    9374,
-    9302,
-    9214,
-    9182,
-    9064,
-    9012,
-    8939,
-    8876,
-    8808,
-    8737,
-    8654,
-    8535,
-    8448,
-    8357,
-    8306,
-    8223,
-    8138,
-    8032,
-    8007,
-    8007,
-    7943,
-    7855,
-    7787,
-    7739,
-    7682,
-    7606,
-    7543,
-    7467,
-    7439,
-    7356,
-    7303,
-    7255,
-    7208,
-    7222,
-    7169,
-    7175,
-    7150,
-    7088,
-    7012,
-    6932,
-    6864,
-    6845,
-    6815,
-    6768,
-    6757,
-    6746,
-    6688,
-    6648,
-    6606,
-    6595,
-    6542,
-    6507,
-    6496,
-    6474,
-    6467,
-    6463,
-    6419,
-    6404,
-    6386,
-    6354,
-    6345,
-    6305,
-    6331,
-    6335,
-    6387,
-    6412,
-    6451,
-    6487,
-    6506,
-    6528,
-    6635,
-    6720,
-    6760,
-    6793,
-    6876,
-    6931,
-    7165,
-    7221,
-    7257,
-    7370,
-    7532,
-    7645,
-    7736,
-    7826,
-    7906,
-    8007,
-    8036,
-    8203,
-    8281,
-    8309,
-    8394,
-    8504,
-    8628,
-    8693,
-    8733,
-    8738,
-    8839,
-    8953,
-    9096,
-    9160,
-    9205,
-    9280,
-    9386,
-    9512,
-    9615,
-    9664,
-    9721,
-    9837,
-    9864,
-    9918,
-    9994,
-    10052,
-    10105,
-    10120,
-    10194,
-    10315,
-    10347,
-    10418,
-    10554,
-    10592,
-    10709,
-    10732,
-    10824,
-    10927,
-    10998,
-    11037,
-    11096,
-    11087,
-    11103,
-    11142,
-    11230,
-    11329,
-    11489,
-    11632,
-    11733,
-    11776,
-    11817,
-    11955,
-    12023,
-    12110,
-    12217,
-    12300,
-    12331,
-    12377,
-    12462,
-    12517,
-    12526,
-    12580,
-    12587,
-    12648,
-    12766,
-    12878,
-    12969,
-    12944,
-    13025,
-    13083,
-    13161,
-    13194,
-    13220,
-    13300,
-    13346,
-    13465,
-    13541,
-    13480,
-    13561,
-    13546,
-    13653,
-    13702,
-    13789,
+"""Sea Ice Index (SII) oracle.
+
+The daily Northern Hemisphere extent is published by NSIDC as a single CSV
+file which changes at most once a day. A local copy is kept on disk and
+revalidated with conditional requests (ETag/Last-Modified), only asking for
+the tail of the file when the server supports byte ranges.
+
+The source URL and the cache location can be overridden with the
+``SII_URL`` and ``SII_CACHE_DIR`` environment variables, e.g. to use
+a local stand-in::
+
+    python -m http.server -d ../exploration 8000
+    SII_URL=http://localhost:8000/N_seaice_extent_daily_v3.0.csv python ...
+
+Several sources can be queried in parallel by an `Oracle`, which answers as
+soon as a quorum of them agree. Mirrors are given as a comma separated list
+in ``SII_MIRROR_URLS``, copies of the file on disk in ``SII_LOCAL_PATHS``
+and the quorum with ``SII_QUORUM``.
+
+The last rows of the cached file are the oracle history used to settle the
+days missed while the controller was offline, see `sea_ice_extent_history`.
+"""
+import concurrent.futures
+import datetime
+import functools
+import hashlib
+import json
+import logging
+import math
+import os
+import pathlib
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Literal, NamedTuple, Optional, Protocol, Sequence
+
+
+logger = logging.getLogger(__name__)
+
+SII_URL = os.getenv(
+    "SII_URL",
+    "https://noaadata.apps.nsidc.org/NOAA/G02135/north/daily/data/N_seaice_extent_daily_v3.0.csv",
+)
+SII_CACHE_DIR = pathlib.Path(
+    os.getenv("SII_CACHE_DIR", pathlib.Path.home() / ".cache" / "seal_coin")
+)
+SII_MIRROR_URLS = [url for url in os.getenv("SII_MIRROR_URLS", "").split(",") if url]
+SII_LOCAL_PATHS = [
+    path for path in os.getenv("SII_LOCAL_PATHS", "").split(",") if path
 ]
+SII_QUORUM = int(os.getenv("SII_QUORUM", 1))
+# a data row is ~300 bytes with the list of source files, the tail holds
+# about two weeks of rows
+ROW_BYTES = 320
+TAIL_BYTES = 14 * ROW_BYTES
+
+
+class DailyExtentCache:
+    """On-disk cache of the NSIDC daily sea ice extent file.
+
+    Parameters
+    ----------
+    url : str
+        Location of the daily extent CSV file.
+    cache_dir : path-like
+        Directory holding the cached file and its metadata.
+    tail_bytes : int, optional
+        Size of the byte range requested from the end of the file. If the
+        server does not support ranges, the full file is sent instead.
+        Use 0 to always request the full file.
+    timeout : float
+        Timeout of the request in seconds.
+    engine : {"stream", "pandas"}
+        Parser used on the full file. ``stream`` only reads the last rows
+        while ``pandas`` loads the whole file in a DataFrame.
+
+    Attributes
+    ----------
+    hits, misses : int
+        Number of requests answered from the cache or by a new download.
+
+    Notes
+    -----
+    Calls are serialised: a fetch left running by an `Oracle` which stopped
+    waiting for it may still be writing the cached files.
+    """
+
+    def __init__(
+        self,
+        url: str = SII_URL,
+        cache_dir: "os.PathLike[str] | str" = SII_CACHE_DIR,
+        *,
+        tail_bytes: int = TAIL_BYTES,
+        timeout: float = 30,
+        engine: Literal["stream", "pandas"] = "stream",
+    ):
+        self.url = url
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.tail_bytes = tail_bytes
+        self.timeout = timeout
+        self.engine = engine
+
+        # mirrors serve files with the same name
+        url_hash = hashlib.sha1(url.encode()).hexdigest()[:8]
+        fname = url.rsplit("/", maxsplit=1)[-1] or "sii.csv"
+        self.data_path = self.cache_dir / f"{url_hash}_{fname}"
+        self.meta_path = self.data_path.with_suffix(".json")
+
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return self.url
+
+    def fetch(self) -> tuple[int, float]:
+        """Last day of the year and extent, revalidating the cached copy."""
+        with self._lock:
+            return self._fetch()
+
+    def _fetch(self) -> tuple[int, float]:
+        meta = self._load_meta()
+
+        headers = {}
+        if meta is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        try:
+            status, body, resp_headers = self._get(headers, tail=True)
+        except urllib.error.HTTPError as err:
+            if err.code == 304 and meta is not None:
+                self.hits += 1
+                logger.info("SII cache hit: %s", self.url)
+                return meta["doy"], meta["extent"]
+            if err.code != 416:  # range not satisfiable
+                raise
+            # unconditional, a 304 would not give the last row
+            status, body, resp_headers = self._get({}, tail=False)
+
+        self.misses += 1
+        logger.info("SII cache miss: %s (HTTP %s)", self.url, status)
+
+        last_row = None
+        if status == 206:
+            last_row = _parse_last_row(body.decode())
+            if last_row is None:
+                # tail too short to contain two complete rows
+                status, body, resp_headers = self._get({}, tail=False)
+
+        self._atomic_write(self.data_path, body)
+        if last_row is None:
+            last_row = read_last_row(self.data_path, engine=self.engine)
+
+        doy, extent = last_row
+        self._atomic_write(
+            self.meta_path,
+            json.dumps(
+                {
+                    "url": self.url,
+                    "etag": resp_headers.get("ETag"),
+                    "last_modified": resp_headers.get("Last-Modified"),
+                    "partial": status == 206,
+                    "doy": doy,
+                    "extent": extent,
+                }
+            ).encode(),
+        )
+        return doy, extent
+
+    def history(self, since: datetime.date) -> list[tuple[datetime.date, float]]:
+        """Rows of the cached file from `since`, oldest first.
+
+        The cache is not revalidated, call `fetch` first. If the cached copy
+        is only the tail of the file and does not go back to `since`, the
+        full file is downloaded.
+        """
+        with self._lock:
+            return self._history(since)
+
+    def _history(self, since: datetime.date) -> list[tuple[datetime.date, float]]:
+        rows = read_rows(self.data_path, since=since)
+        meta = self._load_meta()
+        if meta is not None and meta["partial"] and (not rows or rows[0][0] > since):
+            logger.info("SII cache too short for %s, fetching %s", since, self.url)
+            _, body, resp_headers = self._get({}, tail=False)
+            self._atomic_write(self.data_path, body)
+            meta.update(
+                etag=resp_headers.get("ETag"),
+                last_modified=resp_headers.get("Last-Modified"),
+                partial=False,
+            )
+            self._atomic_write(self.meta_path, json.dumps(meta).encode())
+            rows = read_rows(self.data_path, since=since)
+        return rows
+
+    def _get(self, headers: dict, tail: bool) -> tuple[int, bytes, dict]:
+        headers = dict(headers)
+        if tail and self.tail_bytes > 0:
+            headers["Range"] = f"bytes=-{self.tail_bytes}"
+        request = urllib.request.Request(self.url, headers=headers)
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return response.status, response.read(), dict(response.headers)
+
+    def _load_meta(self) -> Optional[dict]:
+        try:
+            meta = json.loads(self.meta_path.read_text())
+        except (OSError, ValueError):
+            return None
+        if meta.get("url") != self.url:
+            return None
+        return meta
+
+    def _atomic_write(self, path: pathlib.Path, data: bytes) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+
+def read_last_row(
+    path: "os.PathLike[str] | str",
+    *,
+    engine: Literal["stream", "pandas"] = "stream",
+    block_size: int = TAIL_BYTES,
+) -> tuple[int, float]:
+    """Day of the year and extent of the last valid row of the CSV file.
+
+    Parameters
+    ----------
+    path : path-like
+        Daily extent CSV file.
+    engine : {"stream", "pandas"}
+        ``stream`` reads the file backward by blocks of `block_size` bytes
+        and stops at the first valid row. ``pandas`` loads the whole file.
+    block_size : int
+        Size of the blocks read from the end of the file.
+
+    Returns
+    -------
+    doy, extent : tuple of int and float
+        Day of the year and sea ice extent in 10^6 km^2.
+    """
+    if engine == "pandas":
+        return _read_last_row_pandas(path)
+
+    with open(path, "rb") as f:
+        pos = f.seek(0, os.SEEK_END)
+        rest = b""
+        while pos > 0:
+            size = min(block_size, pos)
+            pos -= size
+            f.seek(pos)
+            lines = (f.read(size) + rest).split(b"\n")
+            # the first line can be incomplete unless at the start of the file
+            rest = lines.pop(0) if pos > 0 else b""
+            for line in reversed(lines):
+                row = _parse_row(line.decode(errors="replace"))
+                if row is not None:
+                    return row
+
+    raise ValueError(f"No valid data row in {path}")
+
+
+def read_rows(
+    path: "os.PathLike[str] | str",
+    *,
+    since: datetime.date,
+    block_size: int = TAIL_BYTES,
+) -> list[tuple[datetime.date, float]]:
+    """Date and extent of the valid rows of the CSV file from `since`.
+
+    The file is read backward by blocks of `block_size` bytes, like
+    `read_last_row`, until a row older than `since`.
+
+    Returns
+    -------
+    rows : list of tuple of datetime.date and float
+        Date and sea ice extent in 10^6 km^2, oldest first.
+    """
+    rows: list[tuple[datetime.date, float]] = []
+    with open(path, "rb") as f:
+        pos = f.seek(0, os.SEEK_END)
+        rest = b""
+        while pos > 0:
+            size = min(block_size, pos)
+            pos -= size
+            f.seek(pos)
+            lines = (f.read(size) + rest).split(b"\n")
+            rest = lines.pop(0) if pos > 0 else b""
+            for line in reversed(lines):
+                row = _parse_dated_row(line.decode(errors="replace"))
+                if row is None:
+                    continue
+                if row[0] < since:
+                    return rows[::-1]
+                rows.append(row)
+    return rows[::-1]
+
+
+def _parse_dated_row(line: str) -> Optional[tuple[datetime.date, float]]:
+    """Date and extent of a data row, None if not a valid row.
+
+    Blank lines, the header and units rows and rows with a missing extent
+    are not valid.
+    """
+    fields = line.split(",", maxsplit=4)
+    try:
+        year, month, day, extent = (field.strip() for field in fields[:4])
+        date = datetime.date(int(year), int(month), int(day))
+        extent = float(extent)
+    except ValueError:
+        return None
+    if not math.isfinite(extent) or extent <= 0:
+        return None
+    return date, extent
+
+
+def _parse_row(line: str) -> Optional[tuple[int, float]]:
+    """Day of the year and extent of a data row, None if not a valid row."""
+    row = _parse_dated_row(line)
+    if row is None:
+        return None
+    date, extent = row
+    return date.timetuple().tm_yday, extent
+
+
+def _parse_last_row(text: str, min_rows: int = 2) -> Optional[tuple[int, float]]:
+    """Last valid data row of a chunk of the CSV file.
+
+    The first line is skipped as the chunk might start in the middle of a row.
+    None if the chunk has less than `min_rows` complete rows, e.g. as rows
+    got longer than expected.
+    """
+    lines = text.splitlines()[1:]
+    rows = [row for row in map(_parse_row, lines) if row is not None]
+    if len(rows) < min_rows:
+        return None
+    return rows[-1]
+
+
+def _read_last_row_pandas(path: "os.PathLike[str] | str") -> tuple[int, float]:
+    import pandas as pd
+
+    data = pd.read_csv(path, header=0, skiprows=[1], skipinitialspace=True)
+    data = data[data["Extent"] > 0]
+    date = pd.to_datetime(data[["Year", "Month", "Day"]])
+    last_extent = data.iloc[-1]
+
+    return int(date.iloc[-1].dayofyear), float(last_extent["Extent"])
+
+
+class Source(Protocol):
+    """Source of the last day of the year and extent."""
+
+    name: str
+
+    def fetch(self) -> tuple[int, float]:
+        ...
+
+
+class LocalSource:
+    """Daily extent CSV file on disk, e.g. a copy kept by another process.
+
+    Parameters
+    ----------
+    path : path-like
+        Daily extent CSV file.
+    """
+
+    def __init__(self, path: "os.PathLike[str] | str"):
+        self.path = pathlib.Path(path)
+
+    @property
+    def name(self) -> str:
+        return os.fspath(self.path)
+
+    def fetch(self) -> tuple[int, float]:
+        return read_last_row(self.path)
+
+    def history(self, since: datetime.date) -> list[tuple[datetime.date, float]]:
+        return read_rows(self.path, since=since)
+
+
+class SourceResponse(NamedTuple):
+    """Answer of a source, `value` is None if it failed or timed out."""
+
+    name: str
+    elapsed: float  # s
+    value: Optional[tuple[int, float]]
+    error: Optional[BaseException]
+
+
+class OracleReading(NamedTuple):
+    doy: int
+    extent: float
+    #: responses received before the quorum was reached, fastest first
+    responses: list[SourceResponse]
+
+
+class QuorumError(RuntimeError):
+    """Sources did not agree on the extent."""
+
+    def __init__(self, message: str, responses: list[SourceResponse]):
+        super().__init__(message)
+        self.responses = responses
+
+
+class Oracle:
+    """Query several sources in parallel and wait for a quorum.
+
+    Parameters
+    ----------
+    sources : sequence of Source
+        Objects with a ``name`` and a ``fetch()`` method returning the day
+        of the year and the extent, e.g. `DailyExtentCache` or `LocalSource`.
+    quorum : int
+        Number of sources which must agree.
+    timeout : float
+        Time in seconds given to each source. A source with a ``timeout``
+        attribute gets its own.
+    tolerance : float
+        Extents within `tolerance` (10^6 km^2) agree, e.g. to use a copy of
+        the file which may lag a revision of the values.
+    """
+
+    def __init__(
+        self,
+        sources: Sequence[Source],
+        *,
+        quorum: int = 1,
+        timeout: float = 30,
+        tolerance: float = 0.0,
+    ):
+        if not 1 <= quorum <= len(sources):
+            raise ValueError(f"quorum must be in [1, {len(sources)}], got {quorum}")
+        self.sources = list(sources)
+        self.quorum = quorum
+        self.timeout = timeout
+        self.tolerance = tolerance
+
+    def query(self) -> OracleReading:
+        """Return as soon as `quorum` sources agree on the day and extent.
+
+        Raises
+        ------
+        QuorumError
+            If all sources answered, failed or timed out without a quorum.
+        """
+        start = time.perf_counter()
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=len(self.sources), thread_name_prefix="sii-oracle"
+        )
+        pending = {
+            executor.submit(source.fetch): (
+                source.name,
+                start + getattr(source, "timeout", self.timeout),
+            )
+            for source in self.sources
+        }
+        responses: list[SourceResponse] = []
+        # agreeing values, keyed by the first value of the group
+        votes: dict[tuple[int, float], list[SourceResponse]] = {}
+        try:
+            while pending:
+                next_deadline = min(deadline for _, deadline in pending.values())
+                done, _ = concurrent.futures.wait(
+                    pending,
+                    timeout=max(0.0, next_deadline - time.perf_counter()),
+                    return_when=concurrent.futures.FIRST_COMPLETED,
+                )
+                now = time.perf_counter()
+                for future in done:
+                    name, _ = pending.pop(future)
+                    try:
+                        value = future.result()
+                    except Exception as ex:
+                        response = SourceResponse(name, now - start, None, ex)
+                    else:
+                        response = SourceResponse(name, now - start, value, None)
+                    responses.append(response)
+                    logger.info(
+                        "SII source %s: %s in %.3f s",
+                        name,
+                        value if response.error is None else repr(response.error),
+                        response.elapsed,
+                    )
+                    if response.error is not None:
+                        continue
+
+                    group = self._vote(votes, response)
+                    if len(group) >= self.quorum:
+                        doy, extent = group[0].value
+                        return OracleReading(doy, extent, responses)
+
+                for future, (name, deadline) in list(pending.items()):
+                    if deadline <= now:
+                        del pending[future]
+                        error = TimeoutError(f"No answer after {now - start:.3f} s")
+                        responses.append(SourceResponse(name, now - start, None, error))
+                        logger.warning("SII source %s timed out", name)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        raise QuorumError(
+            f"No quorum of {self.quorum} among {len(self.sources)} sources",
+            responses,
+        )
+
+    def _vote(
+        self,
+        votes: dict[tuple[int, float], list[SourceResponse]],
+        response: SourceResponse,
+    ) -> list[SourceResponse]:
+        doy, extent = response.value
+        for (doy_, extent_), group in votes.items():
+            if doy == doy_ and abs(extent - extent_) <= self.tolerance:
+                group.append(response)
+                return group
+        votes[response.value] = [response]
+        return votes[response.value]
+
+
+cache = DailyExtentCache()
+
+
+@functools.lru_cache(maxsize=None)
+def get_oracle() -> Oracle:
+    """Oracle of `cache`, the mirrors and the local copies.
+
+    Built on first use, so that a wrong ``SII_QUORUM`` does not prevent
+    importing the module.
+    """
+    sources: list[Source] = [cache]
+    sources += [DailyExtentCache(url) for url in SII_MIRROR_URLS]
+    sources += [LocalSource(path) for path in SII_LOCAL_PATHS]
+    return Oracle(sources, quorum=SII_QUORUM)
 
 
 def daily_sea_ice_extent() -> tuple[int, float]:
     """Daily sea ice extent.
 
     Returns the last current day of the year and the value of the ice extent.
+    The file is only downloaded again if it changed since the last call,
+    see `cache` for the hits and misses. With mirrors or local copies, they
+    are queried in parallel by `get_oracle`.
     """
-    data = pd.read_csv(  # noqa
-        "https://noaadata.apps.nsidc.org/NOAA/G02135/north/daily/data/N_seaice_extent_daily_v3.0.csv",
-        header=0,
-        skiprows=[1],
-        parse_dates=[["Year", " Month", " Day"]],
-    )
-    data.columns = ["date", "extent", "missing", "source"]
-    data["date"] = pd.to_datetime(data["date"])
-    last_extent = data.iloc[-1]
+    reading = get_oracle().query()
+    return reading.doy, reading.extent
 
-    return last_extent["date"].dayofyear, last_extent["extent"]
+
+def sea_ice_extent_history(since: datetime.date) -> list[tuple[datetime.date, float]]:
+    """Daily sea ice extent from `since`, oldest first.
+
+    Rows of the file cached by the last `daily_sea_ice_extent`. Only the
+    primary source is read, with mirrors the quorum is on the last day.
+    """
+    return cache.history(since)
@@ -2,72 +2,959 @@
 
 Based on
 https://github.com/StellarCN/py-stellar-base/blob/main/examples/soroban_payment.py
+
+``stellar_sdk`` is only imported, and the RPC client only created, on the
+first call to keep the start of the controller fast. The RPC server can be
+overridden with the ``SOROBAN_RPC_URL`` environment variable, e.g. to use
+the stand-in of ``benchmarks/standin.py``.
+
+`soroban_invoke_async` runs on the SDK's async Soroban server so that the
+controller is not blocked while a transaction is confirmed. A transaction
+can only be found once the ledger including it closed: the confirmation is
+polled when the next ledger is expected to close, from the close time of
+the latest one, then with an exponential backoff until a deadline.
+`soroban_invoke` is its blocking wrapper.
+
+Sequence numbers of the signing accounts are tracked locally by
+`SequenceManager`: an account is loaded once, then each transaction takes
+the next sequence number without a ``getAccount`` round trip. The account
+is only loaded again after a transaction is rejected with ``txBAD_SEQ``,
+e.g. if it was also used from somewhere else.
+
+`soroban_invoke_batch_async` settles a backlog of invocations, e.g. the
+days missed while offline. The network only queues one transaction per
+source account, so the invocations of a signer take about one ledger
+each, only different signers overlap: a backlog of minted and burned days
+is confirmed in the time of the longest of the two.
+
+The inclusion fee is set by a `fees.FeePolicy`, by default a percentile of
+the recent fees which is bumped if a transaction is not included in time.
+
+With ``on_send``, each signed transaction can be recorded before it is
+sent, e.g. persisted, so that after a crash `transaction_outcome` tells
+whether it was applied before anything is sent again.
+
+With ``send_after``, the account is loaded and the transaction simulated
+right away, then a callback starts e.g. the pump run of the same
+correction and the transaction is sent once it is done. Nothing is
+actuated if the simulation fails. If the callback fails, nothing is sent
+and a `SendAfterError` tells it apart from a failure of the network.
 """
+import asyncio
+import collections
+import functools
+import logging
+import os
+import threading
 import time
+from typing import (
+    TYPE_CHECKING,
+    Awaitable,
+    Callable,
+    Literal,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Union,
+)
 
-from stellar_sdk import Keypair, Network, SorobanServer, TransactionBuilder
-from stellar_sdk import xdr as stellar_xdr
-from stellar_sdk.exceptions import SdkError
-from stellar_sdk.soroban_rpc import GetTransactionStatus, SendTransactionStatus
-from stellar_sdk.xdr import SCVal
+from fees import FeePolicy, PercentileFeePolicy
 
-rpc_server_url = "https://soroban-testnet.stellar.org:443"
-soroban_server = SorobanServer(rpc_server_url)
-network_passphrase = Network.TESTNET_NETWORK_PASSPHRASE
+if TYPE_CHECKING:
+    from stellar_sdk import (
+        Account,
+        Keypair,
+        SorobanServer,
+        SorobanServerAsync,
+        TransactionEnvelope,
+    )
+    from stellar_sdk.soroban_rpc import (
+        GetTransactionResponse,
+        SimulateTransactionResponse,
+    )
+    from stellar_sdk.xdr import SCVal, SorobanAuthorizedInvocation, TransactionMeta
 
 
-def soroban_invoke(
+logger = logging.getLogger(__name__)
+
+rpc_server_url = os.getenv(
+    "SOROBAN_RPC_URL", "https://soroban-testnet.stellar.org:443"
+)
+
+# target time between two ledgers
+LEDGER_CLOSE_TIME = 5.0  # s
+
+# outcome of a transaction sent earlier, see `transaction_outcome_async`
+Outcome = Literal["success", "failed", "expired", "pending", "unknown"]
+
+# rewrite_auth(function_name, args, invocation) of `SimulationCache`
+AuthRewrite = Callable[[str, "list[SCVal]", "SorobanAuthorizedInvocation"], None]
+
+
+class SendAfterError(Exception):
+    """``send_after`` failed, the transaction was not sent.
+
+    The exception of the callback is the cause.
+    """
+
+
+class InvokeTiming(NamedTuple):
+    """Seconds spent in each step of an invocation."""
+
+    #: load the account, build and simulate the transaction
+    simulate: float
+    send: float
+    #: wait for the transaction to be in a closed ledger
+    confirm: float
+    #: number of ``getTransaction`` calls
+    polls: int
+    #: wait for ``send_after`` once simulated
+    wait: float = 0.0
+
+    @property
+    def total(self) -> float:
+        return self.simulate + self.wait + self.send + self.confirm
+
+
+class InvokeResult(NamedTuple):
+    #: hash of the transaction, hex encoded
+    hash: str
+    #: metadata of a successful transaction returning void, None otherwise
+    transaction_meta: "Optional[TransactionMeta]"
+    timing: Optional[InvokeTiming] = None
+
+
+class Invocation(NamedTuple):
+    """An invocation of `soroban_invoke_batch_async`."""
+
+    #: secret key of the source account
+    secret_key: str
+    args: "list[SCVal]"
+    #: hooks of the invocation, see `soroban_invoke_async`
+    send_after: "Optional[Callable[[], Awaitable[object]]]" = None
+    on_send: "Optional[Callable[[TransactionEnvelope], None]]" = None
+
+
+class SequenceManager:
+    """Sequence numbers of the signing accounts, tracked locally.
+
+    Each account is independent and the manager can be shared between
+    threads and event loops.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # last sequence number used by each account
+        self._sequences: dict[str, int] = {}
+        self.loads = 0
+        self.hits = 0
+
+    async def acquire(self, server: "SorobanServerAsync", public_key: str) -> "Account":
+        """Source account of the next transaction of `public_key`.
+
+        Building a transaction from it uses the next sequence number, which
+        is then taken. Use `release` with the sequence number of the
+        account, before building, if the transaction is not sent.
+        """
+        from stellar_sdk import Account
+
+        with self._lock:
+            sequence = self._sequences.get(public_key)
+            if sequence is not None:
+                self._sequences[public_key] = sequence + 1
+                self.hits += 1
+                return Account(public_key, sequence)
+
+        account = await server.load_account(public_key)
+        with self._lock:
+            self.loads += 1
+            # another transaction may have loaded the account meanwhile
+            sequence = self._sequences.setdefault(public_key, account.sequence)
+            self._sequences[public_key] = sequence + 1
+        return Account(public_key, sequence)
+
+    def release(self, public_key: str, sequence: int) -> None:
+        """Give back the sequence number of a transaction which was not sent."""
+        with self._lock:
+            if self._sequences.get(public_key) == sequence + 1:
+                self._sequences[public_key] = sequence
+            else:
+                # a later sequence number was taken, it would leave a gap
+                self._sequences.pop(public_key, None)
+
+    def invalidate(self, public_key: str) -> None:
+        """Load the account again for its next transaction."""
+        with self._lock:
+            self._sequences.pop(public_key, None)
+
+
+account_sequences = SequenceManager()
+fee_policy = PercentileFeePolicy()
+
+
+class SimulationCache:
+    """Simulations of recent invocations, reused while arguments change.
+
+    Entries are keyed by contract, function, signer and shape of the
+    arguments: their types, and the value of addresses as they decide the
+    storage footprint. A cached simulation gives the footprint, resources
+    and fee, and its authorisation tree with the new arguments.
+
+    Parameters
+    ----------
+    ttl : float
+        Lifetime of an entry in seconds.
+    maxsize : int
+        Number of entries, the least recently used one is evicted.
+    rewrite_auth : callable, optional
+        ``rewrite_auth(function_name, args, invocation)`` updates in place
+        the sub-invocations of a cached authorisation which depend on the
+        arguments, e.g. an amount computed by the contract. The root
+        invocation already has the new arguments.
+    clock : callable
+        Monotonic clock.
+    """
+
+    def __init__(
+        self,
+        *,
+        ttl: float = 36 * 3600,
+        maxsize: int = 32,
+        rewrite_auth: Optional[AuthRewrite] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.rewrite_auth = rewrite_auth
+        self.clock = clock
+        self._lock = threading.Lock()
+        # key -> (expiry, simulation), least recently used first
+        self._entries: collections.OrderedDict = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(
+        contract_id: str, function_name: str, public_key: str, args: "list[SCVal]"
+    ) -> tuple:
+        from stellar_sdk import xdr as stellar_xdr
+
+        shape = tuple(
+            arg.to_xdr() if arg.type == stellar_xdr.SCValType.SCV_ADDRESS else arg.type
+            for arg in args
+        )
+        return contract_id, function_name, public_key, shape
+
+    def get(
+        self, key: tuple, args: "list[SCVal]"
+    ) -> "Optional[SimulateTransactionResponse]":
+        """Cached simulation with the authorisation of `args`, if still valid."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self.clock() > entry[0]:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            simulation = entry[1]
+        return self._with_args(simulation, key[1], args)
+
+    def put(self, key: tuple, simulation: "SimulateTransactionResponse") -> None:
+        """Cache a successful simulation, unless it cannot be reused."""
+        if not _is_reusable(simulation):
+            return
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl, simulation)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: tuple) -> None:
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def _with_args(
+        self,
+        simulation: "SimulateTransactionResponse",
+        function_name: str,
+        args: "list[SCVal]",
+    ) -> "SimulateTransactionResponse":
+        from stellar_sdk import xdr as stellar_xdr
+
+        result = simulation.results[0]  # type: ignore[index]
+        auth = []
+        for entry_xdr in result.auth or []:
+            entry = stellar_xdr.SorobanAuthorizationEntry.from_xdr(entry_xdr)
+            invocation = entry.root_invocation
+            contract_fn = invocation.function.contract_fn
+            if (
+                contract_fn is not None
+                and contract_fn.function_name.sc_symbol == function_name.encode()
+            ):
+                contract_fn.args = list(args)
+                if self.rewrite_auth is not None:
+                    self.rewrite_auth(function_name, args, invocation)
+            auth.append(entry.to_xdr())
+        results = [result.model_copy(update={"auth": auth})]
+        return simulation.model_copy(update={"results": results})
+
+
+def _is_reusable(simulation: "SimulateTransactionResponse") -> bool:
+    """Only authorisations of the source account are free of nonces."""
+    from stellar_sdk import xdr as stellar_xdr
+
+    if simulation.error or simulation.restore_preamble or not simulation.results:
+        return False
+    if len(simulation.results) != 1:
+        return False
+    source_account = (
+        stellar_xdr.SorobanCredentialsType.SOROBAN_CREDENTIALS_SOURCE_ACCOUNT
+    )
+    for entry_xdr in simulation.results[0].auth or []:
+        entry = stellar_xdr.SorobanAuthorizationEntry.from_xdr(entry_xdr)
+        if entry.credentials.type != source_account:
+            return False
+    return True
+
+
+@functools.lru_cache(maxsize=None)
+def get_soroban_server() -> "SorobanServer":
+    """Soroban RPC client, created on first use."""
+    from stellar_sdk import SorobanServer
+
+    return SorobanServer(rpc_server_url)
+
+
+async def wait_for_transaction(
+    server: "SorobanServerAsync",
+    tx_hash: str,
+    *,
+    deadline: float,
+    ledger_close_time: Optional[float] = None,
+    min_interval: float = 0.25,
+) -> "tuple[GetTransactionResponse, int]":
+    """Poll a sent transaction until it is in a closed ledger.
+
+    Parameters
+    ----------
+    server : SorobanServerAsync
+        Soroban RPC client.
+    tx_hash : str
+        Hash of the transaction, hex encoded.
+    deadline : float
+        `time.monotonic` time after which to give up.
+    ledger_close_time : float, optional
+        Expected time between two ledgers in seconds, by default
+        `LEDGER_CLOSE_TIME`.
+    min_interval : float
+        First backoff interval in seconds, doubled up to `ledger_close_time`.
+
+    Returns
+    -------
+    response : GetTransactionResponse
+        Final status of the transaction.
+    polls : int
+        Number of ``getTransaction`` calls.
+
+    Raises
+    ------
+    SdkError
+        If the transaction is not found before the deadline.
+    """
+    from stellar_sdk.exceptions import SdkError
+
+    response, polls = await _poll_transaction(
+        server,
+        tx_hash,
+        deadline=deadline,
+        ledger_close_time=ledger_close_time,
+        min_interval=min_interval,
+    )
+    if response is None:
+        raise SdkError("Timeout: could not validate transaction")
+    return response, polls
+
+
+async def _poll_transaction(
+    server: "SorobanServerAsync",
+    tx_hash: str,
+    *,
+    deadline: float,
+    ledger_close_time: Optional[float] = None,
+    min_interval: float = 0.25,
+) -> "tuple[Optional[GetTransactionResponse], int]":
+    """`wait_for_transaction` giving None if the transaction is not found."""
+    from stellar_sdk.soroban_rpc import GetTransactionStatus
+
+    if ledger_close_time is None:
+        ledger_close_time = LEDGER_CLOSE_TIME
+
+    def until_next_close(close_time: int) -> float:
+        # bounded, the clocks of the Pi and of the network may differ
+        delay = close_time + ledger_close_time - time.time()
+        return min(max(delay, min_interval), ledger_close_time + min_interval)
+
+    latest_ledger = await server.get_latest_ledger()
+    delay = until_next_close(latest_ledger.close_time)
+    interval = min_interval
+    polls = 0
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None, polls
+        await asyncio.sleep(min(delay, remaining))
+
+        response = await server.get_transaction(tx_hash)
+        polls += 1
+        if response.status != GetTransactionStatus.NOT_FOUND:
+            return response, polls
+        # not in the latest ledger, wait for the next one but back off if
+        # it is late
+        delay = max(until_next_close(response.latest_ledger_close_time), interval)
+        interval = min(2 * interval, ledger_close_time)
+
+
+async def soroban_invoke_async(
     secret_key: str,
     contract_id: str,
     function_name: str,
-    args: list[SCVal],
+    args: "list[SCVal]",
     *,
     preflight: bool = True,
-    timeout_count: int = 10,
-):
+    timeout: float = 30.0,
+    server: "Optional[SorobanServerAsync]" = None,
+    sequences: Optional[SequenceManager] = account_sequences,
+    simulations: "Optional[SimulationCache]" = None,
+    fees: FeePolicy = fee_policy,
+    send_after: "Optional[Callable[[], Awaitable[object]]]" = None,
+    on_send: "Optional[Callable[[TransactionEnvelope], None]]" = None,
+) -> InvokeResult:
+    """Invoke a contract function and wait for the transaction.
+
+    Parameters
+    ----------
+    secret_key : str
+        Secret key of the source account.
+    contract_id : str
+        Address of the contract.
+    function_name : str
+        Function to invoke.
+    args : list of SCVal
+        Arguments of the function.
+    preflight : bool
+        Simulate the transaction to set its footprint and fee.
+    timeout : float
+        Maximal time to confirm the transaction in seconds, from the first
+        time it is sent. With an inclusion timeout, it covers at least two
+        attempts, the first one and a bumped one.
+    server : SorobanServerAsync, optional
+        Soroban RPC client. By default, one is created for the call.
+    sequences : SequenceManager, optional
+        Local sequence numbers, by default shared by all calls. If None, the
+        account is loaded for each transaction.
+    simulations : SimulationCache, optional
+        Reuse the simulation of a previous call with arguments of the same
+        shape. A transaction prepared from the cache which is rejected or
+        fails is prepared again with a fresh simulation. By default, each
+        call is simulated.
+    fees : FeePolicy
+        Inclusion fee of the transaction. If it is not included within the
+        inclusion timeout of the policy, it expires and is sent again with
+        a bumped fee. By default, shared by all calls.
+
+        A transaction is only sent again once the previous attempt is known
+        not to be in a ledger and a ledger closed after its time bound, so
+        that the invocation never runs twice.
+    send_after : callable, optional
+        Called once the transaction is simulated, not if the simulation
+        fails. The awaitable it returns is awaited before the transaction
+        is sent. If it raises, the transaction is not sent and a
+        `SendAfterError` is raised from its exception.
+    on_send : callable, optional
+        Called with each signed transaction right before it is sent, e.g.
+        to persist its hash and sequence number. If it raises, the
+        transaction is not sent and the exception propagates.
+
+    Returns
+    -------
+    result : InvokeResult
+        With the time spent in each step.
+
+    Raises
+    ------
+    SdkError
+        If the transaction is not sent, fails or is not confirmed in time.
+        With an inclusion timeout, a transaction which was not confirmed
+        expired and cannot be included anymore.
+    SendAfterError
+        If `send_after` failed, the transaction was not sent.
+    """
+    from stellar_sdk import Keypair, Network, SorobanServerAsync, TransactionBuilder
+    from stellar_sdk.exceptions import SdkError
+    from stellar_sdk.soroban_rpc import GetTransactionStatus, SendTransactionStatus
+
+    if server is None:
+        async with SorobanServerAsync(rpc_server_url) as server:
+            return await soroban_invoke_async(
+                secret_key,
+                contract_id,
+                function_name,
+                args,
+                preflight=preflight,
+                timeout=timeout,
+                server=server,
+                sequences=sequences,
+                simulations=simulations,
+                fees=fees,
+                send_after=send_after,
+                on_send=on_send,
+            )
+
+    network_passphrase = Network.TESTNET_NETWORK_PASSPHRASE
+
     address_kp = Keypair.from_secret(secret_key)
-    address_source = soroban_server.load_account(address_kp.public_key)
-
-    tx = (
-        TransactionBuilder(address_source, network_passphrase, base_fee=200_000)
-        .add_time_bounds(0, 0)
-        .append_invoke_contract_function_op(
-            contract_id=contract_id,
-            function_name=function_name,
-            parameters=args,
+
+    simulation_key = None
+    if preflight and simulations is not None:
+        simulation_key = simulations.key(
+            contract_id, function_name, address_kp.public_key, args
         )
-        .build()
-    )
+    fee = await fees.fee(server)
+    # confirmation deadline, from the first time the transaction is sent
+    deadline = None
+    attempt_window = None
+    if fees.inclusion_timeout is not None:
+        # a ledger closing after the time bound cannot include it
+        attempt_window = fees.inclusion_timeout + 2 * LEDGER_CLOSE_TIME
+        timeout = max(timeout, 2 * attempt_window)
+    # a rejected sequence number and a cached simulation are only tried once,
+    # earlier attempts are known to have expired without being included
+    retry_sequence = True
+    waited = 0.0
+    while True:
+        start = time.perf_counter()
+        if sequences is None:
+            address_source = await server.load_account(address_kp.public_key)
+        else:
+            address_source = await sequences.acquire(server, address_kp.public_key)
+        # building the transaction increments the sequence of the account
+        sequence = address_source.sequence
+        cached = None
+        if simulation_key is not None:
+            cached = simulations.get(simulation_key, args)  # type: ignore[union-attr]
+
+        try:
+            builder = TransactionBuilder(
+                address_source, network_passphrase, base_fee=fee
+            )
+            if fees.inclusion_timeout is None:
+                builder.add_time_bounds(0, 0)
+            else:
+                # expires if not included, the fee can then be bumped
+                builder.add_time_bounds(0, int(time.time() + fees.inclusion_timeout))
+            tx = (
+                builder.append_invoke_contract_function_op(
+                    contract_id=contract_id,
+                    function_name=function_name,
+                    parameters=args,
+                )
+                .build()
+            )
 
-    if preflight:
-        tx = soroban_server.prepare_transaction(tx)
+            if cached is not None:
+                tx = await server.prepare_transaction(tx, cached)
+            elif simulation_key is not None:
+                simulation = await server.simulate_transaction(tx)
+                tx = await server.prepare_transaction(tx, simulation)
+                simulations.put(simulation_key, simulation)  # type: ignore[union-attr]
+            elif preflight:
+                tx = await server.prepare_transaction(tx)
+            simulated = time.perf_counter()
+            if send_after is not None:
+                try:
+                    await send_after()
+                except Exception as ex:
+                    raise SendAfterError(f"send_after failed: {ex!r}") from ex
+                send_after = None
+                waited = time.perf_counter() - simulated
+                if fees.inclusion_timeout is not None:
+                    # the time bound runs from the actual send
+                    preconditions = tx.transaction.preconditions
+                    bounds = preconditions.time_bounds  # type: ignore[union-attr]
+                    bounds.max_time = int(time.time() + fees.inclusion_timeout)
+            ready = time.perf_counter()
 
-    tx.sign(address_kp)
-    send_transaction_data = soroban_server.send_transaction(tx)
+            preconditions = tx.transaction.preconditions
+            bounds = None if preconditions is None else preconditions.time_bounds
+            max_time = 0 if bounds is None else bounds.max_time
+            tx.sign(address_kp)
+            if on_send is not None:
+                on_send(tx)
+        except BaseException:
+            if sequences is not None:
+                sequences.release(address_kp.public_key, sequence)
+            raise
+        try:
+            send_transaction_data = await server.send_transaction(tx)
+        except BaseException:
+            # the RPC may have accepted it before e.g. a timeout, its
+            # sequence number may be spent
+            if sequences is not None:
+                sequences.invalidate(address_kp.public_key)
+            raise
+        sent = time.perf_counter()
 
-    if send_transaction_data.status != SendTransactionStatus.PENDING:
-        raise SdkError("Failed to send transaction")
+        if send_transaction_data.status not in (
+            SendTransactionStatus.PENDING,
+            # already in the queue of the network
+            SendTransactionStatus.DUPLICATE,
+        ):
+            bad_sequence = _is_bad_sequence(send_transaction_data.error_result_xdr)
+            if sequences is not None:
+                if bad_sequence:
+                    sequences.invalidate(address_kp.public_key)
+                else:
+                    # rejected before reaching a ledger, the number is still free
+                    sequences.release(address_kp.public_key, sequence)
+            if bad_sequence and sequences is not None and retry_sequence:
+                retry_sequence = False
+                continue
+            if cached is not None:
+                simulations.invalidate(simulation_key)  # type: ignore[union-attr]
+                continue
+            raise SdkError("Failed to send transaction")
 
-    i = 0
-    while i < timeout_count:
-        get_transaction_data = soroban_server.get_transaction(
-            send_transaction_data.hash
+        if deadline is None:
+            deadline = time.monotonic() + timeout
+        attempt_deadline = deadline
+        if attempt_window is not None and max_time:
+            attempt_deadline = time.monotonic() + attempt_window
+        get_transaction_data, polls = await _poll_transaction(
+            server, send_transaction_data.hash, deadline=attempt_deadline
         )
-        if get_transaction_data.status != GetTransactionStatus.NOT_FOUND:
+        if get_transaction_data is None and max_time:
+            # not sent again before the attempt is known to have expired
+            get_transaction_data = await _wait_expired(
+                server,
+                send_transaction_data.hash,
+                max_time,
+                deadline=time.monotonic() + attempt_window,  # type: ignore[operator]
+            )
+        fees.record(
+            fee, time.perf_counter() - sent, included=get_transaction_data is not None
+        )
+        if get_transaction_data is None:
+            if time.monotonic() >= deadline:
+                raise SdkError("Timeout: transaction not included before expiring")
+            # expired, its sequence number was not used
+            if sequences is not None:
+                sequences.release(address_kp.public_key, sequence)
+            fee = fees.bump(fee)
+            logger.info("Transaction not included in time, fee bumped to %d", fee)
+            continue
+        if (
+            get_transaction_data.status == GetTransactionStatus.FAILED
+            and cached is not None
+        ):
+            # the cached footprint, resources or authorisation may be stale
+            simulations.invalidate(simulation_key)  # type: ignore[union-attr]
+            continue
+        break
+
+    timing = InvokeTiming(
+        simulate=simulated - start,
+        send=sent - ready,
+        confirm=time.perf_counter() - sent,
+        polls=polls,
+        wait=waited,
+    )
+
+    return _invoke_result(send_transaction_data.hash, get_transaction_data, timing)
+
+
+async def _wait_expired(
+    server: "SorobanServerAsync",
+    tx_hash: str,
+    max_time: int,
+    *,
+    deadline: float,
+) -> "Optional[GetTransactionResponse]":
+    """Wait for a ledger closing after `max_time`, then look the transaction up.
+
+    Returns None if the transaction is not found: it expired and can never
+    be included. Otherwise, returns its final status.
+
+    Raises
+    ------
+    SdkError
+        If no ledger closed after `max_time` before `deadline`, the
+        transaction may still be included.
+    """
+    from stellar_sdk.exceptions import SdkError
+    from stellar_sdk.soroban_rpc import GetTransactionStatus
+
+    while True:
+        latest_ledger = await server.get_latest_ledger()
+        if latest_ledger.close_time > max_time:
             break
-        time.sleep(3)
-        i += 1
-    else:
-        raise SdkError("Timeout: could not validate transaction")
+        if time.monotonic() >= deadline:
+            raise SdkError(
+                f"Timeout: transaction {tx_hash} may still be included, "
+                f"no ledger closed after its time bound"
+            )
+        await asyncio.sleep(LEDGER_CLOSE_TIME / 2)
+    response = await server.get_transaction(tx_hash)
+    if response.status == GetTransactionStatus.NOT_FOUND:
+        return None
+    return response
+
+
+async def transaction_outcome_async(
+    tx_hash: str,
+    public_key: str,
+    sequence: int,
+    max_time: int,
+    sent_at: float,
+    *,
+    server: "Optional[SorobanServerAsync]" = None,
+) -> Outcome:
+    """Whether a transaction sent earlier was applied, e.g. before a crash.
+
+    Parameters
+    ----------
+    tx_hash : str
+        Hash of the transaction, hex encoded.
+    public_key : str
+        Source account of the transaction.
+    sequence : int
+        Sequence number of the transaction.
+    max_time : int
+        Upper time bound of the transaction, 0 if none.
+    sent_at : float
+        Wall-clock time it was sent.
+    server : SorobanServerAsync, optional
+        Soroban RPC client. By default, one is created for the call.
+
+    Returns
+    -------
+    outcome : {"success", "failed", "expired", "pending", "unknown"}
+        ``"success"`` if it was applied, ``"failed"`` if it is in a ledger
+        but failed, ``"expired"`` if it can never be included, ``"pending"``
+        if it may still be. ``"unknown"`` if it is older than the history
+        of the RPC server and its sequence number was used since.
+    """
+    from stellar_sdk import SorobanServerAsync
+    from stellar_sdk.soroban_rpc import GetTransactionStatus
+
+    if server is None:
+        async with SorobanServerAsync(rpc_server_url) as server:
+            return await transaction_outcome_async(
+                tx_hash, public_key, sequence, max_time, sent_at, server=server
+            )
+
+    response = await server.get_transaction(tx_hash)
+    if response.status == GetTransactionStatus.SUCCESS:
+        return "success"
+    if response.status == GetTransactionStatus.FAILED:
+        return "failed"
+    if not max_time or response.latest_ledger_close_time <= max_time:
+        return "pending"
+    oldest = response.oldest_ledger_close_time
+    if oldest is not None and oldest <= sent_at:
+        # all the ledgers which could include it are in the history
+        return "expired"
+    account = await server.load_account(public_key)
+    if account.sequence < sequence:
+        return "expired"
+    return "unknown"
+
+
+def transaction_outcome(
+    tx_hash: str, public_key: str, sequence: int, max_time: int, sent_at: float
+) -> Outcome:
+    """Blocking `transaction_outcome_async`."""
+    return asyncio.run(
+        transaction_outcome_async(tx_hash, public_key, sequence, max_time, sent_at)
+    )
+
 
-    if get_transaction_data.status == GetTransactionStatus.SUCCESS:
+def _invoke_result(
+    tx_hash: str, response: "GetTransactionResponse", timing: InvokeTiming
+) -> InvokeResult:
+    from stellar_sdk import xdr as stellar_xdr
+    from stellar_sdk.exceptions import SdkError
+    from stellar_sdk.soroban_rpc import GetTransactionStatus
+
+    if response.status == GetTransactionStatus.SUCCESS:
         transaction_meta = stellar_xdr.TransactionMeta.from_xdr(
-            get_transaction_data.result_meta_xdr
+            response.result_meta_xdr
         )
         if (
             transaction_meta.v3.soroban_meta.return_value.type
             == stellar_xdr.SCValType.SCV_VOID
         ):  # type: ignore[union-attr]
-            return transaction_meta
+            return InvokeResult(tx_hash, transaction_meta, timing)
+        return InvokeResult(tx_hash, None, timing)
     else:
-        raise SdkError(f"Transaction failed: {get_transaction_data.result_xdr}")
+        raise SdkError(f"Transaction failed: {response.result_xdr}")
+
+
+def _is_bad_sequence(error_result_xdr: Optional[str]) -> bool:
+    from stellar_sdk import xdr as stellar_xdr
+
+    if error_result_xdr is None:
+        return False
+    result = stellar_xdr.TransactionResult.from_xdr(error_result_xdr)
+    return result.result.code == stellar_xdr.TransactionResultCode.txBAD_SEQ
+
+
+async def soroban_invoke_batch_async(
+    contract_id: str,
+    function_name: str,
+    invocations: "Sequence[Union[Invocation, tuple[str, list[SCVal]]]]",
+    *,
+    timeout: float = 30.0,
+    server: "Optional[SorobanServerAsync]" = None,
+    sequences: SequenceManager = account_sequences,
+    simulations: "Optional[SimulationCache]" = None,
+    fees: FeePolicy = fee_policy,
+) -> "list[Union[InvokeResult, Exception]]":
+    """Invoke a contract function several times, one signer after the other.
+
+    The network only queues one transaction per source account and a
+    Soroban transaction has a single operation, so the invocations of a
+    signer are sent one after the other, each one once the previous one
+    is in a ledger: N invocations of a signer take about N ledgers. Only
+    the invocations of different signers run concurrently.
+
+    Parameters
+    ----------
+    contract_id : str
+        Address of the contract.
+    function_name : str
+        Function to invoke.
+    invocations : sequence of Invocation
+        Secret key of the source account, arguments and hooks of each
+        invocation. A tuple of the secret key and the arguments has no hooks.
+    timeout : float
+        Maximal time to confirm each transaction in seconds.
+    server : SorobanServerAsync, optional
+        Soroban RPC client. By default, one is created for the call.
+    sequences : SequenceManager
+        Local sequence numbers, by default shared by all calls.
+    simulations : SimulationCache, optional
+        Reuse the simulations of previous calls, see `soroban_invoke_async`.
+    fees : FeePolicy
+        Inclusion fee of the transactions, by default shared by all calls.
+
+    Returns
+    -------
+    results : list of InvokeResult or Exception
+        Result of each invocation, in order. A failed invocation gives its
+        exception and does not stop the others.
+    """
+    from stellar_sdk import Keypair, SorobanServerAsync
+
+    if server is None:
+        async with SorobanServerAsync(rpc_server_url) as server:
+            return await soroban_invoke_batch_async(
+                contract_id,
+                function_name,
+                invocations,
+                timeout=timeout,
+                server=server,
+                sequences=sequences,
+                simulations=simulations,
+                fees=fees,
+            )
+
+    batch = [Invocation(*invocation) for invocation in invocations]
+    results: list = [None] * len(batch)
+    by_signer: dict[str, list[int]] = {}
+    for index, invocation in enumerate(batch):
+        public_key = Keypair.from_secret(invocation.secret_key).public_key
+        by_signer.setdefault(public_key, []).append(index)
+
+    async def invoke_all(indices: list[int]) -> None:
+        for index in indices:
+            invocation = batch[index]
+            try:
+                results[index] = await soroban_invoke_async(
+                    invocation.secret_key,
+                    contract_id,
+                    function_name,
+                    invocation.args,
+                    timeout=timeout,
+                    server=server,
+                    sequences=sequences,
+                    simulations=simulations,
+                    fees=fees,
+                    send_after=invocation.send_after,
+                    on_send=invocation.on_send,
+                )
+            except Exception as ex:
+                results[index] = ex
+
+    await asyncio.gather(*(invoke_all(indices) for indices in by_signer.values()))
+    return results
+
+
+def soroban_invoke(
+    secret_key: str,
+    contract_id: str,
+    function_name: str,
+    args: "list[SCVal]",
+    *,
+    preflight: bool = True,
+    timeout_count: int = 10,
+    simulations: "Optional[SimulationCache]" = None,
+    fees: FeePolicy = fee_policy,
+    send_after: "Optional[Callable[[], Awaitable[object]]]" = None,
+    on_send: "Optional[Callable[[TransactionEnvelope], None]]" = None,
+) -> InvokeResult:
+    """Blocking `soroban_invoke_async`.
+
+    The confirmation deadline is ``3 * timeout_count`` seconds, as with the
+    former fixed 3 s polling, and at least two attempts with an inclusion
+    timeout. The awaitable of `send_after` is awaited in the event loop of
+    the call, e.g. a coroutine.
+    """
+    return asyncio.run(
+        soroban_invoke_async(
+            secret_key,
+            contract_id,
+            function_name,
+            args,
+            preflight=preflight,
+            timeout=3 * timeout_count,
+            simulations=simulations,
+            fees=fees,
+            send_after=send_after,
+            on_send=on_send,
+        )
+    )
+
+
+def soroban_invoke_batch(
+    contract_id: str,
+    function_name: str,
+    invocations: "Sequence[Union[Invocation, tuple[str, list[SCVal]]]]",
+    *,
+    timeout_count: int = 10,
+    simulations: "Optional[SimulationCache]" = None,
+    fees: FeePolicy = fee_policy,
+) -> "list[Union[InvokeResult, Exception]]":
+    """Blocking `soroban_invoke_batch_async`, see `soroban_invoke`."""
+    return asyncio.run(
+        soroban_invoke_batch_async(
+            contract_id,
+            function_name,
+            invocations,
+            timeout=3 * timeout_count,
+            simulations=simulations,
+            fees=fees,
+        )
+    )
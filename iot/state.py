@@ -0,0 +1,363 @@
+"""Persistent state of the controller.
+
+A SQLite database holds the daily oracle readings, the supply measurements,
+the pump runs with the flow rate estimate and the days settled on-chain
+with their transaction hash. After a restart
+the controller knows which days are already settled and does not call
+``correct_supply`` twice for the same day.
+
+Each transaction is also recorded as pending before it is sent, with its
+hash and sequence number, until the day is settled. A transaction sent
+right before a crash or a timeout may still be applied: the pending ones
+are checked before the day is settled again.
+
+Each write is a transaction and the database uses a write-ahead log with
+full synchronisation, so a crash or power loss mid-write leaves the previous
+state intact. The location can be overridden with ``SEAL_STATE_PATH``.
+"""
+import datetime
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+from typing import NamedTuple, Optional
+
+
+STATE_PATH = pathlib.Path(
+    os.getenv(
+        "SEAL_STATE_PATH",
+        pathlib.Path.home() / ".local" / "share" / "seal_coin" / "state.sqlite3",
+    )
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reading (
+    date TEXT PRIMARY KEY,  -- ISO date of the oracle value
+    doy INTEGER NOT NULL,
+    extent INTEGER NOT NULL,  -- 10^3 km^2
+    fetched_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reading_doy ON reading (doy);
+
+CREATE TABLE IF NOT EXISTS measurement (
+    timestamp REAL NOT NULL,
+    kind TEXT NOT NULL,  -- offchain or onchain
+    supply INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS measurement_kind ON measurement (kind, timestamp);
+
+CREATE TABLE IF NOT EXISTS pump_run (
+    timestamp REAL NOT NULL,
+    operation TEXT NOT NULL,  -- mint or burn
+    amount INTEGER NOT NULL,  -- token requested
+    moved INTEGER NOT NULL,  -- token measured with the level
+    duration REAL NOT NULL,  -- s
+    flow_rate REAL NOT NULL,  -- l/s, estimate after the run
+    coast REAL NOT NULL  -- s of flow after a stop, estimate after the run
+);
+CREATE INDEX IF NOT EXISTS pump_run_operation ON pump_run (operation, timestamp);
+
+CREATE TABLE IF NOT EXISTS execution (
+    date TEXT PRIMARY KEY,  -- ISO date of the settled oracle value
+    doy INTEGER NOT NULL,
+    extent INTEGER NOT NULL,  -- 10^3 km^2
+    amount INTEGER NOT NULL,  -- token minted (positive) or burned (negative)
+    tx_hash TEXT,
+    executed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS execution_doy ON execution (doy);
+
+CREATE TABLE IF NOT EXISTS pending_execution (
+    tx_hash TEXT PRIMARY KEY,
+    date TEXT NOT NULL,  -- ISO date of the oracle value being settled
+    doy INTEGER NOT NULL,
+    extent INTEGER NOT NULL,  -- 10^3 km^2
+    amount INTEGER NOT NULL,  -- token minted (positive) or burned (negative)
+    account TEXT NOT NULL,  -- source account of the transaction
+    sequence INTEGER NOT NULL,
+    max_time INTEGER NOT NULL,  -- upper time bound, 0 if none
+    sent_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pending_execution_date ON pending_execution (date);
+"""
+
+
+class Reading(NamedTuple):
+    date: datetime.date
+    doy: int
+    extent: int
+    fetched_at: float
+
+
+class Measurement(NamedTuple):
+    timestamp: float
+    kind: str
+    supply: int
+
+
+class PumpRecord(NamedTuple):
+    timestamp: float
+    operation: str
+    amount: int
+    moved: int
+    duration: float
+    flow_rate: float
+    coast: float
+
+
+class Execution(NamedTuple):
+    date: datetime.date
+    doy: int
+    extent: int
+    amount: int
+    tx_hash: Optional[str]
+    executed_at: float
+
+
+class PendingExecution(NamedTuple):
+    tx_hash: str
+    date: datetime.date
+    doy: int
+    extent: int
+    amount: int
+    account: str
+    sequence: int
+    max_time: int
+    sent_at: float
+
+
+def oracle_date(today: datetime.date, doy: int) -> datetime.date:
+    """Date of an oracle value given its day of the year.
+
+    The oracle lags behind, a day of the year after today's is from the
+    previous year.
+    """
+    year = today.year if doy <= today.timetuple().tm_yday else today.year - 1
+    return datetime.date(year, 1, 1) + datetime.timedelta(days=doy - 1)
+
+
+class StateStore:
+    """SQLite store of readings, measurements and settled days.
+
+    Parameters
+    ----------
+    path : path-like
+        Database file, created if needed. Use ``":memory:"`` for a
+        transient store.
+    """
+
+    def __init__(self, path: "os.PathLike[str] | str" = STATE_PATH):
+        if path != ":memory:":
+            pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            os.fspath(path), isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        with self._lock:
+            self._conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self) -> "StateStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # Oracle readings
+
+    def record_reading(self, date: datetime.date, doy: int, extent: int) -> None:
+        """Store the oracle value of a day, replacing a previous one."""
+        self._write(
+            "INSERT OR REPLACE INTO reading VALUES (?, ?, ?, ?)",
+            (date.isoformat(), doy, extent, time.time()),
+        )
+
+    def reading(self, date: datetime.date) -> Optional[Reading]:
+        row = self._read_one(
+            "SELECT * FROM reading WHERE date = ?", (date.isoformat(),)
+        )
+        return None if row is None else _reading(row)
+
+    def readings_by_doy(self, doy: int) -> list[Reading]:
+        """Oracle values of a day of the year over all years."""
+        rows = self._read("SELECT * FROM reading WHERE doy = ? ORDER BY date", (doy,))
+        return [_reading(row) for row in rows]
+
+    def last_reading(self) -> Optional[Reading]:
+        row = self._read_one("SELECT * FROM reading ORDER BY date DESC LIMIT 1")
+        return None if row is None else _reading(row)
+
+    # Supply measurements
+
+    def record_measurement(self, kind: str, supply: int) -> None:
+        """Store an off-chain or on-chain supply measurement."""
+        self._write(
+            "INSERT INTO measurement VALUES (?, ?, ?)", (time.time(), kind, supply)
+        )
+
+    def last_measurement(self, kind: str) -> Optional[Measurement]:
+        row = self._read_one(
+            "SELECT * FROM measurement WHERE kind = ? ORDER BY timestamp DESC LIMIT 1",
+            (kind,),
+        )
+        return None if row is None else Measurement(*row)
+
+    # Pump runs
+
+    def record_pump_run(
+        self,
+        operation: str,
+        amount: int,
+        moved: int,
+        duration: float,
+        flow_rate: float,
+        coast: float,
+    ) -> None:
+        """Store a closed-loop pump run and the pump estimates after it."""
+        self._write(
+            "INSERT INTO pump_run VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (time.time(), operation, amount, moved, duration, flow_rate, coast),
+        )
+
+    def last_pump_run(self, operation: str) -> Optional[PumpRecord]:
+        row = self._read_one(
+            "SELECT * FROM pump_run WHERE operation = ? "
+            "ORDER BY timestamp DESC LIMIT 1",
+            (operation,),
+        )
+        return None if row is None else PumpRecord(*row)
+
+    # Settled days
+
+    def record_execution(
+        self,
+        date: datetime.date,
+        doy: int,
+        extent: int,
+        amount: int,
+        tx_hash: Optional[str],
+    ) -> None:
+        """Mark a day as settled on-chain, its pending transactions are dropped.
+
+        Raises
+        ------
+        sqlite3.IntegrityError
+            If the day is already settled.
+        """
+        self._write_all(
+            [
+                (
+                    "INSERT INTO execution VALUES (?, ?, ?, ?, ?, ?)",
+                    (date.isoformat(), doy, extent, amount, tx_hash, time.time()),
+                ),
+                (
+                    "DELETE FROM pending_execution WHERE date = ?",
+                    (date.isoformat(),),
+                ),
+            ]
+        )
+
+    def execution(self, date: datetime.date) -> Optional[Execution]:
+        row = self._read_one(
+            "SELECT * FROM execution WHERE date = ?", (date.isoformat(),)
+        )
+        return None if row is None else _execution(row)
+
+    def is_executed(self, date: datetime.date) -> bool:
+        return self.execution(date) is not None
+
+    def first_execution(self) -> Optional[Execution]:
+        row = self._read_one("SELECT * FROM execution ORDER BY date LIMIT 1")
+        return None if row is None else _execution(row)
+
+    def last_execution(self) -> Optional[Execution]:
+        row = self._read_one("SELECT * FROM execution ORDER BY date DESC LIMIT 1")
+        return None if row is None else _execution(row)
+
+    def record_pending(
+        self,
+        tx_hash: str,
+        date: datetime.date,
+        doy: int,
+        extent: int,
+        amount: int,
+        account: str,
+        sequence: int,
+        max_time: int,
+    ) -> None:
+        """Store a transaction settling a day, before it is sent."""
+        self._write(
+            "INSERT OR REPLACE INTO pending_execution "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                tx_hash,
+                date.isoformat(),
+                doy,
+                extent,
+                amount,
+                account,
+                sequence,
+                max_time,
+                time.time(),
+            ),
+        )
+
+    def pending_executions(self, date: datetime.date) -> list[PendingExecution]:
+        """Transactions sent for a day which is not settled, oldest first."""
+        rows = self._read(
+            "SELECT * FROM pending_execution WHERE date = ? ORDER BY sent_at",
+            (date.isoformat(),),
+        )
+        return [_pending_execution(row) for row in rows]
+
+    def discard_pending(self, date: datetime.date) -> None:
+        """Drop the pending transactions of a day, none was applied."""
+        self._write(
+            "DELETE FROM pending_execution WHERE date = ?", (date.isoformat(),)
+        )
+
+    # Private API
+
+    def _write(self, sql: str, parameters: tuple) -> None:
+        self._write_all([(sql, parameters)])
+
+    def _write_all(self, statements: "list[tuple[str, tuple]]") -> None:
+        """Run the statements in a single transaction."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, parameters in statements:
+                    self._conn.execute(sql, parameters)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _read(self, sql: str, parameters: tuple = ()) -> list[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, parameters).fetchall()
+
+    def _read_one(self, sql: str, parameters: tuple = ()) -> Optional[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, parameters).fetchone()
+
+
+def _reading(row: tuple) -> Reading:
+    date, *values = row
+    return Reading(datetime.date.fromisoformat(date), *values)
+
+
+def _execution(row: tuple) -> Execution:
+    date, *values = row
+    return Execution(datetime.date.fromisoformat(date), *values)
+
+
+def _pending_execution(row: tuple) -> PendingExecution:
+    tx_hash, date, *values = row
+    return PendingExecution(tx_hash, datetime.date.fromisoformat(date), *values)
@@ -0,0 +1,26 @@
+import pytest
+from stellar_sdk import StrKey, scval
+
+import soroban
+from benchmarks.standin import serve_soroban_rpc
+
+CONTRACT_ID = StrKey.encode_contract(bytes(32))
+LEDGER_CLOSE_TIME = 0.3
+
+
+@pytest.fixture
+def rpc(monkeypatch):
+    """Soroban RPC stand-in with fast ledgers, used by `soroban`."""
+    with serve_soroban_rpc(ledger_close_time=LEDGER_CLOSE_TIME, seed=0) as rpc:
+        monkeypatch.setattr(soroban, "rpc_server_url", rpc.url)
+        monkeypatch.setattr(soroban, "LEDGER_CLOSE_TIME", LEDGER_CLOSE_TIME)
+        yield rpc
+
+
+def correct_supply_args(issuer, distributor, doy):
+    return [
+        scval.to_address(issuer.public_key),
+        scval.to_address(distributor.public_key),
+        scval.to_int32(doy),
+        scval.to_int32(13_976),
+    ]
@@ -0,0 +1,133 @@
+import decimal
+import time
+
+import pytest
+
+import balance
+from benchmarks.standin import serve_horizon
+
+ACCOUNT = "GDISTRIBUTION"
+ISSUER = "GISSUER"
+
+
+@pytest.fixture
+def horizon():
+    with serve_horizon() as horizon:
+        horizon.pay(ACCOUNT, "SEAL", ISSUER, decimal.Decimal("1000"))
+        yield horizon
+
+
+def cache_of(horizon, **kwargs):
+    options = dict(poll_interval=0.05, max_failures=2, reconnect_delay=0.01)
+    options.update(kwargs)
+    return balance.BalanceCache(horizon.url, ACCOUNT, "SEAL", **options)
+
+
+def account_balance(horizon):
+    (entry, _) = horizon.account(ACCOUNT)["balances"]
+    return decimal.Decimal(entry["balance"])
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError
+        time.sleep(0.01)
+
+
+def test_stream_resumes_from_cursor(horizon):
+    cache = cache_of(horizon).start()
+    try:
+        assert cache.wait(timeout=5) == decimal.Decimal("1000")
+        horizon.pay(ACCOUNT, "SEAL", ISSUER, decimal.Decimal("0.0000001"))
+        wait_for(lambda: cache.balance == decimal.Decimal("1000.0000001"))
+
+        horizon.drop_streams()
+        # paid while the stream is down, sent once it is open again
+        horizon.pay(ACCOUNT, "SEAL", ISSUER, decimal.Decimal("-2.5"))
+        wait_for(lambda: cache.stats().reconnects >= 1)
+        wait_for(lambda: cache.balance == account_balance(horizon))
+        stats = cache.stats()
+    finally:
+        cache.stop()
+
+    assert cache.balance == decimal.Decimal("997.5000001")
+    # resumed without loading the account again
+    assert stats.syncs == 1
+    assert stats.events == 2
+
+
+def test_effects_in_the_loaded_balance_are_skipped(horizon):
+    cache = cache_of(horizon)
+    horizon.pay(ACCOUNT, "SEAL", ISSUER, decimal.Decimal("1.5"))
+    loaded = cache.sync()
+    assert loaded == decimal.Decimal("1001.5")
+
+    # e.g. a stream opened from a token older than the load
+    for effect in horizon.effects_after(ACCOUNT, "0"):
+        cache._on_event(effect)
+    assert cache.balance == loaded
+    assert cache.stats().events == 0
+
+    horizon.pay(ACCOUNT, "SEAL", ISSUER, decimal.Decimal("-0.5"))
+    (effect,) = horizon.effects_after(ACCOUNT, cache._cursor)
+    # the ledger is in the high 32 bits of the paging token
+    assert int(effect["paging_token"].split("-")[0]) >> 32 == horizon.ledger
+    cache._on_event(effect)
+    assert cache.balance == decimal.Decimal("1001")
+
+
+def test_falls_back_to_polling(horizon):
+    horizon.stream_errors = True
+    cache = cache_of(horizon).start()
+    try:
+        cache.wait(timeout=5)
+        wait_for(lambda: cache.stats().polling)
+        horizon.pay(ACCOUNT, "SEAL", ISSUER, decimal.Decimal("7"))
+        wait_for(lambda: cache.balance == decimal.Decimal("1007"))
+        assert cache.stats().events == 0
+
+        horizon.stream_errors = False
+        wait_for(lambda: not cache.stats().polling)
+        horizon.pay(ACCOUNT, "SEAL", ISSUER, decimal.Decimal("-3"))
+        wait_for(lambda: cache.balance == decimal.Decimal("1004"))
+        assert cache.stats().events == 1
+    finally:
+        cache.stop()
+
+
+class PaidDuringSync(balance.BalanceCache):
+    """Streams a payment while `sync` loads the account."""
+
+    horizon = None
+
+    def _get_json(self, path):
+        record = super()._get_json(path)
+        if path == f"/accounts/{ACCOUNT}" and self.horizon is not None:
+            horizon, self.horizon = self.horizon, None
+            events = self.stats().events
+            horizon.pay(ACCOUNT, "SEAL", ISSUER, decimal.Decimal("0.25"))
+            wait_for(lambda: self.stats().events > events)
+        return record
+
+
+def test_sync_while_streaming(horizon):
+    cache = PaidDuringSync(
+        horizon.url, ACCOUNT, "SEAL", max_failures=2, reconnect_delay=0.01
+    ).start()
+    try:
+        cache.wait(timeout=5)
+        # e.g. the reconciliation of the controller, from the cycle pool
+        cache.horizon = horizon
+        cache.sync()
+        assert cache.balance == decimal.Decimal("1000.25")
+
+        # the effect is not counted twice once the stream is opened again
+        horizon.drop_streams()
+        wait_for(lambda: cache.stats().reconnects >= 1)
+        horizon.pay(ACCOUNT, "SEAL", ISSUER, decimal.Decimal(1))
+        wait_for(lambda: cache.balance != decimal.Decimal("1000.25"))
+        assert cache.balance == decimal.Decimal("1001.25")
+    finally:
+        cache.stop()
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+from stellar_sdk import Keypair
+
+import fees
+import soroban
+from benchmarks.bench_fees import load_fee_stats
+from conftest import CONTRACT_ID, correct_supply_args
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Server:
+    """``getFeeStats`` of the recorded fixtures, failing on demand."""
+
+    def __init__(self, name):
+        self.fee_stats = load_fee_stats(name)
+        self.calls = 0
+        self.error = None
+
+    async def get_fee_stats(self):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return self.fee_stats
+
+
+def test_fee_from_recorded_stats():
+    quiet, busy = load_fee_stats("quiet"), load_fee_stats("busy")
+    assert fees.PercentileFeePolicy().fee_from_stats(busy) == 10_000
+    assert fees.PercentileFeePolicy(99).fee_from_stats(busy) == 400_000
+    assert fees.PercentileFeePolicy(10).fee_from_stats(busy) == 150
+    # the fee of a quiet network is the minimal one
+    assert fees.PercentileFeePolicy(99).fee_from_stats(quiet) == fees.BASE_FEE
+    assert fees.PercentileFeePolicy(10, min_fee=500).fee_from_stats(busy) == 500
+    assert fees.PercentileFeePolicy(99, max_fee=50_000).fee_from_stats(busy) == 50_000
+
+    with pytest.raises(ValueError):
+        fees.PercentileFeePolicy(75)
+
+
+def test_fee_stats_are_cached_for_the_ttl():
+    clock = Clock()
+    policy = fees.PercentileFeePolicy(ttl=60, default_fee=1234, clock=clock)
+    server = Server("busy")
+
+    async def fee():
+        return await policy.fee(server)
+
+    assert asyncio.run(fee()) == 10_000
+    clock.now = 59
+    assert asyncio.run(fee()) == 10_000
+    assert server.calls == 1
+
+    # expired, fetched again
+    clock.now = 61
+    server.fee_stats = load_fee_stats("quiet")
+    assert asyncio.run(fee()) == 100
+    assert server.calls == 2
+    assert policy.stats().fee_stats_calls == 2
+
+    # the last fee is kept while the fee stats cannot be fetched
+    clock.now = 200
+    server.error = ConnectionError("RPC down")
+    assert asyncio.run(fee()) == 100
+    assert asyncio.run(fees.PercentileFeePolicy(default_fee=1234).fee(server)) == 1234
+
+
+def test_bump():
+    policy = fees.PercentileFeePolicy(bump_factor=2, max_fee=1000)
+    assert policy.bump(100) == 200
+    assert policy.bump(600) == 1000
+    assert fees.PercentileFeePolicy(bump_factor=1).bump(100) == 101
+
+
+def test_bumped_after_expiry(rpc):
+    signer = Keypair.random()
+    # the quiet fee does not clear the network, the bumped one does
+    rpc.min_inclusion_fee = 150
+    policy = fees.PercentileFeePolicy(inclusion_timeout=1)
+
+    result = soroban.soroban_invoke(
+        signer.secret,
+        CONTRACT_ID,
+        "correct_supply",
+        correct_supply_args(signer, signer, 1),
+        fees=policy,
+    )
+
+    assert result.hash
+    stats = policy.stats()
+    assert (stats.transactions, stats.bumps) == (2, 1)
+    assert stats.mean_fee == 150
+    # the expired attempt did not use its sequence number
+    assert rpc.sequences[signer.public_key] == 1
+    assert rpc.requests["sendTransaction"] == 2
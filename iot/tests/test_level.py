@@ -0,0 +1,67 @@
+import math
+import random
+import statistics
+import time
+
+import pytest
+from gpiozero import DistanceSensor
+from gpiozero.pins.mock import MockFactory, MockTriggerPin
+
+import level
+
+
+def test_quantised_readings_report_the_resolution():
+    median, half_width = level.robust_interval([0.051] * 10, resolution=0.003)
+    assert median == 0.051
+    assert half_width == 0.003
+
+
+def test_correlated_samples_count_as_fewer():
+    # a sloshing surface sampled much faster than its period
+    values = [0.05 + 0.01 * math.cos(i / 5) for i in range(60)]
+    assert level.effective_sample_size(values) < 10
+
+    alternating = [0.05 + 0.001 * (-1) ** i for i in range(60)]
+    assert level.effective_sample_size(alternating) == 60
+
+
+def test_quantised_noise_is_not_correlated():
+    # a still surface: independent noise, skewed by the quantisation
+    sizes = []
+    for seed in range(20):
+        rng = random.Random(seed)
+        values = [0.048 if rng.random() < 0.3 else 0.051 for _ in range(60)]
+        sizes.append(level.effective_sample_size(values))
+    assert statistics.median(sizes) > 30
+
+
+# the mock pins time the echo in software
+@pytest.mark.filterwarnings("ignore::gpiozero.PWMSoftwareFallback")
+def test_sampler_stops_early_on_still_surface():
+    factory = MockFactory()
+    echo = factory.pin(24)
+    # an echo of 0.4 ms, ~7 cm
+    factory.pin(23, pin_class=MockTriggerPin, echo_pin=echo, echo_time=0.0004)
+    # raw echoes, the sampler does the filtering
+    sensor = DistanceSensor(echo=24, trigger=23, queue_len=1, pin_factory=factory)
+    # the first read waits for the sensor thread
+    sensor.distance
+    # at the pace of the sensor thread, one echo every 60 ms
+    sampler = level.LevelSampler(
+        sensor, window=40, interval=0.06, resolution=0.003, decorrelation=0.1
+    ).start()
+    try:
+        start = time.monotonic()
+        adaptive = sampler.read(
+            since=start, timeout=10, tolerance=0.0032, min_samples=5
+        )
+        elapsed = time.monotonic() - start
+        full = sampler.read(timeout=10)
+    finally:
+        sampler.stop()
+        sensor.close()
+
+    assert adaptive.n_samples < sampler.window
+    assert elapsed < sampler.window * sampler.interval
+    assert adaptive.uncertainty <= 0.0032
+    assert abs(adaptive.distance - full.distance) <= 2 * full.uncertainty
@@ -0,0 +1,94 @@
+import math
+
+import level
+import pump
+import seal_coin_supply
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += max(seconds, 0.0)
+
+
+class Pump:
+    def forward(self, speed=1):
+        pass
+
+    def backward(self, speed=1):
+        pass
+
+    def stop(self):
+        pass
+
+
+class Sampler:
+    """Sensor readings in m, as from `gpiozero.DistanceSensor`."""
+
+    def __init__(self, distances, clock):
+        self.distances = iter(distances)
+        self.clock = clock
+
+    def read(self, *, since=None, timeout=None, tolerance=None, min_samples=5):
+        return level.LevelReading(next(self.distances), self.clock(), 0, 0, 5, 0)
+
+
+def controller(distances, clock):
+    return pump.PumpController(
+        Pump(),
+        Sampler(distances, clock),
+        liter_per_meter=seal_coin_supply.LITER_PER_METER,
+        liter_per_token=seal_coin_supply.LITER_PER_TOKEN,
+        flow_rate=seal_coin_supply.FLOW_RATE,
+        settle_time=0.0,
+        clock=clock,
+        sleep=clock.sleep,
+    )
+
+
+def test_token_moved_in_liters():
+    ctrl = controller([], Clock())
+    # 1 mm of the 2 cm diameter container is pi * 1e-4 m^2 * 1e-3 m = 0.314 ml
+    liters = math.pi * 0.01**2 * 1e-3 * 1000
+    token = ctrl.token_moved(0.050, 0.049)
+    assert math.isclose(token * seal_coin_supply.LITER_PER_TOKEN, liters)
+
+
+def test_update_keeps_sensor_flow_rate():
+    # 100 ml at the calibrated flow rate, read by the sensor in m
+    planned = 0.1 / seal_coin_supply.FLOW_RATE
+    start = 0.080
+    end = start - 0.1 / seal_coin_supply.LITER_PER_METER
+    ctrl = controller([], Clock())
+    measured = ctrl.token_moved(start, end) * ctrl.liter_per_token / planned
+    assert math.isclose(measured, seal_coin_supply.FLOW_RATE)
+
+    # a slower pump than calibrated is blended in, not discarded
+    estimate = ctrl.flow_rate.update("mint", measured * 0.8)
+    assert 0.8 * measured < estimate < measured
+
+
+def test_closed_loop_stops_on_level():
+    clock = Clock()
+    n_token = seal_coin_supply.MINT_AMOUNT
+    liters = n_token * seal_coin_supply.LITER_PER_TOKEN
+    drop = liters / seal_coin_supply.LITER_PER_METER
+    planned = liters / seal_coin_supply.FLOW_RATE
+    start = 0.080
+
+    def distances():
+        yield start
+        # the level rises at the calibrated flow rate while pumping
+        while True:
+            yield start - drop * min(clock() / planned, 1.5)
+
+    ctrl = controller(distances(), clock)
+    run = ctrl.run(n_token, "mint")
+    assert abs(run.moved - n_token) < 0.05 * n_token
+    assert run.duration < 1.1 * ctrl.planned_time(n_token, "mint")
+    assert math.isclose(run.flow_rate, seal_coin_supply.FLOW_RATE, rel_tol=0.05)
@@ -0,0 +1,95 @@
+import datetime
+import time
+
+import scheduler
+import seal_coin_supply
+from benchmarks.bench_scheduler import simulate
+
+START = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc).timestamp()
+NOON = datetime.time(12, tzinfo=datetime.timezone.utc)
+
+
+def test_tasks_run_in_order_and_on_trigger():
+    clock = scheduler.VirtualClock(start=START)
+    tasks = scheduler.Scheduler(clock)
+    runs = []
+
+    def action(name, trigger=None):
+        def run():
+            runs.append((name, clock.time() - START))
+            if trigger is not None:
+                tasks.trigger(trigger)
+
+        return run
+
+    # due at the same time, they run in the order they were added
+    tasks.add("oracle", action("oracle", trigger="screen"), 100)
+    tasks.add("onchain", action("onchain"), 100)
+    tasks.add("screen", action("screen"), 1000, delay=500)
+    tasks.run(until=START + 150)
+
+    assert runs == [
+        ("oracle", 0),
+        ("onchain", 0),
+        # triggered, it does not wait for its first timer
+        ("screen", 0),
+        ("oracle", 100),
+        ("onchain", 100),
+        ("screen", 100),
+    ]
+    stats = tasks.stats()
+    assert stats["screen"].triggered == 2
+    # the trigger replaced the timer of the screen
+    assert stats["screen"].next_run == START + 1100
+
+
+def test_trigger_during_a_run_is_not_lost():
+    clock = scheduler.VirtualClock(start=START)
+    tasks = scheduler.Scheduler(clock)
+    runs = []
+
+    def screen():
+        runs.append(clock.time() - START)
+        if len(runs) == 1:
+            # e.g. a button pressed while the screen refreshes
+            tasks.trigger("screen")
+
+    tasks.add("screen", screen, 3600)
+    tasks.run(until=START + 4000)
+    assert runs == [0, 0, 3600]
+
+
+def test_daily_backoff():
+    backoff = scheduler.DailyBackoff(
+        NOON, early=3600, min_interval=300, max_interval=1800
+    )
+    morning = START + 6 * 3600
+    # wait for an hour before the publication time
+    assert backoff(morning, found=False) == 5 * 3600
+
+    now = START + 11 * 3600
+    delays = []
+    for _ in range(6):
+        delay = backoff(now, found=False)
+        delays.append(delay)
+        now += delay
+    assert delays == [300, 600, 1200, 1800, 1800, 1800]
+
+    # found, the next poll is an hour before the publication of tomorrow
+    assert backoff(now, found=True) == START + 35 * 3600 - now
+    # and the backoff starts over
+    assert backoff(START + 35 * 3600, found=False) == 300
+
+
+def test_week_of_polls_on_virtual_clock():
+    begin = time.perf_counter()
+    hourly_polls, hourly_latencies = simulate("hourly", n_days=7, spread=2.0)
+    polls, latencies = simulate("scheduler", n_days=7, spread=2.0)
+    assert time.perf_counter() - begin < 1.0
+
+    assert hourly_polls == 7 * 24
+    assert polls / 7 <= 10
+    # each day is found, and at most one backoff interval after publication
+    assert len(latencies) == 7
+    assert max(latencies) <= seal_coin_supply.ORACLE_MAX_INTERVAL
+    assert sum(latencies) < sum(hourly_latencies)
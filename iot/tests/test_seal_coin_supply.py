@@ -0,0 +1,131 @@
+import asyncio
+import datetime
+import decimal
+import logging
+import time
+
+import pytest
+from stellar_sdk import Keypair
+
+import actuator
+import seal_coin_supply
+import soroban
+import state
+from benchmarks.standin import serve_horizon, serve_soroban_rpc
+from conftest import CONTRACT_ID, LEDGER_CLOSE_TIME, correct_supply_args
+from fees import FixedFee
+
+
+@pytest.fixture
+def chain(monkeypatch):
+    """Horizon and Soroban RPC stand-ins sharing the accounts."""
+    with serve_horizon() as horizon, serve_soroban_rpc(
+        ledger_close_time=LEDGER_CLOSE_TIME, horizon=horizon, seed=0
+    ) as rpc:
+        monkeypatch.setattr(seal_coin_supply, "HORIZON_URL", horizon.url)
+        monkeypatch.setattr(soroban, "rpc_server_url", rpc.url)
+        monkeypatch.setattr(soroban, "LEDGER_CLOSE_TIME", LEDGER_CLOSE_TIME)
+        seal_coin_supply.get_balance_cache.cache_clear()
+        yield horizon, rpc
+        if seal_coin_supply.get_balance_cache.cache_info().currsize:
+            seal_coin_supply.get_balance_cache().stop()
+            seal_coin_supply.get_balance_cache.cache_clear()
+
+
+def test_failed_pump_leaves_the_day_unsettled(rpc, tmp_path, caplog):
+    issuer, distributor = Keypair.random(), Keypair.random()
+    store = state.StateStore(tmp_path / "state.db")
+    corrections = [
+        (datetime.date(2026, 1, 1), 1, 13_976, 5),
+        (datetime.date(2026, 1, 2), 2, 13_976, -3),
+    ]
+
+    def execute(amount):
+        if amount > 0:
+            raise OSError("GPIO busy")
+
+    # the actuator of the controller, on a pump failing to mint
+    queue = actuator.ActuatorQueue(execute).start()
+
+    def invocation(date, doy, extent, amount):
+        async def start_pump():
+            job = queue.submit(amount, "correction", throttle=False)
+            await asyncio.wrap_future(job)
+
+        def record_pending(tx):
+            store.record_pending(
+                tx.hash_hex(),
+                date,
+                doy,
+                extent,
+                amount,
+                tx.transaction.source.account_id,
+                tx.transaction.sequence,
+                0,
+            )
+
+        return soroban.Invocation(
+            (issuer if amount > 0 else distributor).secret,
+            correct_supply_args(issuer, distributor, doy),
+            send_after=start_pump,
+            on_send=record_pending,
+        )
+
+    try:
+        results = soroban.soroban_invoke_batch(
+            CONTRACT_ID,
+            "correct_supply",
+            [invocation(*correction) for correction in corrections],
+            fees=FixedFee(),
+        )
+    finally:
+        queue.stop()
+
+    with caplog.at_level(logging.ERROR):
+        assert seal_coin_supply.record_settlements(store, corrections, results)
+    assert isinstance(results[0], soroban.SendAfterError)
+    assert "Pump run of 2026-01-01 failed: OSError('GPIO busy')" in caplog.text
+
+    # the minted day was never sent and is settled again on the next cycle
+    assert not store.is_executed(corrections[0][0])
+    assert store.pending_executions(corrections[0][0]) == []
+    assert rpc.sequences[issuer.public_key] == 0
+    assert store.is_executed(corrections[1][0])
+
+
+def test_chain_path(chain, monkeypatch):
+    horizon, rpc = chain
+    issuer, distributor = Keypair.random(), Keypair.random()
+    account = distributor.public_key
+    monkeypatch.setattr(
+        seal_coin_supply, "DISTRIBUTION_ADDR_SECRET", distributor.secret
+    )
+    horizon.pay(account, "SEAL", issuer.public_key, decimal.Decimal(1000))
+    assert seal_coin_supply.supply_onchain() == decimal.Decimal(1000)
+
+    sent_at = time.time()
+    for doy in (1, 2):
+        result = soroban.soroban_invoke(
+            issuer.secret,
+            CONTRACT_ID,
+            "correct_supply",
+            correct_supply_args(issuer, distributor, doy),
+            fees=FixedFee(),
+        )
+        assert result.transaction_meta is not None
+    for method in ("simulateTransaction", "sendTransaction", "getTransaction"):
+        assert rpc.requests[method] >= 2
+    # the sequence numbers are the ones Horizon reports
+    assert horizon.account(issuer.public_key)["sequence"] == "2"
+    outcome = soroban.transaction_outcome(
+        result.hash, issuer.public_key, 2, 0, sent_at
+    )
+    assert outcome == "success"
+
+    # e.g. the mint of the contract, streamed without loading the account
+    horizon.pay(account, "SEAL", issuer.public_key, decimal.Decimal(5))
+    deadline = time.monotonic() + 5
+    while seal_coin_supply.supply_onchain() != decimal.Decimal(1005):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert seal_coin_supply.get_balance_cache().stats().syncs == 1
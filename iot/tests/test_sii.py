@@ -0,0 +1,138 @@
+import json
+import threading
+import time
+import urllib.error
+
+import pytest
+
+import sii
+
+ROW = (
+    '2024,    01,  {day:>2},     13.926,      0.000,"['
+    + ", ".join(
+        "'/ecs/DP4/PM/NSIDC-0081.002/2024.01.{day:02}/"
+        "NSIDC0081_SEAICE_PS_N25km_202401{day:02}_v2.0.nc'"
+        for _ in range(3)
+    )
+    + ']"\n'
+)
+CSV = "Year, Month, Day, Extent, Missing, Source Data\n" + "".join(
+    ROW.format(day=day) for day in range(1, 21)
+)
+
+
+class TailServer(sii.DailyExtentCache):
+    """Serve the CSV from memory, ranges included."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requests = []
+
+    def _get(self, headers, tail):
+        self.requests.append(tail)
+        body = CSV.encode()
+        if tail and self.tail_bytes > 0:
+            return 206, body[-self.tail_bytes :], {}
+        return 200, body, {}
+
+
+def test_tail_holds_real_rows():
+    assert len(ROW.format(day=1)) > 250
+    assert sii.TAIL_BYTES >= 3 * len(ROW.format(day=1))
+
+
+def test_short_tail_falls_back_to_full_file(tmp_path):
+    # a single complete row in the tail
+    cache = TailServer("http://sii/daily.csv", tmp_path, tail_bytes=400)
+    assert cache.fetch() == (20, 13.926)
+    assert cache.requests == [True, False]
+    assert not cache._load_meta()["partial"]
+
+    cache = TailServer("http://sii/daily.csv", tmp_path / "tail")
+    assert cache.fetch() == (20, 13.926)
+    assert cache.requests == [True]
+
+
+class ChangedFile(sii.DailyExtentCache):
+    """The file was rewritten shorter than the cached tail."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requests = []
+
+    def _get(self, headers, tail):
+        self.requests.append(headers)
+        if tail:
+            raise urllib.error.HTTPError(self.url, 416, "", {}, None)
+        if "If-None-Match" in headers or "If-Modified-Since" in headers:
+            raise urllib.error.HTTPError(self.url, 304, "", {}, None)
+        return 200, CSV.encode(), {"ETag": '"v2"'}
+
+
+def test_unsatisfiable_range_fetches_the_full_file(tmp_path):
+    cache = ChangedFile("http://sii/daily.csv", tmp_path)
+    cache._atomic_write(
+        cache.meta_path,
+        json.dumps(
+            {
+                "url": cache.url,
+                "etag": '"v1"',
+                "last_modified": "Mon, 01 Jan 2024 00:00:00 GMT",
+                "partial": True,
+                "doy": 19,
+                "extent": 13.9,
+            }
+        ).encode(),
+    )
+    assert cache.fetch() == (20, 13.926)
+    assert "If-None-Match" in cache.requests[0]
+    assert cache.requests[1] == {}
+    assert cache._load_meta()["etag"] == '"v2"'
+
+
+class SlowServer(TailServer):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.running = 0
+        self.max_running = 0
+
+    def _get(self, headers, tail):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        time.sleep(0.01)
+        self.running -= 1
+        return super()._get(headers, tail)
+
+
+def test_fetches_left_running_do_not_overlap(tmp_path):
+    cache = SlowServer("http://sii/daily.csv", tmp_path)
+    # e.g. fetches of successive queries, not waited for by the oracle
+    threads = [threading.Thread(target=cache.fetch) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cache.max_running == 1
+    assert cache.hits + cache.misses == 8
+    assert list(tmp_path.glob("*.tmp")) == []
+
+
+def test_oracle_is_built_on_first_use(monkeypatch, tmp_path):
+    path = tmp_path / "daily.csv"
+    path.write_text(CSV)
+    monkeypatch.setattr(sii, "SII_LOCAL_PATHS", [str(path)])
+    monkeypatch.setattr(sii, "SII_QUORUM", 3)
+    sii.get_oracle.cache_clear()
+    try:
+        with pytest.raises(ValueError):
+            sii.get_oracle()
+
+        monkeypatch.setattr(sii, "SII_QUORUM", 1)
+        sii.get_oracle.cache_clear()
+        oracle = sii.get_oracle()
+        assert [source.name for source in oracle.sources] == [
+            sii.cache.name,
+            str(path),
+        ]
+    finally:
+        sii.get_oracle.cache_clear()
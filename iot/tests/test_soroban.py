@@ -0,0 +1,236 @@
+import asyncio
+import datetime
+
+import pytest
+from stellar_sdk import Keypair
+
+import soroban
+import state
+from fees import FixedFee
+from conftest import CONTRACT_ID, LEDGER_CLOSE_TIME, correct_supply_args
+
+
+def test_catch_up_settles_each_day_once(rpc, tmp_path):
+    issuer, distributor = Keypair.random(), Keypair.random()
+    store = state.StateStore(tmp_path / "state.db")
+    # minted and burned days, the third one cannot be pumped
+    days = [
+        (datetime.date(2026, 1, doy), doy, 1 if doy % 2 else -1)
+        for doy in range(1, 6)
+    ]
+    pumped = []
+
+    def invocation(date, doy, amount):
+        async def start_pump():
+            if doy == 3:
+                raise RuntimeError("pump stuck")
+            pumped.append(doy)
+
+        def record_pending(tx):
+            store.record_pending(
+                tx.hash_hex(),
+                date,
+                doy,
+                13_976,
+                amount,
+                tx.transaction.source.account_id,
+                tx.transaction.sequence,
+                0,
+            )
+
+        signer = issuer if amount > 0 else distributor
+        return soroban.Invocation(
+            signer.secret,
+            correct_supply_args(issuer, distributor, doy),
+            send_after=start_pump,
+            on_send=record_pending,
+        )
+
+    first_ledger = rpc.ledger
+    results = soroban.soroban_invoke_batch(
+        CONTRACT_ID,
+        "correct_supply",
+        [invocation(*day) for day in days],
+        fees=FixedFee(),
+    )
+    for (date, doy, amount), result in zip(days, results):
+        if isinstance(result, Exception):
+            continue
+        store.record_execution(date, doy, 13_976, amount, result.hash)
+
+    assert isinstance(results[2], soroban.SendAfterError)
+    assert sorted(pumped) == [1, 2, 4, 5]
+    for date, doy, _ in days:
+        assert store.is_executed(date) == (doy != 3)
+        # the pending records of settled days are dropped, the failed day
+        # was never sent
+        assert store.pending_executions(date) == []
+    # a signer's days in turn, both signers at once: 2 ledgers rather than 4
+    assert rpc.ledger - first_ledger <= 3
+    assert rpc.sequences[issuer.public_key] == 2
+    assert rpc.sequences[distributor.public_key] == 2
+
+
+def test_failed_send_reloads_the_sequence(rpc):
+    from stellar_sdk import SorobanServerAsync
+
+    signer = Keypair.random()
+    args = correct_supply_args(signer, signer, 42)
+    sequences = soroban.SequenceManager()
+
+    async def invoke():
+        async with SorobanServerAsync(rpc.url) as server:
+            send_transaction = server.send_transaction
+
+            async def accepted_then_reset(tx):
+                await send_transaction(tx)
+                raise ConnectionResetError("reset after the RPC accepted it")
+
+            server.send_transaction = accepted_then_reset
+            with pytest.raises(ConnectionResetError):
+                await soroban.soroban_invoke_async(
+                    signer.secret,
+                    CONTRACT_ID,
+                    "correct_supply",
+                    args,
+                    server=server,
+                    sequences=sequences,
+                    fees=FixedFee(),
+                )
+            await asyncio.sleep(2 * LEDGER_CLOSE_TIME)
+            # the spent sequence number is not given again
+            account = await sequences.acquire(server, signer.public_key)
+            sequences.release(signer.public_key, account.sequence)
+            return account.sequence
+
+    assert asyncio.run(invoke()) == 1
+    assert rpc.sequences[signer.public_key] == 1
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def simulate(rpc, signer, args):
+    """Simulation of the stand-in, with the authorisation of the signer."""
+    from stellar_sdk import Account, Network, SorobanServer, TransactionBuilder
+
+    tx = (
+        TransactionBuilder(
+            Account(signer.public_key, 0), Network.TESTNET_NETWORK_PASSPHRASE
+        )
+        .append_invoke_contract_function_op(CONTRACT_ID, "correct_supply", args)
+        .set_timeout(30)
+        .build()
+    )
+    with SorobanServer(rpc.url) as server:
+        return server.simulate_transaction(tx)
+
+
+def root_args(simulation):
+    from stellar_sdk import xdr
+
+    (entry_xdr,) = simulation.results[0].auth
+    entry = xdr.SorobanAuthorizationEntry.from_xdr(entry_xdr)
+    return entry.root_invocation.function.contract_fn.args
+
+
+def test_simulation_cache_hit_miss_and_expiry(rpc):
+    signer = Keypair.random()
+    first = correct_supply_args(signer, signer, 1)
+    second = correct_supply_args(signer, signer, 2)
+    clock = Clock()
+    cache = soroban.SimulationCache(ttl=10, clock=clock)
+    key = cache.key(CONTRACT_ID, "correct_supply", signer.public_key, first)
+    # only addresses are part of the key, not the other values
+    assert key == cache.key(CONTRACT_ID, "correct_supply", signer.public_key, second)
+    other = correct_supply_args(Keypair.random(), signer, 1)
+    assert key != cache.key(CONTRACT_ID, "correct_supply", signer.public_key, other)
+
+    assert cache.get(key, first) is None
+    simulation = simulate(rpc, signer, first)
+    cache.put(key, simulation)
+    cached = cache.get(key, second)
+    assert (cache.hits, cache.misses) == (1, 1)
+    # the authorisation is the one of the new arguments, the cached
+    # simulation is left as is
+    assert root_args(cached) == second
+    assert root_args(simulation) == first
+    assert cached.transaction_data == simulation.transaction_data
+
+    clock.now = 11
+    assert cache.get(key, second) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_simulation_cache_evicts_least_recently_used(rpc):
+    signers = [Keypair.random() for _ in range(3)]
+    cache = soroban.SimulationCache(maxsize=2)
+    keys = []
+    for signer in signers[:2]:
+        args = correct_supply_args(signer, signer, 1)
+        keys.append(cache.key(CONTRACT_ID, "correct_supply", signer.public_key, args))
+        cache.put(keys[-1], simulate(rpc, signer, args))
+    assert cache.get(keys[0], correct_supply_args(signers[0], signers[0], 2))
+
+    args = correct_supply_args(signers[2], signers[2], 1)
+    keys.append(cache.key(CONTRACT_ID, "correct_supply", signers[2].public_key, args))
+    cache.put(keys[-1], simulate(rpc, signers[2], args))
+    assert cache.get(keys[1], args) is None
+    assert cache.get(keys[0], args) is not None
+    assert cache.get(keys[2], args) is not None
+
+
+def test_simulation_cache_rewrites_the_auth(rpc):
+    from stellar_sdk import scval
+
+    signer = Keypair.random()
+    calls = []
+
+    def rewrite_auth(function_name, args, invocation):
+        calls.append(function_name)
+        # updated in place, as the amounts of the mint or burn
+        assert invocation.function.contract_fn.args == args
+        args = invocation.function.contract_fn.args
+        args[-1] = scval.to_int32(scval.from_int32(args[-1]) + 1)
+
+    cache = soroban.SimulationCache(rewrite_auth=rewrite_auth)
+    first = correct_supply_args(signer, signer, 1)
+    key = cache.key(CONTRACT_ID, "correct_supply", signer.public_key, first)
+    cache.put(key, simulate(rpc, signer, first))
+    cached = cache.get(key, correct_supply_args(signer, signer, 2))
+    assert calls == ["correct_supply"]
+    assert scval.from_int32(root_args(cached)[2]) == 2
+    assert scval.from_int32(root_args(cached)[3]) == 13_977
+
+
+def test_cached_simulation_signs_the_new_arguments(rpc):
+    from stellar_sdk import xdr
+
+    signer = Keypair.random()
+    cache = soroban.SimulationCache()
+    sent = []
+
+    for doy in (1, 2):
+        soroban.soroban_invoke(
+            signer.secret,
+            CONTRACT_ID,
+            "correct_supply",
+            correct_supply_args(signer, signer, doy),
+            simulations=cache,
+            fees=FixedFee(),
+            on_send=sent.append,
+        )
+
+    assert rpc.requests["simulateTransaction"] == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+    operation = sent[-1].transaction.operations[0]
+    (auth,) = operation.auth
+    assert isinstance(auth, xdr.SorobanAuthorizationEntry)
+    args = correct_supply_args(signer, signer, 2)
+    assert auth.root_invocation.function.contract_fn.args == args
+    assert operation.host_function.invoke_contract.args == args